@@ -0,0 +1,42 @@
+import os
+import time
+import argparse
+import tempfile
+
+from combine_ipeds_sfa import combine_csvs
+from ipeds_config import SFA_FOLDER
+from ipeds_io import link_or_copy_tree
+
+def bench_combine_jobs(folder, job_counts=(1, 2, 4, 8, 16), from_zips=False):
+    """
+    Times combine_csvs(jobs=N) on the SFA files in `folder` for each N in `job_counts`
+    and prints wall time and speed-up relative to the first entry.
+    `folder` is left untouched: the runs work on a hard-linked (or copied) replica of it in a
+    temp folder, so the outputs and the source catalog (sfa_sources.json) are written there.
+    One untimed run first fills that catalog, so every timed run starts from the same state.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        work = os.path.join(tmp, "sfa")
+        link_or_copy_tree(folder, work)
+        combine_csvs(work, output_csv="combined_warmup.csv", from_zips=from_zips)
+        for jobs in job_counts:
+            out_csv = f"combined_jobs{jobs}.csv"
+            t0 = time.perf_counter()
+            combine_csvs(work, output_csv=out_csv, from_zips=from_zips, jobs=jobs)
+            results.append((jobs, time.perf_counter() - t0))
+    
+    base = results[0][1]
+    print(f"\n{'jobs':>5} {'seconds':>9} {'speed-up':>9}")
+    for jobs, seconds in results:
+        print(f"{jobs:>5} {seconds:>9.2f} {base / seconds:>8.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark for combine_csvs --jobs.")
+    parser.add_argument("--folder", default=SFA_FOLDER)
+    parser.add_argument("--from-zips", action="store_true")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+    bench_combine_jobs(args.folder, job_counts=args.jobs, from_zips=args.from_zips)
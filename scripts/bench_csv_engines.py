@@ -0,0 +1,69 @@
+import os
+import glob
+import time
+import argparse
+import tempfile
+
+from combine_ipeds_sfa import combine_csvs
+from ipeds_config import SFA_FOLDER, HD_FOLDER
+from ipeds_io import CSV_ENGINES, set_csv_engine, read_table, read_source_csv, iter_source_csv
+
+def latest_hd_source(hd_folder):
+    """ Newest HD zip (or CSV) in `hd_folder`, or None. """
+    names = sorted(glob.glob(os.path.join(hd_folder, "HD*.zip")) or glob.glob(os.path.join(hd_folder, "hd*.csv")))
+    return names[-1] if names else None
+
+
+def bench_csv_engines(folder, hd_source=None, engines=CSV_ENGINES, from_zips=False, chunksize=100_000):
+    """
+    Times the CSV-heavy stages once per engine in `engines` (see ipeds_io.CSV_ENGINE):
+      combine - combine_csvs over the SFA files in `folder`
+      read    - read_table of the combined CSV
+      hd      - parse of the HD file `hd_source` (latin1, all strings), if given
+      chunks  - iter_source_csv over the combined CSV in `chunksize`-row chunks
+    and prints seconds per stage and the speed-up relative to the first engine.
+    Output files go to a temp folder so `folder` is left untouched.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for engine in engines:
+            set_csv_engine(engine)
+            timings = {}
+            out_csv = os.path.join(tmp, f"combined_{engine}.csv")
+            t0 = time.perf_counter()
+            combine_csvs(folder, output_csv=out_csv, from_zips=from_zips)
+            timings["combine"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            read_table(out_csv)
+            timings["read"] = time.perf_counter() - t0
+
+            if hd_source:
+                t0 = time.perf_counter()
+                read_source_csv(hd_source, dtype=str, low_memory=False, encoding='latin1')
+                timings["hd"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            for _ in iter_source_csv(out_csv, chunksize, dtype=str):
+                pass
+            timings["chunks"] = time.perf_counter() - t0
+            results[engine] = timings
+
+    base = results[engines[0]]
+    print(f"\n{'stage':>8} " + " ".join(f"{e:>9}" for e in engines) + f" {'speed-up':>9}")
+    for stage in base:
+        last = results[engines[-1]][stage]
+        print(f"{stage:>8} " + " ".join(f"{results[e][stage]:>9.2f}" for e in engines)
+              + f" {base[stage] / last:>8.2f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares the CSV engines on the combine / read / HD stages.")
+    parser.add_argument("--folder", default=SFA_FOLDER)
+    parser.add_argument("--hd-source", default=None, help="HD zip or CSV (default: newest in the HD folder)")
+    parser.add_argument("--from-zips", action="store_true")
+    parser.add_argument("--engines", nargs="+", choices=CSV_ENGINES, default=list(CSV_ENGINES))
+    args = parser.parse_args()
+    bench_csv_engines(args.folder, hd_source=args.hd_source or latest_hd_source(HD_FOLDER),
+                      engines=args.engines, from_zips=args.from_zips)
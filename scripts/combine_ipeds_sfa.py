@@ -1,7 +1,40 @@
 import os
 import re
+import json
+import shutil
+import argparse
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
+try:
+    # Optional: pip install pyarrow. Used to ship parsed years between processes as Arrow IPC.
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from ipeds_io import prefer_rv, find_sfa_zips, read_source_csv, iter_source_csv, \
+    is_parquet_path, write_table, write_year_partition, unify_schemas, write_dataset_schema, \
+    CSV_ENGINES, CSV_ENGINE, set_csv_engine
+from ipeds_schema import KEY_COLUMNS, infer_schema, apply_schema, load_cached_schema, save_schema, memory_mb, \
+    report_memory
+from ipeds_manifest import file_sha256
+from ipeds_sources import load_source_catalog, save_source_catalog, source_entry, header_columns, common_columns, \
+    union_columns, record_parse, estimate_frame_mb
+from ipeds_config import SFA_FOLDER
+
+# Per-year SFA source files (sfa1314.csv, SFA1314_rv.csv); other CSVs in the folder, such as
+# the combine's own output, are not years
+SFA_CSV_RE = re.compile(r"sfa\d{4}(_rv)?\.csv$", re.IGNORECASE)
+
+# Per-year intermediate partitions for incremental rebuilds live here (inside the SFA folder)
+PARTITIONS_DIR = "_partitions"
+PARTITIONS_STATE = "partitions.json"
+
+# Rough in-memory cost of one parsed cell (a short Python str plus its pointer),
+# used to turn a memory budget into a chunk size.
+EST_BYTES_PER_CELL = 64
+
 def find_sfa_csvs(folder):
     """
     In the given folder, looks for SFA CSV files in the form 'SFAxxxx.csv' or 'SFAxxxx_rv.csv'
@@ -16,50 +49,13 @@ def find_sfa_csvs(folder):
     
     Key = base name without '.csv' or '_rv.csv', e.g. 'SFA1314'
     Value = full file path
+    Entries are in key (= year) order, the order every combine mode writes the years in.
     """
-    all_files = os.listdir(folder)
-    
-    # We'll store only the final chosen CSV for each base name (with or without _rv).
-    chosen_files = {}
+    all_files = [f for f in os.listdir(folder) if SFA_CSV_RE.match(f)]
     
-    for f in all_files:
-        fname = f.lower()  # easier to compare
-        # We'll look for something like sfa1314 or sfa1314_rv
-        # ignoring if it's not a CSV
-        if not fname.endswith(".csv"):
-            continue
-        
-        # remove extension
-        base_no_ext = fname.replace(".csv", "")
-        
-        # The simplest pattern is sfa1314 or sfa1314_rv
-        # We'll figure out the "root" if there's an "_rv"
-        # e.g. sfa1314_rv -> root is "sfa1314", suffix is "_rv"
-        if "_rv" in base_no_ext:
-            root = base_no_ext.replace("_rv", "")
-            is_rv = True
-        else:
-            root = base_no_ext
-            is_rv = False
-        
-        # We'll store them with an uppercase convention
-        # e.g. SFA1314 as the root key
-        root_key = root.upper()
-        
-        full_path = os.path.join(folder, f)
-        
-        # If we haven't seen this root yet, pick it
-        if root_key not in chosen_files:
-            chosen_files[root_key] = full_path
-        else:
-            # If we already picked a non-rv, but now we see rv, prefer rv
-            # Or if we see the opposite, we ignore
-            current_picked = chosen_files[root_key]
-            if "_rv.csv" in fname:
-                # prefer rv over non-rv
-                chosen_files[root_key] = full_path
-            # else keep existing
-    return chosen_files
+    # Same "_rv wins" rule is used for members inside the SFA zips (see ipeds_io.prefer_rv)
+    chosen = prefer_rv(all_files, ".csv")
+    return {root_key: os.path.join(folder, chosen[root_key]) for root_key in sorted(chosen)}
 
 
 def get_year_from_filename(filename):
@@ -91,31 +87,16 @@ def get_year_from_filename(filename):
         return "UnknownYear"
 
 
-def get_common_columns(file_paths):
+def get_common_columns(file_paths, catalog=None):
     """
-    Reads only the header row of each CSV in file_paths, finds the intersection of all columns.
-    Returns that set (or list) of common column names.
+    Finds the intersection of the columns of all files in file_paths (CSVs or SFA zips).
+    Headers come from the source catalog (see ipeds_sources) when given - files seen before
+    aren't opened at all - and are otherwise parsed with the csv module, so quoted headers
+    work. Returns that set of common (lowercase) column names.
     """
-    common_cols = None
-    
-    for fp in file_paths:
-        # read just the header row
-        with open(fp, 'r', encoding='utf-8', errors='replace') as f:
-            header_line = f.readline().strip()
-        
-        # split by comma (assuming no complex quoting issues or commas in headers)
-        columns = header_line.split(",")
-        # convert to set for easy intersection
-        col_set = set([c.strip().lower() for c in columns])
-        
-        if common_cols is None:
-            common_cols = col_set
-        else:
-            common_cols = common_cols.intersection(col_set)
-            
-        # If the intersection becomes empty, no sense continuing
-        if not common_cols:
-            break
+    if catalog is None:
+        catalog = {"files": {}, "stat": {}}
+    common_cols = common_columns(catalog, file_paths)
     
     if not common_cols:
         print("No common columns found across these files!")
@@ -124,28 +105,414 @@ def get_common_columns(file_paths):
     return common_cols
 
 
-def combine_csvs(folder, output_csv="combined_ipeds_sfa.csv"):
+def select_columns(common_col_set, variables=None):
+    """
+    Narrows the common columns to the requested `variables` (lowercase short names, see
+    rename_sfa_columns.resolve_variables) plus the key columns (UNITID). Every reader parses with
+    usecols=<this set>, so the other columns are never materialized.
+    variables=None keeps everything.
+    """
+    if not variables:
+        return common_col_set
+    wanted = {v.lower() for v in variables}
+    missing = sorted(wanted - common_col_set)
+    if missing:
+        print(f"Not among the columns being combined, skipped: {', '.join(missing)}")
+    return common_col_set & (wanted | set(KEY_COLUMNS))
+
+
+def rows_per_chunk(memory_budget_mb, n_cols):
+    """
+    Number of rows to parse at a time so that one chunk (held twice: by the parser and
+    by the DataFrame being written) stays within `memory_budget_mb`.
+    """
+    budget_bytes = memory_budget_mb * 1024 * 1024
+    return max(1000, int(budget_bytes / (2 * max(n_cols, 1) * EST_BYTES_PER_CELL)))
+
+
+def stream_combine(chosen_files_dict, common_col_set, output_path, memory_budget_mb, catalog=None):
+    """
+    Bounded-memory version of the combine step. Each file is read in chunks, restricted to
+    the common columns at parse time, tagged with 'year' and appended to `output_path`.
+    Peak memory is one chunk, no matter how many years there are.
+    
+    The output is byte-for-byte what the in-memory pd.concat + to_csv path writes:
+    columns follow the first readable file's order (as pd.concat does), and a file that
+    fails part-way is rolled back out of the output (as if it had been skipped).
+    """
+    chunksize = rows_per_chunk(memory_budget_mb, len(common_col_set) + 1)
+    out_columns = None
+    total_rows = 0
+    
+    with open(output_path, 'w', encoding='utf-8', newline='') as out:
+        for base_key, fp in chosen_files_dict.items():
+            year_label = get_year_from_filename(fp)
+            start_pos = out.tell()
+            file_rows = 0
+            try:
+                for chunk in iter_source_csv(fp, chunksize, dtype=str,
+                                             usecols=lambda c: c.lower().strip() in common_col_set):
+                    chunk.columns = [col.lower().strip() for col in chunk.columns]
+                    chunk['year'] = year_label
+                    if out_columns is None:
+                        out_columns = list(chunk.columns)
+                    chunk = chunk[out_columns]
+                    chunk.to_csv(out, index=False, header=(out.tell() == 0))
+                    file_rows += len(chunk)
+            except Exception as e:
+                print(f"Error reading file {fp}, leaving its year out: {e}")
+                out.seek(start_pos)
+                out.truncate()
+                continue
+            record_parse(catalog, fp, rows=file_rows)
+            total_rows += file_rows
+    
+    if out_columns is None:
+        print("No dataframes to combine. Possibly all read attempts failed.")
+        os.remove(output_path)
+        return
+    print(f"Combined dataset with {total_rows} rows and {len(out_columns)} columns saved to {output_path} "
+          f"(streamed in chunks of {chunksize} rows)")
+
+
+def parse_sfa_year(fp, common_cols):
+    """
+    Worker for the parallel combine: parses one year's file restricted to `common_cols`,
+    lowercases the headers and tags the 'year' column.
+    
+    The result goes back to the parent as Arrow IPC stream bytes (columnar buffers, cheap to
+    transfer) when pyarrow is installed, otherwise as a plain DataFrame. Returns None on error.
+    """
+    common_col_set = set(common_cols)
+    try:
+        temp_df = read_source_csv(fp, dtype=str, low_memory=False,
+                                  usecols=lambda c: c.lower().strip() in common_col_set)
+    except Exception as e:
+        print(f"Error reading file {fp}, leaving its year out: {e}")
+        return None
+    temp_df.columns = [col.lower().strip() for col in temp_df.columns]
+    temp_df['year'] = get_year_from_filename(fp)
+    if pa is None:
+        return temp_df
+    
+    table = pa.Table.from_pandas(temp_df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def frame_from_worker(result):
+    """ Turns what parse_sfa_year returned back into a DataFrame. """
+    if result is None or isinstance(result, pd.DataFrame):
+        return result
+    return pa.ipc.open_stream(result).read_all().to_pandas()
+
+
+def parallel_combine(chosen_files_dict, common_col_set, output_path, jobs, catalog=None):
+    """
+    Parses the per-year files in `jobs` worker processes and writes them in year order.
+    Each year is appended to `output_path` as soon as it (and every earlier year) is back,
+    so the parent never holds the whole multi-year frame.
+    """
+    # find_sfa_csvs / find_sfa_zips list the files in year order
+    file_paths = list(chosen_files_dict.values())
+    common_cols = sorted(common_col_set)
+    out_columns = None
+    total_rows = 0
+    
+    with ProcessPoolExecutor(max_workers=jobs) as pool, \
+            open(output_path, 'w', encoding='utf-8', newline='') as out:
+        # map() yields results in submission order, i.e. by year
+        results = pool.map(parse_sfa_year, file_paths, [common_cols] * len(file_paths))
+        for fp, result in zip(file_paths, results):
+            temp_df = frame_from_worker(result)
+            if temp_df is None:
+                continue
+            record_parse(catalog, fp, temp_df)
+            if out_columns is None:
+                out_columns = list(temp_df.columns)
+            temp_df[out_columns].to_csv(out, index=False, header=(out.tell() == 0))
+            total_rows += len(temp_df)
+    
+    if out_columns is None:
+        print("No dataframes to combine. Possibly all read attempts failed.")
+        os.remove(output_path)
+        return
+    print(f"Combined dataset with {total_rows} rows and {len(out_columns)} columns saved to {output_path} "
+          f"(parsed with {jobs} worker processes)")
+
+
+def union_column_order(catalog, chosen_files_dict, col_set):
+    """ Columns of `col_set` in order of first appearance, oldest year first, then 'year'. """
+    order = []
+    for fp in chosen_files_dict.values():
+        for c in header_columns(source_entry(catalog, fp)):
+            if c in col_set and c not in order:
+                order.append(c)
+    return order + ['year']
+
+
+def union_combine(chosen_files_dict, union_col_set, common_col_set, output_path, catalog):
+    """
+    Union-schema combine: keeps every column that appears in any year; years that lack a
+    column have it missing. Each source is parsed once, one year at a time.
+
+    - CSV output is streamed year by year under the union header (missing cells are empty).
+    - Parquet output gets one partition per year holding only that year's own columns, plus
+      the dataset's superset schema in _common_metadata (see ipeds_io.unify_schemas). Absent
+      year/column combinations are never stored or materialized; read_table fills them in
+      as nulls, and reading just the common columns gives the intersection result.
+    """
+    out_columns = union_column_order(catalog, chosen_files_dict, union_col_set)
+    parquet = is_parquet_path(output_path)
+    if parquet:
+        if os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        os.makedirs(output_path)
+        schemas = []
+    total_rows = 0
+    
+    with (nullcontext() if parquet else open(output_path, 'w', encoding='utf-8', newline='')) as out:
+        if not parquet:
+            pd.DataFrame(columns=out_columns).to_csv(out, index=False)
+        for base_key, fp in chosen_files_dict.items():
+            try:
+                temp_df = read_source_csv(fp, dtype=str, low_memory=False,
+                                          usecols=lambda c: c.lower().strip() in union_col_set)
+            except Exception as e:
+                print(f"Error reading file {fp}, leaving its year out: {e}")
+                continue
+            temp_df.columns = [col.lower().strip() for col in temp_df.columns]
+            record_parse(catalog, fp, temp_df)
+            year_label = get_year_from_filename(fp)
+            if parquet:
+                schemas.append(write_year_partition(temp_df, output_path, year_label))
+            else:
+                temp_df['year'] = year_label
+                temp_df.reindex(columns=out_columns).to_csv(out, index=False, header=False)
+            total_rows += len(temp_df)
+    
+    if parquet:
+        write_dataset_schema(output_path, unify_schemas(schemas, out_columns[:-1]))
+    n_extra = len(union_col_set) - len(common_col_set)
+    print(f"Union of {len(out_columns) - 1} columns ({len(common_col_set)} in every year, {n_extra} in some): "
+          f"{total_rows} rows saved to {output_path}")
+
+
+def incremental_combine(folder, chosen_files_dict, common_col_set, output_path, catalog=None):
+    """
+    Rebuilds only the years whose source file changed, then reassembles the output.
+    
+    Every year is kept as a header-less CSV body in `folder`/_partitions, recorded in
+    partitions.json with the source file's sha256 and the output column list it was written
+    with. A year is re-parsed only if its source hash or the common-column set changed; the
+    final CSV is then a header line plus a byte copy of each partition, in year order.
+    Returns the list of rebuilt keys (e.g. ['SFA2324']).
+    """
+    part_dir = os.path.join(folder, PARTITIONS_DIR)
+    os.makedirs(part_dir, exist_ok=True)
+    state_path = os.path.join(part_dir, PARTITIONS_STATE)
+    state = {"columns": None, "years": {}}
+    if os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    
+    items = list(chosen_files_dict.items())
+    # Output columns follow the first file's header order, as pd.concat would give
+    first_header = header_columns(source_entry(catalog or {"files": {}, "stat": {}}, items[0][1]))
+    out_columns = [c for c in first_header if c in common_col_set] + ['year']
+    columns_sig = ",".join(out_columns)
+    
+    years = {}
+    rebuilt = []
+    for base_key, fp in items:
+        sha = file_sha256(fp)
+        part_path = os.path.join(part_dir, f"{base_key}.csv")
+        cached = state["years"].get(base_key)
+        if (cached and cached["source_sha256"] == sha and cached["columns"] == columns_sig
+                and os.path.exists(part_path)):
+            years[base_key] = cached
+            continue
+        
+        try:
+            temp_df = read_source_csv(fp, dtype=str, low_memory=False,
+                                      usecols=lambda c: c.lower().strip() in common_col_set)
+        except Exception as e:
+            print(f"Error reading file {fp}, leaving its year out: {e}")
+            continue
+        temp_df.columns = [col.lower().strip() for col in temp_df.columns]
+        record_parse(catalog, fp, temp_df)
+        temp_df['year'] = get_year_from_filename(fp)
+        temp_df[out_columns].to_csv(part_path, index=False, header=False, encoding='utf-8')
+        years[base_key] = {"source": os.path.basename(fp), "source_sha256": sha,
+                           "columns": columns_sig, "rows": len(temp_df)}
+        rebuilt.append(base_key)
+    
+    # Years that disappeared from the folder (or failed to read) drop out of the output
+    for base_key in set(state["years"]) - set(years):
+        stale = os.path.join(part_dir, f"{base_key}.csv")
+        if os.path.exists(stale):
+            os.remove(stale)
+    
+    if not years:
+        print("No dataframes to combine. Possibly all read attempts failed.")
+        return rebuilt
+    
+    # Reassemble: header + partition bodies, copied as bytes
+    with open(output_path, 'w', encoding='utf-8', newline='') as out:
+        pd.DataFrame(columns=out_columns).to_csv(out, index=False)
+    with open(output_path, 'ab') as out:
+        for base_key in years:
+            with open(os.path.join(part_dir, f"{base_key}.csv"), 'rb') as part:
+                shutil.copyfileobj(part, out, 16 * 1024 * 1024)
+    
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump({"columns": columns_sig, "years": years}, f, indent=2)
+    
+    total_rows = sum(y["rows"] for y in years.values())
+    print(f"Rebuilt {len(rebuilt)} of {len(years)} years ({', '.join(rebuilt) or 'none'}).")
+    print(f"Combined dataset with {total_rows} rows and {len(out_columns)} columns saved to {output_path}")
+    return rebuilt
+
+
+def combine_csvs(folder, output_csv="combined_ipeds_sfa.csv", from_zips=False, memory_budget_mb=None, jobs=1,
+                 typed=False, incremental=False, variables=None, union=False, value_labels=None):
     """
     1) Finds all SFA files in `folder` and picks the _rv version if available.
+       With from_zips=True the downloaded SFAxxxx.zip archives are read directly
+       (the _rv member is preferred inside each zip) and nothing needs extracting.
     2) Identifies columns common to ALL files.
     3) Concatenates those columns from each file into one DataFrame,
        adding a 'year' column from the filename.
     4) Writes combined DataFrame to `output_csv`.
+    
+    If `memory_budget_mb` is given and the combined table is estimated (from the source
+    catalog, before reading any data) not to fit in it, steps 3-4 are streamed chunk by chunk
+    instead (see stream_combine) so peak memory stays within that budget; the output is identical.
+    With `jobs` > 1 the years are parsed in that many worker processes (see parallel_combine)
+    and written in year order.
+    
+    If `output_csv` ends in '.parquet' the result is written as a year-partitioned Parquet
+    dataset with numeric columns typed (see ipeds_io.write_table) instead of a CSV.
+    
+    With typed=True (in-memory path) every column gets the smallest safe type from the schema
+    inferred over all years (int32 UNITID, small ints/floats, categorical imputation flags),
+    cached in sfa_schema.json next to the data for the other stages; before/after memory is reported.
+    `value_labels` ({short: {code: label}} from the dictionaries' Frequencies sheets, see
+    rename_sfa_columns.combined_value_labels) makes every coded column a categorical over its
+    dictionary codes; the codes are kept, labels are applied only by decode_value_labels.
+    
+    With incremental=True (CSV output) only years whose source changed are re-parsed and the
+    output is reassembled from cached per-year partitions (see incremental_combine).
+    Returns the list of rebuilt years in that mode.
+    
+    `variables` (lowercase short names) restricts the output to those columns plus UNITID;
+    every mode then parses only those columns (see select_columns).
+    
+    With union=True every column found in any year is kept instead of only the common ones
+    (see union_combine); years without a column have it missing.
     """
-    chosen_files_dict = find_sfa_csvs(folder)
+    chosen_files_dict = find_sfa_zips(folder) if from_zips else find_sfa_csvs(folder)
     if not chosen_files_dict:
         print("No SFA CSV files found in the folder.")
         return
     
-    # We'll get a list of the final chosen CSV paths
+    catalog = load_source_catalog(folder)
+    try:
+        return run_combine(folder, chosen_files_dict, catalog, output_csv, memory_budget_mb, jobs, typed,
+                           incremental, variables, union, value_labels)
+    finally:
+        save_source_catalog(catalog, folder)
+
+
+def fits_in_memory(catalog, file_paths, common_col_set, memory_budget_mb):
+    """
+    Whether the in-memory combine is expected to stay within `memory_budget_mb`, judged from
+    the source catalog's row counts (or size-based guesses) without reading any data.
+    The parser and the concatenated frame are both alive at the end, hence the factor of 2.
+    """
+    estimate = 2 * estimate_frame_mb(catalog, file_paths, common_col_set, EST_BYTES_PER_CELL)
+    fits = estimate <= memory_budget_mb
+    print(f"Estimated in-memory combine: {estimate:.0f} MB; budget {memory_budget_mb:.0f} MB "
+          f"-> {'in memory' if fits else 'streaming'}")
+    return fits
+
+
+def run_combine(folder, chosen_files_dict, catalog, output_csv, memory_budget_mb, jobs, typed, incremental,
+                variables, union=False, value_labels=None):
+    """ Steps 2-4 of combine_csvs, with the source catalog already loaded. """
     final_file_paths = list(chosen_files_dict.values())
+    output_path = os.path.join(folder, output_csv)
+    if union:
+        if typed or incremental or (jobs and jobs > 1) or memory_budget_mb:
+            print("Union combine runs one year at a time; ignoring --typed/--incremental/--jobs/--memory-budget-mb.")
+        # Intersection and union both come from the catalog's headers
+        union_col_set = select_columns(union_columns(catalog, final_file_paths), variables)
+        common_col_set = get_common_columns(final_file_paths, catalog) & union_col_set
+        union_combine(chosen_files_dict, union_col_set, common_col_set, output_path, catalog)
+        return
+    
     # 1) Find intersection of columns
-    common_col_set = get_common_columns(final_file_paths)
+    common_col_set = select_columns(get_common_columns(final_file_paths, catalog), variables)
     
     if not common_col_set:
         print("Cannot combine, no common columns.")
         return
     
+    if incremental and not is_parquet_path(output_path) and not typed:
+        return incremental_combine(folder, chosen_files_dict, common_col_set, output_path, catalog)
+    if incremental:
+        print("Incremental rebuilds produce plain CSV output; doing a full combine instead.")
+    if is_parquet_path(output_path) and ((jobs and jobs > 1) or memory_budget_mb):
+        print("Parquet output is written from the in-memory combine; ignoring --jobs/--memory-budget-mb.")
+    elif typed and ((jobs and jobs > 1) or memory_budget_mb):
+        print("Typed output is built by the in-memory combine; ignoring --jobs/--memory-budget-mb.")
+    elif jobs and jobs > 1:
+        parallel_combine(chosen_files_dict, common_col_set, output_path, jobs, catalog)
+        return
+    elif memory_budget_mb and not fits_in_memory(catalog, final_file_paths, common_col_set, memory_budget_mb):
+        stream_combine(chosen_files_dict, common_col_set, output_path, memory_budget_mb, catalog)
+        return
+    
+    combined_df = build_combined_frame(folder, chosen_files_dict, common_col_set, typed=typed, catalog=catalog,
+                                       value_labels=value_labels)
+    if combined_df is None:
+        return
+    
+    # 4) Write out
+    write_table(combined_df, output_path)
+    print(f"Combined dataset with {combined_df.shape[0]} rows and {combined_df.shape[1]} columns saved to {output_path}")
+
+
+def combine_frame(folder, from_zips=False, typed=False, variables=None, value_labels=None):
+    """
+    Steps 1-3 of combine_csvs without writing anything: returns the combined DataFrame
+    (or None), for callers such as run_pipeline.py that keep working in memory.
+    """
+    chosen_files_dict = find_sfa_zips(folder) if from_zips else find_sfa_csvs(folder)
+    if not chosen_files_dict:
+        print("No SFA CSV files found in the folder.")
+        return None
+    catalog = load_source_catalog(folder)
+    try:
+        common_col_set = select_columns(get_common_columns(list(chosen_files_dict.values()), catalog), variables)
+        if not common_col_set:
+            print("Cannot combine, no common columns.")
+            return None
+        return build_combined_frame(folder, chosen_files_dict, common_col_set, typed=typed, catalog=catalog,
+                                    value_labels=value_labels)
+    finally:
+        save_source_catalog(catalog, folder)
+
+
+def build_combined_frame(folder, chosen_files_dict, common_col_set, typed=False, catalog=None, value_labels=None):
+    """
+    In-memory steps 2-3 of combine_csvs: reads each chosen file, keeps the common columns,
+    tags 'year' and concatenates. With typed=True the cached (or freshly inferred) schema
+    is applied per year before the concat; `value_labels` marks the coded columns for it. Each file parsed is recorded in the source
+    `catalog`, if given. Returns the DataFrame, or None if nothing was read.
+    """
     # We'll create a big list of DataFrames to concatenate
     df_list = []
     
@@ -156,17 +523,18 @@ def combine_csvs(folder, output_csv="combined_ipeds_sfa.csv"):
         # We want the final column names to be consistent, so let's convert to lowercase
         # so e.g. SFA file might have 'UNITID' or 'UnitID'.
         
-        # We can read the first row with `header=0`, but we'll rename them to lowercase
-        # We'll do a quick approach: read everything, rename columns to lowercase, keep intersection
+        # Only the common (or requested) columns are parsed at all; the rest are skipped by the parser
         # If you want to be extra safe with quotes or special characters, consider the standard `csv` approach with `quotechar` etc.
         try:
-            temp_df = pd.read_csv(fp, dtype=str, low_memory=False)
+            temp_df = read_source_csv(fp, dtype=str, low_memory=False,
+                                      usecols=lambda c: c.lower().strip() in common_col_set)
         except Exception as e:
-            print(f"Error reading file {fp}: {e}")
+            print(f"Error reading file {fp}, leaving its year out: {e}")
             continue
         
         # rename columns to lowercase
         temp_df.columns = [col.lower().strip() for col in temp_df.columns]
+        record_parse(catalog, fp, temp_df, infer=typed)
         
         # Filter to only common columns
         keep_cols = [c for c in temp_df.columns if c in common_col_set]
@@ -184,16 +552,49 @@ def combine_csvs(folder, output_csv="combined_ipeds_sfa.csv"):
     # 3) Concatenate everything
     if not df_list:
         print("No dataframes to combine. Possibly all read attempts failed.")
-        return
+        return None
     
-    combined_df = pd.concat(df_list, ignore_index=True)
+    if typed:
+        final_file_paths = list(chosen_files_dict.values())
+        schema = load_cached_schema(folder, final_file_paths, value_labels)
+        # A schema cached for a narrower variable list doesn't cover these columns
+        if schema is None or not set(common_col_set) <= set(schema):
+            schema = infer_schema(df_list, value_labels)
+            save_schema(folder, schema, final_file_paths, value_labels)
+        strings_mb = sum(memory_mb(d) for d in df_list)
+        df_list = [apply_schema(d, schema) for d in df_list]
     
-    # 4) Write out
-    output_path = os.path.join(folder, output_csv)
-    combined_df.to_csv(output_path, index=False, encoding='utf-8')
-    print(f"Combined dataset with {combined_df.shape[0]} rows and {combined_df.shape[1]} columns saved to {output_path}")
+    combined_df = pd.concat(df_list, ignore_index=True)
+    if typed:
+        report_memory(strings_mb, combined_df)
+    return combined_df
 
 
 if __name__ == "__main__":
-    data_folder = r"C:\IPEDS_Data\SFA"
-    combine_csvs(data_folder, output_csv="combined_ipeds_sfa.csv")
+    parser = argparse.ArgumentParser(description="Combine the yearly IPEDS SFA files.")
+    parser.add_argument("--folder", default=SFA_FOLDER)
+    parser.add_argument("--output", default="combined_ipeds_sfa.csv",
+                        help="output name; use a '.parquet' name for a partitioned Parquet dataset")
+    parser.add_argument("--from-zips", action="store_true", help="read the SFAxxxx.zip archives directly")
+    parser.add_argument("--memory-budget-mb", type=float, default=None,
+                        help="stream the combine in chunks that fit this budget")
+    parser.add_argument("--jobs", type=int, default=1, help="parse years in N worker processes")
+    parser.add_argument("--typed", action="store_true", help="infer and apply compact column types")
+    parser.add_argument("--incremental", action="store_true", help="only rebuild years whose source changed")
+    parser.add_argument("--variables", nargs="+", default=None,
+                        help="only these short variable names (UNITID is always kept)")
+    parser.add_argument("--union", action="store_true",
+                        help="keep columns found in any year, not just in every year")
+    parser.add_argument("--dict-folder", default=None,
+                        help="with --typed: store coded columns as categoricals over this folder's dictionary codes")
+    parser.add_argument("--engine", choices=CSV_ENGINES, default=CSV_ENGINE, help="CSV parser (see ipeds_io)")
+    args = parser.parse_args()
+    set_csv_engine(args.engine)
+    value_labels = None
+    if args.typed and args.dict_folder:
+        from rename_sfa_columns import load_value_labels, combined_value_labels
+        value_labels = combined_value_labels(load_value_labels(args.dict_folder))
+    combine_csvs(args.folder, output_csv=args.output, from_zips=args.from_zips,
+                 memory_budget_mb=args.memory_budget_mb, jobs=args.jobs, typed=args.typed,
+                 incremental=args.incremental, variables=args.variables, union=args.union,
+                 value_labels=value_labels)
@@ -1,119 +1,155 @@
-import requests
 import os
-import datetime
-import zipfile
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
-def get_remote_file_size(url):
-    """
-    Tries to retrieve the remote file size from the 'Content-Length' header via a HEAD request.
-    Returns an integer size in bytes, or None if not available or if the file doesn't exist on the remote.
-    """
-    try:
-        resp = requests.head(url, allow_redirects=True, timeout=10)
-        # If the file doesn't exist on remote, we might get 404, so check status_code first
-        if resp.status_code == 200 and 'Content-Length' in resp.headers:
-            return int(resp.headers['Content-Length'])
-        else:
-            return None
-    except Exception as e:
-        print(f"HEAD request failed for {url}: {e}")
-        return None
-
-def get_local_file_size(filepath):
-    """
-    Returns the size of the local file in bytes, or None if the file does not exist.
-    """
-    if os.path.exists(filepath):
-        return os.path.getsize(filepath)
-    else:
-        return None
-
-def download_zip(url, local_path):
-    """
-    Downloads the file from `url` to `local_path` via a GET request.
-    Returns True if download succeeded, False otherwise.
-    """
-    print(f"Downloading from {url} ...")
-    try:
-        with requests.get(url, stream=True, timeout=30) as r:
-            if r.status_code == 200:
-                with open(local_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                print(f"Downloaded successfully to {local_path}")
-                return True
-            else:
-                print(f"Failed to download. HTTP Status code: {r.status_code}")
-                return False
-    except Exception as e:
-        print(f"Error downloading {url}: {e}")
-        return False
+from ipeds_http import NCES_BASE_URL, DOWNLOAD_BUFFER_BYTES, make_session, HostLimiter, format_rate
+from ipeds_config import SFA_FOLDER
+from ipeds_manifest import DEFAULT_REVALIDATE_HOURS, load_manifest, save_manifest, changed_artifacts
+from ipeds_artifacts import fetch_with_store, extract_members, members_present
+from ipeds_catalog import DEFAULT_CATALOG_PATH, DEFAULT_TTL_HOURS, load_catalog, available
 
-def unzip_file(zip_path, extract_folder):
+def unzip_file(zip_path, extract_folder, store=None, year=None):
     """
-    Unzips the contents of `zip_path` into `extract_folder`.
+    Unzips the contents of `zip_path` into `extract_folder` (through the artifact `store`,
+    if given; see ipeds_artifacts.extract_members).
     """
     print(f"Unzipping {zip_path} ...")
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zf:
-            zf.extractall(extract_folder)
+        extract_members(zip_path, extract_folder, store=store, component="sfa", year=year)
         print(f"Extracted contents to {extract_folder}")
     except Exception as e:
         print(f"Error unzipping {zip_path}: {e}")
 
-def download_ipeds_sfa():
+def sync_sfa_year(year, filename, base_url, download_folder, session, limiter, manifest,
+                  retries=3, backoff=1.0, extract=True, max_age_hours=None, buffer_bytes=DOWNLOAD_BUFFER_BYTES,
+                  store=None):
+    """
+    Revalidates / downloads / unzips a single SFA year (e.g. "2013-2014", "SFA1314.zip").
+    Returns the number of bytes downloaded (0 if unchanged, missing or failed).
     """
-    Downloads IPEDS Student Financial Aid (SFA) ZIP files from the base year (13 => 2013-14)
-    up through the current year in two-digit format (e.g., 23 => 2023-24).
+    file_url = base_url + filename
+    local_zip_path = os.path.join(download_folder, filename)
+
+    print(f"\n--- Checking {filename} ---")
+
+    # 1) Conditional GET: a 304 costs one cheap round-trip and no re-unzip
+    with limiter.slot(file_url):
+        status = fetch_with_store(store, file_url, local_zip_path, manifest, "sfa", year, session=session,
+                                  retries=retries, backoff=backoff, max_age_hours=max_age_hours,
+                                  buffer_bytes=buffer_bytes)
+
+    if status == "missing":
+        print(f"Remote file not found for {filename} (likely not posted yet). Skipping.")
+        return 0
+    if status == "unchanged" and (not extract or members_present(local_zip_path, download_folder)):
+        print(f"{filename} unchanged since last download. Skipping unzip.")
+        return 0
+    if status == "failed":
+        return 0
+
+    # 2) New or revised content: unzip (outside the host slot; it's local work).
+    #    Not needed when the later stages read straight from the zips.
+    if extract:
+        unzip_file(local_zip_path, download_folder, store, year)
+    return manifest["artifacts"][filename]["size"] if status == "changed" else 0
+
+def download_ipeds_sfa(
+    download_folder=SFA_FOLDER,
+    base_url=NCES_BASE_URL,
+    max_workers=4,
+    per_host_limit=4,
+    retries=3,
+    backoff=1.0,
+    extract=True,
+    catalog_path=DEFAULT_CATALOG_PATH,
+    ttl_hours=DEFAULT_TTL_HOURS,
+    revalidate_hours=DEFAULT_REVALIDATE_HOURS,
+    buffer_bytes=DOWNLOAD_BUFFER_BYTES,
+    store=None
+):
+    """
+    Downloads the IPEDS Student Financial Aid (SFA) ZIP files listed as available in the
+    availability catalog (2013-14 onward; see ipeds_catalog), so years NCES hasn't posted
+    yet are never requested.
     
-    - Checks remote file size vs. local file size to decide whether to download:
-        * If local file doesn't exist or file sizes differ -> download & unzip.
-        * If file sizes match -> skip both download & unzip (assuming no change).
+    - Revalidates each zip against the download manifest (download_manifest.json
+      in `download_folder`) with If-None-Match / If-Modified-Since:
+        * 304 or identical content hash -> skip unzip.
+        * New or revised content -> save, record ETag/Last-Modified/size/sha256 & unzip.
     - Handles 404 or missing remote files gracefully (just prints a message).
+    - The availability catalog is trusted for `ttl_hours` (no HEAD probes). Zips the
+      manifest already describes are revalidated with a conditional GET on every run, unless
+      they were checked less than `revalidate_hours` ago (0, the default, always checks, so a
+      file NCES revised in place is picked up on the next run).
+    - Years are processed by `max_workers` threads sharing one keep-alive session,
+      with at most `per_host_limit` requests in flight to the same host.
+      Failed requests are retried `retries` times with exponential `backoff`.
+    - Each zip is downloaded into a .part file, resumed with HTTP Range after a dropped
+      connection, CRC-checked and only then renamed into place; `buffer_bytes` is the
+      read/write buffer size (see ipeds_manifest.fetch_if_changed).
+    - With an artifact `store` (see ipeds_artifacts) zips and extracted CSVs another run or
+      worker already has are linked in instead of downloaded / unzipped again.
+    - `base_url` can point at a local stand-in server for testing.
+    - extract=False keeps only the zips; combine_csvs(from_zips=True) reads them directly.
+    
+    Returns a summary dict: {"files": n, "bytes": total, "seconds": wall_time,
+    "changed_years": [...]}; the manifest keeps the same list (see ipeds_manifest.changed_artifacts).
     """
+    if not os.path.exists(download_folder):
+        os.makedirs(download_folder)
 
-    BASE_URL = "https://nces.ed.gov/ipeds/datacenter/data/"
-    DOWNLOAD_FOLDER = r"C:\IPEDS_Data\SFA"
-
-    if not os.path.exists(DOWNLOAD_FOLDER):
-        os.makedirs(DOWNLOAD_FOLDER)
-
-    # Start at 2013-14 => '13', go through the current year in 2-digit form
-    start_year = 13
-    current_year_2digits = datetime.datetime.now().year % 100  # e.g., 23 if it's 2023
-
-    for sy in range(start_year, current_year_2digits + 1):
-        ey = sy + 1  # e.g., 13 -> 14, 14 -> 15
-        filename = f"SFA{sy:02}{ey:02}.zip"
-        file_url = BASE_URL + filename
-        local_zip_path = os.path.join(DOWNLOAD_FOLDER, filename)
-
-        print(f"\n--- Checking {filename} ---")
-        
-        # 1) Check remote file size
-        remote_size = get_remote_file_size(file_url)
-        if remote_size is None:
-            print(f"Remote file not found or HEAD request failed for {filename} (likely not posted yet). Skipping.")
-            continue
-
-        # 2) Check local file size
-        local_size = get_local_file_size(local_zip_path)
+    years = available(load_catalog(catalog_path, base_url, ttl_hours), "sfa")
 
-        # 3) Compare sizes to decide whether to download
-        if local_size == remote_size:
-            print(f"Local file size matches remote ({remote_size} bytes). Skipping download & unzip.")
-            continue
-        else:
-            print(f"Either file missing or size differs (remote: {remote_size}, local: {local_size}).")
-            print(f"Will download {filename} now...")
+    manifest = load_manifest(download_folder)
+    session = make_session(pool_size=max(max_workers, per_host_limit))
+    limiter = HostLimiter(per_host=per_host_limit)
 
-        # 4) Download
-        download_succeeded = download_zip(file_url, local_zip_path)
+    t0 = time.perf_counter()
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(
+            lambda item: sync_sfa_year(*item, base_url, download_folder, session, limiter, manifest,
+                                       retries, backoff, extract, revalidate_hours, buffer_bytes, store),
+            years
+        ))
+    elapsed = time.perf_counter() - t0
+    save_manifest(manifest, download_folder)
 
-        # 5) If downloaded/updated, unzip
-        if download_succeeded:
-            unzip_file(local_zip_path, DOWNLOAD_FOLDER)
+    total_bytes = sum(results)
+    n_files = sum(1 for r in results if r)
+    changed = [e["year"] for e in changed_artifacts(manifest, component="sfa")]
+    print(f"\nDownloaded {n_files} file(s), {format_rate(total_bytes, elapsed)} total wall time.")
+    print(f"Changed years: {', '.join(sorted(changed)) if changed else 'none'}")
+    return {"files": n_files, "bytes": total_bytes, "seconds": elapsed, "changed_years": sorted(changed)}
 
 
 if __name__ == "__main__":
-    download_ipeds_sfa()
+    parser = argparse.ArgumentParser(description="Download IPEDS SFA zip files.")
+    parser.add_argument("--folder", default=SFA_FOLDER)
+    parser.add_argument("--base-url", default=NCES_BASE_URL)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--per-host", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--no-extract", action="store_true", help="keep the zips, don't unzip them")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH, help="availability catalog file")
+    parser.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL_HOURS,
+                        help="trust the availability catalog this long; 0 probes NCES again")
+    parser.add_argument("--revalidate-hours", type=float, default=DEFAULT_REVALIDATE_HOURS,
+                        help="trust downloaded zips this long without a conditional GET; 0 checks every run")
+    parser.add_argument("--buffer-kb", type=int, default=DOWNLOAD_BUFFER_BYTES // 1024,
+                        help="download read/write buffer size in KB")
+    parser.add_argument("--store", default=None, help="artifact store shared with other runs (see ipeds_artifacts)")
+    args = parser.parse_args()
+    download_ipeds_sfa(
+        download_folder=args.folder,
+        base_url=args.base_url,
+        max_workers=args.workers,
+        per_host_limit=args.per_host,
+        retries=args.retries,
+        extract=not args.no_extract,
+        catalog_path=args.catalog,
+        ttl_hours=args.ttl_hours,
+        revalidate_hours=args.revalidate_hours,
+        buffer_bytes=args.buffer_kb * 1024,
+        store=args.store
+    )
@@ -0,0 +1,318 @@
+import os
+import json
+import time
+import hashlib
+import shutil
+import sqlite3
+import zipfile
+import zlib
+import argparse
+import threading
+from contextlib import contextmanager
+
+from ipeds_config import DATA_ROOT
+from ipeds_manifest import file_sha256, now_iso, fetch_if_changed, manifest_entry, set_manifest_entry
+
+# Content-addressed store for raw zips, extracted members and compiled intermediates:
+#   <store>/objects/ab/abcdef...   one file per distinct content (named by its sha256)
+#   <store>/index.sqlite           which (component, year, name, revision) each object is
+# Identical files are stored once, whichever year or worker added them. Working folders get
+# hard links (copies where links aren't possible) to the objects, so several workers on
+# one node, or machines sharing the store on a mount, download and extract each file once.
+# Eviction deletes object files but keeps the index rows (the object is marked evicted), so
+# the revision history survives and a re-added object carries on where it left off.
+DEFAULT_STORE = os.path.join(DATA_ROOT, "artifacts")
+INDEX_NAME = "index.sqlite"
+
+# Default size cap for evict(); least recently used objects go first
+DEFAULT_MAX_MB = 4096
+
+# Waiting time for the index lock when other workers are writing to it
+LOCK_TIMEOUT_SECONDS = 60
+
+
+@contextmanager
+def connect(store=DEFAULT_STORE):
+    """ Connection to the store's index; commits on success, rolls back on error, always closes. """
+    os.makedirs(os.path.join(store, "objects"), exist_ok=True)
+    conn = sqlite3.connect(os.path.join(store, INDEX_NAME), timeout=LOCK_TIMEOUT_SECONDS)
+    try:
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS objects (
+                                sha256 TEXT PRIMARY KEY, size INTEGER, added_at TEXT, last_used REAL,
+                                evicted_at TEXT)""")
+            if "evicted_at" not in [row[1] for row in conn.execute("PRAGMA table_info(objects)")]:
+                conn.execute("ALTER TABLE objects ADD COLUMN evicted_at TEXT")
+            conn.execute("""CREATE TABLE IF NOT EXISTS artifacts (
+                                component TEXT, year TEXT, name TEXT, revision INTEGER, kind TEXT,
+                                sha256 TEXT, parent TEXT, meta TEXT, added_at TEXT,
+                                PRIMARY KEY (component, year, name, revision))""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_parent ON artifacts (parent, name, kind)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_sha ON artifacts (sha256)")
+            yield conn
+    finally:
+        conn.close()
+
+
+def object_path(store, sha):
+    return os.path.join(store, "objects", sha[:2], sha)
+
+
+def temp_name(path):
+    """ A sibling of `path` no other process or thread will pick. """
+    return f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+
+
+def add_object(store, src=None, data=None, sha=None):
+    """
+    Puts the file `src` (or the bytes `data`) into the object store and returns its sha256.
+    Content already present is not written again. Objects appear atomically (temp + rename),
+    so a reader never sees a partial one.
+    """
+    if sha is None:
+        sha = file_sha256(src) if src is not None else hashlib.sha256(data).hexdigest()
+    path = object_path(store, sha)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = temp_name(path)
+        if src is not None:
+            shutil.copyfile(src, tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        os.replace(tmp_path, path)
+    with connect(store) as conn:
+        conn.execute("""INSERT INTO objects VALUES (?, ?, ?, ?, NULL)
+                        ON CONFLICT (sha256) DO UPDATE SET last_used = excluded.last_used, evicted_at = NULL""",
+                     (sha, os.path.getsize(path), now_iso(), time.time()))
+    return sha
+
+
+def record_artifact(store, component, year, name, sha, kind="zip", parent=None, meta=None):
+    """
+    Indexes object `sha` as `name` of (`component`, `year`). A new revision is recorded only
+    when the content differs from the latest one. Returns the revision number.
+    """
+    with connect(store) as conn:
+        # Read the latest revision and insert the next one under the write lock, so workers
+        # recording the same name at once get consecutive revisions instead of a conflict
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("""SELECT revision, sha256 FROM artifacts WHERE component = ? AND year = ? AND name = ?
+                              ORDER BY revision DESC LIMIT 1""", (component, str(year), name)).fetchone()
+        if row and row[1] == sha:
+            if meta is not None:
+                conn.execute("UPDATE artifacts SET meta = ? WHERE component = ? AND year = ? AND name = ? AND revision = ?",
+                             (json.dumps(meta), component, str(year), name, row[0]))
+            return row[0]
+        revision = row[0] + 1 if row else 1
+        conn.execute("INSERT INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (component, str(year), name, revision, kind, sha, parent,
+                      json.dumps(meta) if meta is not None else None, now_iso()))
+        return revision
+
+
+def touch(conn, sha):
+    conn.execute("UPDATE objects SET last_used = ? WHERE sha256 = ?", (time.time(), sha))
+
+
+def latest(store, component, year, name):
+    """ The newest indexed revision of `name` for (`component`, `year`) as a dict, or None. """
+    with connect(store) as conn:
+        row = conn.execute("""SELECT revision, sha256, meta FROM artifacts WHERE component = ? AND year = ? AND name = ?
+                              ORDER BY revision DESC LIMIT 1""", (component, str(year), name)).fetchone()
+        if row is None or not os.path.exists(object_path(store, row[1])):
+            return None
+        touch(conn, row[1])
+    return {"revision": row[0], "sha256": row[1], "meta": json.loads(row[2]) if row[2] else None}
+
+
+def derived(store, parent, name, kind):
+    """ sha256 of the object derived from object `parent` as `name` (an extracted member, ...), or None. """
+    with connect(store) as conn:
+        row = conn.execute("SELECT sha256 FROM artifacts WHERE parent = ? AND name = ? AND kind = ? LIMIT 1",
+                           (parent, name, kind)).fetchone()
+        if row is None or not os.path.exists(object_path(store, row[0])):
+            return None
+        touch(conn, row[0])
+    return row[0]
+
+
+def materialize(store, sha, dest):
+    """
+    Makes `dest` a hard link to (or, across filesystems, a copy of) object `sha`; replaces `dest`.
+    Returns `dest`, or None if the object has been evicted (`dest` is then left alone).
+    """
+    with connect(store) as conn:
+        # Check and link under the write lock, so evict() can't delete the object in between
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        path = object_path(store, sha)
+        if not os.path.exists(path):
+            return None
+        tmp_path = temp_name(dest)
+        try:
+            os.link(path, tmp_path)
+        except OSError:
+            shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, dest)
+        touch(conn, sha)
+    return dest
+
+##############################
+#  Downloads and extraction through the store
+##############################
+
+def fetch_with_store(store, url, local_path, manifest, component, year, **fetch_kwargs):
+    """
+    fetch_if_changed, backed by the store (a no-op wrapper when `store` is None):
+    - a file missing locally that the store already has is linked in, and its manifest entry
+      (ETag, Last-Modified, size, hash, last check) seeded from the store, so it is only
+      revalidated, not downloaded again;
+    - whatever is current afterwards is added to the store for the other workers.
+    Returns fetch_if_changed's status.
+    """
+    if store is None:
+        return fetch_if_changed(url, local_path, manifest, component=component, year=year, **fetch_kwargs)
+    key = os.path.basename(local_path)
+    if not os.path.exists(local_path):
+        known = latest(store, component, year, key)
+        if known and known["meta"] and materialize(store, known["sha256"], local_path):
+            set_manifest_entry(manifest, key, known["meta"])
+    status = fetch_if_changed(url, local_path, manifest, component=component, year=year, **fetch_kwargs)
+    if status in ("changed", "unchanged"):
+        entry = manifest_entry(manifest, key)
+        add_object(store, local_path, sha=entry["sha256"])
+        record_artifact(store, component, year, key, entry["sha256"], kind="zip", meta=entry)
+    return status
+
+
+def member_is_current(path, info):
+    """ True if `path` already holds zip member `info` (same size and CRC-32). """
+    if not os.path.exists(path) or os.path.getsize(path) != info.file_size:
+        return False
+    crc = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            crc = zlib.crc32(block, crc)
+    return crc == info.CRC
+
+
+def members_present(zip_path, extract_folder):
+    """ True if every file of `zip_path` exists in `extract_folder` with its uncompressed size (no CRC check). """
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        for info in zf.infolist():
+            dest = os.path.join(extract_folder, *info.filename.split("/"))
+            if not info.is_dir() and not (os.path.exists(dest) and os.path.getsize(dest) == info.file_size):
+                return False
+    return True
+
+
+def extract_members(zip_path, extract_folder, members=None, store=None, component=None, year=None):
+    """
+    Extracts `members` (default: all files) of `zip_path` into `extract_folder` and returns
+    {member: extracted path}. Members already there with the right size and CRC are left
+    alone. With a `store`, each member is taken from (or added to) the store, keyed by the
+    zip's content hash, so a zip is decompressed once across runs and workers.
+    Existing files are replaced, never written in place (they may be links into the store).
+    """
+    os.makedirs(extract_folder, exist_ok=True)
+    zip_sha = file_sha256(zip_path) if store is not None else None
+    paths = {}
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        infos = [i for i in zf.infolist() if not i.is_dir() and (members is None or i.filename in members)]
+        for info in infos:
+            dest = os.path.join(extract_folder, *info.filename.split("/"))
+            paths[info.filename] = dest
+            if member_is_current(dest, info):
+                continue
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            if store is None:
+                tmp_path = temp_name(dest)
+                with zf.open(info) as src, open(tmp_path, 'wb') as out:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+                os.replace(tmp_path, dest)
+                continue
+            sha = derived(store, zip_sha, info.filename, "member")
+            if sha is not None and materialize(store, sha, dest):
+                continue
+            sha = add_object(store, data=zf.read(info))
+            record_artifact(store, component, year, info.filename, sha, kind="member", parent=zip_sha)
+            materialize(store, sha, dest)
+    return paths
+
+
+def derived_json(store, parent, name):
+    """ A compiled intermediate (JSON) stored for object `parent` under `name`, or None. """
+    if store is None:
+        return None
+    sha = derived(store, parent, name, "compiled")
+    if sha is None:
+        return None
+    with open(object_path(store, sha), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def put_derived_json(store, value, parent, component, year, name):
+    """ Stores the compiled intermediate `value` (JSON-serializable) for object `parent`. """
+    if store is None:
+        return
+    data = json.dumps(value, sort_keys=True).encode('utf-8')
+    sha = add_object(store, data=data)
+    record_artifact(store, component, year, name, sha, kind="compiled", parent=parent)
+
+##############################
+#  Size management
+##############################
+
+def usage(store=DEFAULT_STORE):
+    """ (number of objects, total bytes) in the store, not counting evicted ones. """
+    with connect(store) as conn:
+        n, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects WHERE evicted_at IS NULL").fetchone()
+    return n, total
+
+
+def evict(store=DEFAULT_STORE, max_mb=DEFAULT_MAX_MB):
+    """
+    Deletes least recently used objects until the store is within `max_mb`. Their index
+    entries stay, with the object marked evicted, so revision numbers keep counting from the
+    history. Files already linked into working folders keep their data. Returns bytes freed.
+    """
+    limit = max_mb * 1024 * 1024
+    freed = 0
+    with connect(store) as conn:
+        # Under the write lock, so no materialize() is between its check and its link
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects WHERE evicted_at IS NULL").fetchone()[0]
+        for sha, size in conn.execute("""SELECT sha256, size FROM objects WHERE evicted_at IS NULL
+                                         ORDER BY last_used""").fetchall():
+            if total <= limit:
+                break
+            path = object_path(store, sha)
+            if os.path.exists(path):
+                os.remove(path)
+            conn.execute("UPDATE objects SET evicted_at = ? WHERE sha256 = ?", (now_iso(), sha))
+            total -= size
+            freed += size
+    if freed:
+        print(f"Evicted {freed / (1024 * 1024):.1f} MB from {store}; {total / (1024 * 1024):.1f} MB left.")
+    return freed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or trim the IPEDS artifact store.")
+    parser.add_argument("--store", default=DEFAULT_STORE)
+    parser.add_argument("--evict-mb", type=float, default=None, help="evict LRU objects down to this size")
+    args = parser.parse_args()
+    if args.evict_mb is not None:
+        evict(args.store, args.evict_mb)
+    n, total = usage(args.store)
+    print(f"{args.store}: {n} objects, {total / (1024 * 1024):.1f} MB")
+    with connect(args.store) as conn:
+        for row in conn.execute("""SELECT component, year, name, MAX(revision) FROM artifacts
+                                   WHERE kind = 'zip' GROUP BY component, year, name ORDER BY component, year"""):
+            print(f"  {row[0]:<9} {row[1]:<10} {row[2]:<22} rev {row[3]}")
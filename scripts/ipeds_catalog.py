@@ -0,0 +1,109 @@
+import os
+import json
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from ipeds_http import NCES_BASE_URL, make_session, HostLimiter, request_with_retries
+from ipeds_config import DATA_ROOT
+
+CATALOG_NAME = "availability_catalog.json"
+DEFAULT_CATALOG_PATH = os.path.join(DATA_ROOT, CATALOG_NAME)
+
+# How long a catalog (and a manifest revalidation) is trusted without asking NCES again
+DEFAULT_TTL_HOURS = 24
+
+COMPONENTS = ("sfa", "sfa_dict", "hd")
+
+
+def candidate_artifacts(component):
+    """
+    Every file name NCES could have posted for `component`, as {year_label: file_name}:
+      sfa      -> {"2013-2014": "SFA1314.zip", ...}      (from 2013-14 to this year)
+      sfa_dict -> {"2013-2014": "SFA1314_Dict.zip", ...}
+      hd       -> {"2011": "HD2011.zip", ...}            (from 2011 to this year)
+    """
+    this_year = datetime.datetime.now().year
+    if component == "hd":
+        return {str(year): f"HD{year}.zip" for year in range(2011, this_year + 1)}
+    suffix = "_Dict.zip" if component == "sfa_dict" else ".zip"
+    return {f"{2000 + sy}-{2001 + sy}": f"SFA{sy:02}{sy + 1:02}{suffix}"
+            for sy in range(13, this_year % 100 + 1)}
+
+
+def load_catalog(catalog_path=DEFAULT_CATALOG_PATH, base_url=NCES_BASE_URL, ttl_hours=DEFAULT_TTL_HOURS):
+    """
+    Returns the availability catalog:
+    {"base_url": ..., "checked_at": ..., "artifacts": {"sfa": {"2013-2014": "SFA1314.zip", ...}, ...}}
+
+    A catalog younger than `ttl_hours` for the same base_url is used as-is - no network
+    requests at all. Otherwise it is refreshed (see refresh_catalog) and saved.
+    """
+    catalog = None
+    if os.path.exists(catalog_path):
+        with open(catalog_path, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+        if catalog.get("base_url") != base_url:
+            catalog = None
+
+    if catalog is not None and is_fresh(catalog.get("checked_at"), ttl_hours):
+        return catalog
+
+    catalog = refresh_catalog(catalog, base_url)
+    folder = os.path.dirname(catalog_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(catalog_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, indent=2, sort_keys=True)
+    return catalog
+
+
+def is_fresh(timestamp, ttl_hours):
+    """ True if ISO `timestamp` is less than `ttl_hours` old. """
+    if not timestamp or not ttl_hours:
+        return False
+    age = datetime.datetime.now() - datetime.datetime.fromisoformat(timestamp)
+    return age < datetime.timedelta(hours=ttl_hours)
+
+
+def refresh_catalog(catalog=None, base_url=NCES_BASE_URL, workers=8):
+    """
+    Probes NCES with parallel HEAD requests over one keep-alive session.
+    Files already known to exist are not probed again (NCES doesn't take releases down),
+    so a routine refresh only asks about the years that weren't posted last time.
+    """
+    known = (catalog or {}).get("artifacts", {})
+    to_probe = []
+    for component in COMPONENTS:
+        for year_label, name in candidate_artifacts(component).items():
+            if known.get(component, {}).get(year_label) != name:
+                to_probe.append((component, year_label, name))
+
+    session = make_session(pool_size=workers)
+    limiter = HostLimiter(per_host=workers)
+
+    def probe(item):
+        component, year_label, name = item
+        url = base_url + name
+        with limiter.slot(url):
+            try:
+                resp = request_with_retries(session, "HEAD", url, allow_redirects=True, timeout=10)
+                return item, resp.status_code == 200
+            except Exception as e:
+                print(f"HEAD request failed for {url}: {e}")
+                return item, False
+
+    print(f"Refreshing availability catalog ({len(to_probe)} probes) ...")
+    with session, ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(probe, to_probe))
+
+    artifacts = {component: dict(known.get(component, {})) for component in COMPONENTS}
+    for (component, year_label, name), exists in results:
+        if exists:
+            artifacts[component][year_label] = name
+    return {"base_url": base_url, "checked_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "artifacts": artifacts}
+
+
+def available(catalog, component):
+    """ [(year_label, file_name), ...] for `component`, oldest year first. """
+    return sorted(catalog["artifacts"].get(component, {}).items())
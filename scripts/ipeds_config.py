@@ -0,0 +1,69 @@
+import os
+import json
+
+from ipeds_http import NCES_BASE_URL
+
+# Root of the local data tree. Set IPEDS_DATA_ROOT to move it (or use "data_root" in a
+# config file for run_pipeline.py); the scripts' default folders all derive from it.
+DATA_ROOT = os.environ.get("IPEDS_DATA_ROOT", r"C:\IPEDS_Data")
+SFA_FOLDER = os.path.join(DATA_ROOT, "SFA")
+DICT_FOLDER = os.path.join(SFA_FOLDER, "Dict")
+HD_FOLDER = os.path.join(DATA_ROOT, "HD")
+
+# Settings run_pipeline.py understands. Folder/path entries left as None are derived
+# from data_root in load_config.
+DEFAULT_CONFIG = {
+    "data_root": DATA_ROOT,
+    "sfa_folder": None,
+    "dict_folder": None,
+    "hd_folder": None,
+    "output": None,                # final file; '.parquet' for a Parquet dataset, '.csv.gz' / '.csv.zst' compressed
+    "write_jobs": 1,               # worker processes formatting the CSV output (see ipeds_io.write_csv)
+    "split_mb": None,              # split the CSV output into numbered files of about this size
+    "base_url": NCES_BASE_URL,
+    "download": True,              # False = work from what's already on disk
+    "download_workers": 4,
+    "download_buffer_kb": 1024,    # read/write buffer per download
+    "artifact_store": None,        # shared content-addressed store (see ipeds_artifacts.py); None = off
+    "artifact_store_max_mb": 4096, # least recently used objects are evicted beyond this
+    "catalog_path": None,          # availability catalog; defaults to data_root/availability_catalog.json
+    "catalog_ttl_hours": 24,       # how long the availability catalog is trusted without new HEAD probes
+    "revalidate_hours": 0,         # how long downloaded files are trusted without a conditional GET; 0 = every run
+    "from_zips": True,             # read SFA data straight from the zips
+    "typed": False,
+    "csv_engine": "c",             # CSV parser: "c" (pandas) or "pyarrow" (multithreaded, see ipeds_io.py)
+    "variables": None,             # only these SFA variables (short names or dictionary titles); None = all
+    "hd_attributes": ["INSTNM"],   # HD columns attached to each row, e.g. ["INSTNM", "STABBR", "SECTOR"]
+    "hd_as_of": False,             # True = attributes from the HD release of each row's year (downloads every
+                                   # release); False = latest release only
+    "save_intermediates": False,   # also write the combined / renamed files
+    "database": None,              # also load the result into this SQLite file (see ipeds_db.py)
+}
+
+
+def load_config(path=None):
+    """
+    Builds the pipeline configuration:
+    1) DEFAULT_CONFIG,
+    2) overridden by the JSON file at `path` (or $IPEDS_CONFIG if `path` is None),
+    3) folders and output derived from data_root wherever they weren't set explicitly.
+    Unknown keys in the file are reported and ignored.
+    """
+    config = dict(DEFAULT_CONFIG)
+    path = path or os.environ.get("IPEDS_CONFIG")
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+        for key, value in overrides.items():
+            if key not in DEFAULT_CONFIG:
+                print(f"Ignoring unknown config key '{key}' in {path}")
+                continue
+            config[key] = value
+    
+    root = config["data_root"]
+    config["sfa_folder"] = config["sfa_folder"] or os.path.join(root, "SFA")
+    config["dict_folder"] = config["dict_folder"] or os.path.join(config["sfa_folder"], "Dict")
+    config["hd_folder"] = config["hd_folder"] or os.path.join(root, "HD")
+    config["catalog_path"] = config["catalog_path"] or os.path.join(root, "availability_catalog.json")
+    config["output"] = config["output"] or os.path.join(config["sfa_folder"], "combined_ipeds_sfa_with_name.csv")
+    return config
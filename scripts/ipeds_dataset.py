@@ -0,0 +1,181 @@
+import os
+
+import pandas as pd
+
+from ipeds_io import is_parquet_path, read_table, read_column_labels, parquet_column_names, read_value_labels, \
+    read_source_csv, iter_source_csv, csv_columns, csv_parts
+from ipeds_schema import short_name, decode_value_labels
+import ipeds_db
+
+# Rows per chunk when filtering a CSV (only the selected columns are parsed)
+CSV_CHUNK_ROWS = 200_000
+
+
+def is_sqlite_path(path):
+    return str(path).lower().endswith((".sqlite", ".db"))
+
+
+def year_label(year):
+    """ 2013 / '2013' / '2013-2014' -> '2013-2014'. """
+    text = str(year)
+    return text if "-" in text else f"{int(text)}-{int(text) + 1}"
+
+
+class IpedsDataset:
+    """
+    Lazy, read-only view of a pipeline output: a CSV (or a CSV split into numbered files by
+    ipeds_io.write_csv), a '.parquet' dataset or the SQLite store from ipeds_db.py.
+
+        ds = IpedsDataset("combined_ipeds_sfa_with_name.parquet")
+        df = ds.select("INSTNM", "scugrad").where(years=[2022, 2023], unitids=[100654]).to_pandas()
+
+    select() and where() only build up a plan; nothing is read until to_pandas(). The plan is
+    then pushed down to the storage: CSV columns are parsed with usecols (and filtered chunk
+    by chunk), Parquet uses column projection plus partition/row-group filters, SQLite a
+    WHERE on its indexed columns.
+
+    Columns may be given as short names ('scugrad', case-insensitive), full labels
+    ('SCUGRAD - Title ...') or just the dictionary title.
+
+    Coded columns come back as their codes ('R', 'A', ...); to_pandas(decode_labels=True)
+    swaps in the value labels recorded with a Parquet dataset or the SQLite store.
+    """
+
+    def __init__(self, path, columns=None, years=None, unitids=None):
+        self.path = path
+        self._columns = columns
+        self._years = years
+        self._unitids = unitids
+        self._available = None
+
+    def _with(self, **changes):
+        plan = {"columns": self._columns, "years": self._years, "unitids": self._unitids}
+        plan.update(changes)
+        ds = IpedsDataset(self.path, **plan)
+        ds._available = self._available
+        return ds
+
+    def select(self, *columns):
+        """ Restricts the result to `columns` (in this order). """
+        if len(columns) == 1 and not isinstance(columns[0], str):
+            columns = tuple(columns[0])
+        return self._with(columns=[self.resolve(c) for c in columns])
+
+    def where(self, years=None, unitids=None):
+        """ Keeps only rows whose year is in `years` (2013 or '2013-2014') and UNITID in `unitids`. """
+        changes = {}
+        if years is not None:
+            changes["years"] = sorted({year_label(y) for y in years})
+        if unitids is not None:
+            changes["unitids"] = sorted({int(u) for u in unitids})
+        return self._with(**changes)
+
+    ##############################
+    #  Schema
+    ##############################
+
+    @property
+    def columns(self):
+        """ Column labels of the dataset, read from the header / footers / metadata only. """
+        if self._available is None:
+            if is_sqlite_path(self.path):
+                labels = ipeds_db.column_labels(self.path)
+                self._available = list(labels.values())
+            elif is_parquet_path(self.path):
+                labels = read_column_labels(self.path)
+                self._available = [labels.get(c, c) for c in parquet_column_names(self.path)]
+            else:
+                self._available = csv_columns(csv_parts(self.path)[0])
+        return self._available
+
+    def resolve(self, identifier):
+        """ The dataset's own label for a short name, full label or dictionary title. """
+        if identifier in self.columns:
+            return identifier
+        wanted = identifier.strip().lower()
+        for col in self.columns:
+            if short_name(col) == wanted:
+                return col
+        for col in self.columns:
+            if " - " in col and col.split(" - ", 1)[1].strip().lower() == wanted:
+                return col
+        raise KeyError(f"No column '{identifier}' in {self.path}")
+
+    ##############################
+    #  Execution
+    ##############################
+
+    def explain(self):
+        """ One-line description of what to_pandas() will read. """
+        kind = "sqlite" if is_sqlite_path(self.path) else "parquet" if is_parquet_path(self.path) else "csv"
+        cols = "all columns" if self._columns is None else f"{len(self._columns)} column(s)"
+        return (f"{kind} scan of {os.path.basename(str(self.path).rstrip('/'))}: {cols}, "
+                f"years={self._years or 'all'}, unitids={self._unitids or 'all'}")
+
+    def to_pandas(self, decode_labels=False):
+        """
+        Executes the plan and returns the selected slice as a DataFrame. With decode_labels=True
+        coded columns get their value labels instead of codes (CSV outputs carry no labels).
+        """
+        if is_sqlite_path(self.path):
+            df = ipeds_db.query_sfa(self.path, self._columns, self._years, self._unitids)
+        elif is_parquet_path(self.path):
+            df = self._read_parquet()
+        else:
+            df = self._read_csv()
+        if decode_labels:
+            df = decode_value_labels(df, self.value_labels())
+        return df
+
+    def value_labels(self):
+        """ {short name: {code: label}} recorded for the dataset's coded columns ({} for a CSV). """
+        if is_sqlite_path(self.path):
+            return ipeds_db.value_labels(self.path)
+        if is_parquet_path(self.path):
+            return read_value_labels(self.path)
+        return {}
+
+    def _filter_columns(self):
+        """ Columns needed only to evaluate where(): (year column, UNITID column). """
+        year_col = self.resolve("year") if self._years is not None else None
+        unitid_col = self.resolve("unitid") if self._unitids is not None else None
+        return year_col, unitid_col
+
+    def _read_parquet(self):
+        year_col, unitid_col = self._filter_columns()
+        filters = []
+        if year_col:
+            filters.append((year_col, "in", self._years))
+        if unitid_col:
+            filters.append((unitid_col, "in", self._unitids))
+        df = read_table(self.path, columns=self._columns, filters=filters or None)
+        return df.reset_index(drop=True)
+
+    def _read_csv(self):
+        year_col, unitid_col = self._filter_columns()
+        if self._columns is None:
+            wanted = list(self.columns)
+        else:
+            wanted = list(self._columns)
+        needed = set(wanted) | {c for c in (year_col, unitid_col) if c}
+        files = csv_parts(self.path)
+        if year_col is None and unitid_col is None:
+            frames = [read_source_csv(fp, dtype=str, low_memory=False, usecols=lambda c: c in needed)[wanted]
+                      for fp in files]
+            return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+        years = set(self._years or [])
+        unitids = {str(u) for u in self._unitids or []}
+        parts = []
+        for fp in files:
+            for chunk in iter_source_csv(fp, CSV_CHUNK_ROWS, dtype=str, usecols=lambda c: c in needed):
+                keep = pd.Series(True, index=chunk.index)
+                if year_col:
+                    keep &= chunk[year_col].isin(years)
+                if unitid_col:
+                    keep &= chunk[unitid_col].isin(unitids)
+                if keep.any():
+                    parts.append(chunk.loc[keep, wanted])
+        if not parts:
+            return pd.DataFrame(columns=wanted, dtype=str)
+        return pd.concat(parts, ignore_index=True)
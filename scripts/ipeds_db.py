@@ -0,0 +1,249 @@
+import os
+import time
+import hashlib
+import sqlite3
+import argparse
+from contextlib import contextmanager
+
+import pandas as pd
+
+from ipeds_config import SFA_FOLDER
+from ipeds_io import read_table, coerce_numeric_columns
+from ipeds_manifest import now_iso
+from ipeds_schema import short_name
+
+# Local analytical copy of the final table: one row per institution and year in table
+# 'sfa', columns stored under their lowercase short names (scugrad, unitid, instnm, year),
+# indexed on unitid, year and (unitid, year).
+DB_NAME = "ipeds_sfa.sqlite"
+DEFAULT_DB_PATH = os.path.join(SFA_FOLDER, DB_NAME)
+
+TABLE = "sfa"
+
+# Rows per executemany() call while loading
+BATCH_ROWS = 50_000
+
+
+@contextmanager
+def connect(db_path=DEFAULT_DB_PATH):
+    """ Connection to the store; commits on success, rolls back on error, always closes. """
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS sfa_columns (
+                                name TEXT PRIMARY KEY, label TEXT, position INTEGER)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS sfa_column_titles (
+                                name TEXT, year TEXT, title TEXT, PRIMARY KEY (name, year))""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS sfa_loads (
+                                year TEXT PRIMARY KEY, n_rows INTEGER, content_hash TEXT, loaded_at TEXT)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS sfa_value_labels (
+                                name TEXT, code TEXT, label TEXT, PRIMARY KEY (name, code))""")
+            yield conn
+    finally:
+        conn.close()
+
+
+def sql_type(series):
+    if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(series):
+        return "REAL"
+    return "TEXT"
+
+
+def content_hash(df):
+    """
+    Fingerprint of one year's rows, in order, to skip reloading years that didn't change.
+    The per-row hashes are digested as a sequence, so reordered or swapped rows hash differently.
+    """
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    header = "\x1f".join(map(str, df.columns)).encode('utf-8')
+    return hashlib.sha256(header + row_hashes.tobytes()).hexdigest()
+
+
+def stored_columns(conn):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{TABLE}")')]
+
+
+def stored_types(conn):
+    return {row[1]: row[2] for row in conn.execute(f'PRAGMA table_info("{TABLE}")')}
+
+
+def ensure_table(conn, df):
+    """
+    Creates the sfa table (and indexes) for `df`, or adds any columns it doesn't have yet.
+    A column stored as a number that `df` now has as text (e.g. ZIP codes from before they
+    were kept zero-padded) would keep converting it through SQLite's type affinity, so the
+    table is then dropped and rebuilt, and every year reloaded.
+    """
+    existing = stored_types(conn)
+    changed = [c for c in df.columns if c in existing and existing[c] != "TEXT" and sql_type(df[c]) == "TEXT"]
+    if changed:
+        print(f"Column(s) {', '.join(changed)} are now stored as TEXT; rebuilding the '{TABLE}' table.")
+        conn.execute(f'DROP TABLE "{TABLE}"')
+        conn.execute("DELETE FROM sfa_loads")
+        existing = {}
+    if not existing:
+        col_defs = ", ".join(f'"{c}" {sql_type(df[c])}' for c in df.columns)
+        conn.execute(f'CREATE TABLE "{TABLE}" ({col_defs})')
+    else:
+        for c in df.columns:
+            if c not in existing:
+                conn.execute(f'ALTER TABLE "{TABLE}" ADD COLUMN "{c}" {sql_type(df[c])}')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_sfa_unitid ON "{TABLE}" (unitid)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_sfa_year ON "{TABLE}" (year)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_sfa_unitid_year ON "{TABLE}" (unitid, year)')
+
+
+def insert_rows(conn, df, batch_rows=BATCH_ROWS):
+    """ Bulk insert with executemany, `batch_rows` rows per call. """
+    placeholders = ", ".join("?" * len(df.columns))
+    col_list = ", ".join(f'"{c}"' for c in df.columns)
+    sql = f'INSERT INTO "{TABLE}" ({col_list}) VALUES ({placeholders})'
+    for start in range(0, len(df), batch_rows):
+        part = df.iloc[start:start + batch_rows].astype(object)
+        conn.executemany(sql, part.where(part.notna(), None).itertuples(index=False, name=None))
+
+
+def load_sfa_db(df, db_path=DEFAULT_DB_PATH, dict_maps=None, years=None, batch_rows=BATCH_ROWS,
+                value_labels=None):
+    """
+    Loads the final SFA table `df` (combined, renamed and merged; any column naming) into
+    the SQLite store at `db_path`.
+
+    - Columns are stored under their short names; the full labels ('SCUGRAD - Title') go in
+      sfa_columns, and per-year dictionary titles from `dict_maps` ({year: {short: title}},
+      see rename_sfa_columns.load_sfa_dictionaries) in sfa_column_titles.
+    - Coded columns are stored as their codes; `value_labels` ({short: {code: label}}) goes
+      in sfa_value_labels, for decoding on request (see value_labels()).
+    - Each year is upserted in its own transaction (delete that year, bulk-insert it), so a
+      failed load leaves the previous copy of the year intact.
+    - Years whose rows hash the same as when they were last loaded are skipped; `years`
+      restricts the load further.
+    - Without `years`, `df` is the whole table: years in the store that it no longer has
+      (dropped from the source) are deleted.
+    Returns the list of years (re)loaded.
+    """
+    labels = list(df.columns)
+    df = df.rename(columns={c: short_name(c) for c in labels})
+    df = coerce_numeric_columns(df, exclude=("year",))
+    df['year'] = df['year'].astype(str)
+
+    loaded = []
+    t0 = time.perf_counter()
+    with connect(db_path) as conn:
+        ensure_table(conn, df)
+        conn.executemany("INSERT OR REPLACE INTO sfa_columns VALUES (?, ?, ?)",
+                         [(short_name(label), label, i) for i, label in enumerate(labels)])
+        for year, titles in (dict_maps or {}).items():
+            conn.executemany("INSERT OR REPLACE INTO sfa_column_titles VALUES (?, ?, ?)",
+                             [(name, year, title) for name, title in titles.items()])
+        stored = set(df.columns)
+        conn.executemany("INSERT OR REPLACE INTO sfa_value_labels VALUES (?, ?, ?)",
+                         [(name, code, label) for name, codes in (value_labels or {}).items() if name in stored
+                          for code, label in codes.items()])
+        conn.commit()
+
+        previous = dict(conn.execute("SELECT year, content_hash FROM sfa_loads"))
+        if years is None:
+            gone = sorted(set(previous) - set(df['year']))
+            if gone:
+                with conn:
+                    conn.executemany(f'DELETE FROM "{TABLE}" WHERE year = ?', [(y,) for y in gone])
+                    conn.executemany("DELETE FROM sfa_loads WHERE year = ?", [(y,) for y in gone])
+                print(f"Removed {len(gone)} year(s) no longer in the data: {', '.join(gone)}")
+        for year, part in df.groupby('year', sort=True):
+            if years is not None and year not in years:
+                continue
+            digest = content_hash(part)
+            if previous.get(year) == digest:
+                continue
+            with conn:
+                conn.execute(f'DELETE FROM "{TABLE}" WHERE year = ?', (year,))
+                insert_rows(conn, part, batch_rows)
+                conn.execute("INSERT OR REPLACE INTO sfa_loads VALUES (?, ?, ?, ?)",
+                             (year, len(part), digest, now_iso()))
+            loaded.append(year)
+    print(f"Loaded {len(loaded)} year(s) into {db_path} in {time.perf_counter() - t0:.1f}s"
+          f"{': ' + ', '.join(loaded) if loaded else ' (all up to date)'}")
+    return loaded
+
+
+def column_labels(db_path=DEFAULT_DB_PATH):
+    """ {stored short name: full column label} as recorded at load time. """
+    with connect(db_path) as conn:
+        return dict(conn.execute("SELECT name, label FROM sfa_columns"))
+
+
+def institution_series(unitid, columns=None, db_path=DEFAULT_DB_PATH, labels=True):
+    """
+    One institution's time series (all years, oldest first) through the (unitid, year)
+    index. `columns` are short names or full labels (default: all). With labels=True the
+    result uses the full column labels the final CSV has.
+    """
+    with connect(db_path) as conn:
+        label_of = dict(conn.execute("SELECT name, label FROM sfa_columns"))
+        if columns is None:
+            names = stored_columns(conn)
+        else:
+            names = [short_name(c) for c in columns]
+            names = ["year"] + [n for n in names if n != "year"]
+        col_list = ", ".join(f'"{n}"' for n in names)
+        df = pd.read_sql_query(f'SELECT {col_list} FROM "{TABLE}" WHERE unitid = ? ORDER BY year',
+                               conn, params=(int(unitid),))
+    if labels:
+        df.rename(columns=label_of, inplace=True)
+    return df
+
+
+def query_sfa(db_path=DEFAULT_DB_PATH, columns=None, years=None, unitids=None, labels=True):
+    """
+    Rows of the store restricted to `years` / `unitids` (WHERE ... IN, answered from the
+    indexes), with only `columns` (short names or full labels; default all) in their order.
+    Rows come back by year, in the order they were loaded (the same order as the final CSV).
+    """
+    with connect(db_path) as conn:
+        label_of = dict(conn.execute("SELECT name, label FROM sfa_columns"))
+        names = stored_columns(conn) if columns is None else [short_name(c) for c in columns]
+        where, params = [], []
+        if years is not None:
+            where.append(f"year IN ({', '.join('?' * len(years))})")
+            params += [str(y) for y in years]
+        if unitids is not None:
+            where.append(f"unitid IN ({', '.join('?' * len(unitids))})")
+            params += [int(u) for u in unitids]
+        col_list = ", ".join(f'"{n}"' for n in names)
+        sql = f'SELECT {col_list} FROM "{TABLE}"'
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY year, rowid"
+        df = pd.read_sql_query(sql, conn, params=params)
+    if labels:
+        df.rename(columns=label_of, inplace=True)
+    return df
+
+
+def value_labels(db_path=DEFAULT_DB_PATH):
+    """ {short name: {code: label}} for the coded columns, as recorded at load time. """
+    labels = {}
+    with connect(db_path) as conn:
+        for name, code, label in conn.execute("SELECT name, code, label FROM sfa_value_labels"):
+            labels.setdefault(name, {})[code] = label
+    return labels
+
+
+def column_titles(name, db_path=DEFAULT_DB_PATH):
+    """ {year: title} for one variable (short name or label), from the dictionaries loaded. """
+    with connect(db_path) as conn:
+        rows = conn.execute("SELECT year, title FROM sfa_column_titles WHERE name = ? ORDER BY year",
+                            (short_name(name),))
+        return dict(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the final SFA table into the local SQLite store.")
+    parser.add_argument("--input", default=os.path.join(SFA_FOLDER, "combined_ipeds_sfa_with_name.csv"))
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--years", nargs="+", default=None, help="only (re)load these years, e.g. 2023-2024")
+    args = parser.parse_args()
+    load_sfa_db(read_table(args.input), args.db, years=set(args.years) if args.years else None)
@@ -0,0 +1,198 @@
+import os
+import re
+import json
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from ipeds_manifest import file_sha256, now_iso
+from ipeds_io import read_source_csv
+
+# Institution (HD) attributes, parsed once per HD release into an indexed SQLite table
+# hd_<year> (UNITID INTEGER PRIMARY KEY + every other HD column as TEXT).
+HD_DB_NAME = "hd_dimension.sqlite"
+
+
+def hd_release_year(hd_source):
+    """ 'HD2023.zip' / 'hd2023.csv' -> '2023'. """
+    match = re.search(r"hd(\d{4})", os.path.basename(str(hd_source)).lower())
+    if not match:
+        raise ValueError(f"Can't tell the HD release year from {hd_source}")
+    return match.group(1)
+
+
+@contextmanager
+def connect(db_path):
+    """ Connection to the HD store; commits on success, rolls back on error, always closes. """
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS hd_releases (
+                                year TEXT PRIMARY KEY, source TEXT, sha256 TEXT,
+                                columns TEXT, n_rows INTEGER, built_at TEXT)""")
+            yield conn
+    finally:
+        conn.close()
+
+
+def build_hd_release(hd_source, db_path):
+    """
+    Loads one HD release (zip or CSV) into table hd_<year> of the SQLite file `db_path`.
+    The HD file is parsed only when its content hash differs from the one recorded for
+    that year, so an unchanged release costs one sha256 and no parsing. Returns the year.
+    """
+    year = hd_release_year(hd_source)
+    sha = file_sha256(hd_source)
+    with connect(db_path) as conn:
+        row = conn.execute("SELECT sha256 FROM hd_releases WHERE year = ?", (year,)).fetchone()
+        if row and row[0] == sha:
+            return year
+
+        print(f"Building HD {year} dimension from {hd_source} ...")
+        hd_df = read_source_csv(hd_source, dtype=str, low_memory=False, encoding='latin1')
+        hd_df.columns = [c.strip().upper() for c in hd_df.columns]
+        if 'UNITID' not in hd_df.columns:
+            raise ValueError(f"HD file {hd_source} has no UNITID column")
+        hd_df = hd_df.drop_duplicates('UNITID')
+        others = [c for c in hd_df.columns if c != 'UNITID']
+
+        table = f"hd_{year}"
+        col_defs = ", ".join(['"UNITID" INTEGER PRIMARY KEY'] + [f'"{c}" TEXT' for c in others])
+        placeholders = ", ".join("?" * (len(others) + 1))
+        rows = zip(pd.to_numeric(hd_df['UNITID']).astype('int64').tolist(),
+                   *(hd_df[c].where(hd_df[c].notna(), None).tolist() for c in others))
+        conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+        conn.execute(f'CREATE TABLE "{table}" ({col_defs})')
+        conn.executemany(f'INSERT INTO "{table}" VALUES ({placeholders})', rows)
+        conn.execute("INSERT OR REPLACE INTO hd_releases VALUES (?, ?, ?, ?, ?, ?)",
+                     (year, os.path.basename(str(hd_source)), sha, json.dumps(others), len(hd_df), now_iso()))
+    print(f"HD {year}: {len(hd_df)} institutions, {len(others)} attributes stored in {db_path}")
+    return year
+
+
+def load_hd_attributes(db_path, attributes=("INSTNM",), year=None):
+    """
+    DataFrame of the requested HD `attributes`, indexed by integer UNITID, from release
+    `year` (the newest one built if None). Only those columns are read; attributes this
+    release doesn't have are reported and skipped.
+    """
+    with connect(db_path) as conn:
+        if year is None:
+            row = conn.execute("SELECT year, columns FROM hd_releases ORDER BY year DESC LIMIT 1").fetchone()
+        else:
+            row = conn.execute("SELECT year, columns FROM hd_releases WHERE year = ?", (str(year),)).fetchone()
+        if row is None:
+            raise LookupError(f"No HD release {year or ''} has been built in {db_path}")
+        year, stored = row[0], set(json.loads(row[1]))
+        wanted = [a.upper() for a in attributes]
+        missing = [a for a in wanted if a not in stored]
+        if missing:
+            print(f"HD {year} has no {', '.join(missing)}; skipped.")
+        cols = ", ".join(['"UNITID"'] + [f'"{a}"' for a in wanted if a in stored])
+        return pd.read_sql_query(f'SELECT {cols} FROM "hd_{year}"', conn, index_col='UNITID')
+
+
+def hd_dimension(hd_source, db_path, attributes=("INSTNM",)):
+    """ build_hd_release + load_hd_attributes for that release. """
+    year = build_hd_release(hd_source, db_path)
+    return load_hd_attributes(db_path, attributes, year)
+
+
+def lookup_attributes(unitids, dim):
+    """
+    Vectorized lookup: the rows of `dim` (indexed by integer UNITID) for each value of the
+    Series `unitids` (strings or numbers), aligned to its index; unknown UNITIDs get NaN.
+    """
+    codes = pd.to_numeric(unitids, errors='coerce').to_numpy(dtype='float64')
+    pos = dim.index.get_indexer(codes)
+    found = pos >= 0
+    out = {}
+    for col in dim.columns:
+        values = np.full(len(pos), np.nan, dtype=object)
+        values[found] = dim[col].to_numpy(dtype=object)[pos[found]]
+        out[col] = values
+    return pd.DataFrame(out, index=unitids.index, columns=dim.columns)
+
+##############################
+#  All releases: year-matched (as-of) attributes
+##############################
+
+def build_hd_releases(hd_sources, db_path):
+    """
+    Builds every HD release in `hd_sources` ({year: zip_path} or a list of paths).
+    Releases whose content hash is already recorded are skipped, so when NCES posts a new
+    HD year only that one file is parsed. Returns the list of years now in the store.
+    """
+    sources = hd_sources.values() if isinstance(hd_sources, dict) else hd_sources
+    for src in sources:
+        build_hd_release(src, db_path)
+    with connect(db_path) as conn:
+        return [row[0] for row in conn.execute("SELECT year FROM hd_releases ORDER BY year")]
+
+
+def load_hd_history(db_path, attributes=("INSTNM",)):
+    """
+    UNITID x HD-year table of `attributes` across every release in the store:
+    columns UNITID (int64), hd_year (int16) and the attributes (categoricals), sorted by
+    UNITID then hd_year. Only the rows where an institution's attributes actually changed
+    are kept (plus its first appearance), which keeps a dozen releases about the size of one.
+    """
+    wanted = [a.upper() for a in attributes]
+    with connect(db_path) as conn:
+        releases = conn.execute("SELECT year, columns FROM hd_releases ORDER BY year").fetchall()
+        if not releases:
+            raise LookupError(f"No HD release has been built in {db_path}")
+        selects = []
+        for year, columns in releases:
+            stored = set(json.loads(columns))
+            cols = ", ".join(f'"{a}"' if a in stored else f'NULL AS "{a}"' for a in wanted)
+            selects.append(f'SELECT "UNITID", {int(year)} AS hd_year{", " if cols else ""}{cols} FROM "hd_{year}"')
+        history = pd.read_sql_query(" UNION ALL ".join(selects), conn)
+
+    history = history.sort_values(['UNITID', 'hd_year'], kind='stable', ignore_index=True)
+    same_unit = history['UNITID'].eq(history['UNITID'].shift())
+    same_attrs = history[wanted].eq(history[wanted].shift()) | (history[wanted].isna() & history[wanted].shift().isna())
+    history = history[~(same_unit & same_attrs.all(axis=1))].reset_index(drop=True)
+    history = history.astype({'UNITID': 'int64', 'hd_year': 'int16', **{a: 'category' for a in wanted}})
+    print(f"HD history: {len(releases)} releases, {len(history)} attribute versions "
+          f"for {history['UNITID'].nunique()} institutions.")
+    return history
+
+
+def sfa_start_year(years):
+    """ Series of SFA year labels ('2013-2014') -> start years as float (2013.0); NaN if unparsable. """
+    return pd.to_numeric(years.astype(str).str[:4], errors='coerce')
+
+
+def asof_attributes(unitids, years, history):
+    """
+    Vectorized as-of lookup: for each (UNITID, year) pair, the attributes from the newest HD
+    release no later than that year (HD2013 describes 2013-14). Years before an institution's
+    first release fall back to its earliest one. `years` are SFA year labels or start years;
+    the result is aligned to `unitids`' index, NaN where the UNITID never appears in HD.
+
+    Works by binary search over the history keyed on UNITID * 10000 + hd_year, so the large
+    SFA side never has to be sorted.
+    """
+    attrs = [c for c in history.columns if c not in ('UNITID', 'hd_year')]
+    if history.empty:
+        return pd.DataFrame(np.nan, index=unitids.index, columns=attrs, dtype=object)
+    hist_ids = history['UNITID'].to_numpy(dtype='float64')
+    hist_keys = hist_ids * 10000 + history['hd_year'].to_numpy(dtype='float64')
+    ids = pd.to_numeric(unitids, errors='coerce').to_numpy(dtype='float64')
+    keys = ids * 10000 + sfa_start_year(years).fillna(0).to_numpy(dtype='float64')
+
+    pos = np.searchsorted(hist_keys, keys, side='right') - 1
+    # Newest release <= year for this UNITID, else its first release (the next entry)
+    back = (pos >= 0) & (hist_ids[pos.clip(min=0)] == ids)
+    pos = np.where(back, pos, pos + 1)
+    found = (pos < len(hist_ids)) & (hist_ids[pos.clip(max=len(hist_ids) - 1)] == ids)
+
+    out = {}
+    for col in attrs:
+        values = np.full(len(pos), np.nan, dtype=object)
+        values[found] = history[col].to_numpy(dtype=object)[pos[found]]
+        out[col] = values
+    return pd.DataFrame(out, index=unitids.index, columns=attrs)
@@ -0,0 +1,91 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+NCES_BASE_URL = "https://nces.ed.gov/ipeds/datacenter/data/"
+
+# Read / write buffer for downloads (iter_content chunks and the file buffer)
+DOWNLOAD_BUFFER_BYTES = 1024 * 1024
+
+# Status codes that are worth retrying (server hiccups / throttling).
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def make_session(pool_size=8):
+    """
+    Builds one shared keep-alive requests.Session.
+    The connection pool is sized so every worker thread can hold its own
+    persistent connection to the NCES host instead of reconnecting per request.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HostLimiter:
+    """
+    Caps how many requests may be in flight to any single host at once.
+    Use as:  with limiter.slot(url): ...
+    """
+
+    def __init__(self, per_host=4):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def _semaphore_for(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+    @contextmanager
+    def slot(self, url):
+        sem = self._semaphore_for(url)
+        sem.acquire()
+        try:
+            yield
+        finally:
+            sem.release()
+
+
+def request_with_retries(session, method, url, retries=3, backoff=1.0, **kwargs):
+    """
+    Sends `method` to `url` through `session`, retrying connection errors and
+    retryable status codes (429/5xx) with exponential backoff:
+        backoff, 2*backoff, 4*backoff, ...
+    Returns the final Response (which may still be a 404 etc.), or raises the
+    last exception if every attempt failed to connect.
+    """
+    for attempt in range(retries + 1):
+        try:
+            resp = session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            if attempt == retries:
+                raise
+            wait = backoff * (2 ** attempt)
+            print(f"{method} {url} failed ({e}); retrying in {wait:.1f}s ...")
+            time.sleep(wait)
+            continue
+
+        if resp.status_code in RETRYABLE_STATUS and attempt < retries:
+            resp.close()
+            wait = backoff * (2 ** attempt)
+            print(f"{method} {url} returned {resp.status_code}; retrying in {wait:.1f}s ...")
+            time.sleep(wait)
+            continue
+        return resp
+
+
+def format_rate(total_bytes, seconds):
+    """ Human-readable 'X.X MB in Y.Ys (Z.Z MB/s)' summary. """
+    mb = total_bytes / (1024 * 1024)
+    rate = mb / seconds if seconds > 0 else 0.0
+    return f"{mb:.1f} MB in {seconds:.1f}s ({rate:.2f} MB/s)"
@@ -0,0 +1,823 @@
+import io
+import os
+import re
+import csv
+import glob
+import gzip
+import json
+import shutil
+import zipfile
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ipeds_schema import is_numeric_column
+
+try:
+    # Optional: pip install pyarrow. Only needed for the Parquet paths and the pyarrow CSV engine.
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pa_csv = pq = None
+
+# CSV parser behind every read of SFA / HD / dictionary / output CSVs:
+#   "c"       - pandas' C parser (single-threaded)
+#   "pyarrow" - Arrow's CSV reader: decodes blocks on all cores, memory-maps plain files,
+#               streams zip members and transcodes latin1 itself; same DataFrames as "c"
+# Set IPEDS_CSV_ENGINE (or "csv_engine" in the pipeline config, --engine on the scripts) to
+# switch; worker processes inherit the environment variable.
+CSV_ENGINES = ("c", "pyarrow")
+CSV_ENGINE = os.environ.get("IPEDS_CSV_ENGINE", "c")
+
+# Arrow reads the file in blocks of this size, one block per thread
+ARROW_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Strings pandas reads as NaN by default; Arrow is given the same list so both engines agree
+PANDAS_NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+# read_csv keywords the pyarrow engine understands; anything else goes to the C parser
+ARROW_KWARGS = {"dtype", "usecols", "encoding", "low_memory"}
+
+# dtype values it honours (text); other dtypes go to the C parser as well
+ARROW_STRING_DTYPES = (str, object, "str", "object")
+
+##############################
+#  Choosing files / ZIP members
+##############################
+
+def prefer_rv(names, ext=".csv"):
+    """
+    Groups file names by their root (name without extension and '_rv') and picks one per root,
+    preferring the revised '_rv' version when both exist. This is the rule find_sfa_csvs uses.
+
+    prefer_rv(["sfa1314.csv", "sfa1314_rv.csv", "sfa1415.csv"]) ->
+        {"SFA1314": "sfa1314_rv.csv", "SFA1415": "sfa1415.csv"}
+
+    Names may include a directory part (as ZIP members can); the value keeps the full name.
+    """
+    chosen = {}
+    for name in names:
+        fname = os.path.basename(name).lower()
+        if not fname.endswith(ext):
+            continue
+        base_no_ext = fname[:-len(ext)]
+        is_rv = "_rv" in base_no_ext
+        root_key = base_no_ext.replace("_rv", "").upper()
+        # First one seen wins, unless a later one is the _rv revision
+        if root_key not in chosen or is_rv:
+            chosen[root_key] = name
+    return chosen
+
+
+def is_zip_source(src):
+    return str(src).lower().endswith(".zip")
+
+
+def find_zip_member(zf, exts=(".csv",)):
+    """
+    Picks the data member inside an open ZipFile: the first extension in `exts` that has any
+    members wins, and within it the '_rv' member is preferred over the original.
+    If several roots are present, the one matching the archive name (SFA1314.zip -> sfa1314*.csv)
+    is used, otherwise the first. Returns the member name or None.
+    """
+    names = zf.namelist()
+    stem = os.path.splitext(os.path.basename(zf.filename or ""))[0].upper()
+    for ext in exts:
+        chosen = prefer_rv(names, ext)
+        if chosen:
+            return chosen.get(stem, next(iter(chosen.values())))
+    return None
+
+
+def find_sfa_zips(folder):
+    """
+    Like find_sfa_csvs, but for the downloaded archives themselves:
+    {"SFA1314": "C:/IPEDS_Data/SFA/SFA1314.zip", ...}, in key (= year) order.
+    Only SFAxxxx.zip names count, so dictionary archives (SFAxxxx_Dict.zip) are skipped.
+    """
+    chosen = {}
+    for f in os.listdir(folder):
+        fname = f.lower()
+        if re.match(r"sfa\d{4}\.zip$", fname):
+            chosen[fname[:-len(".zip")].upper()] = os.path.join(folder, f)
+    return dict(sorted(chosen.items()))
+
+##############################
+#  Reading sources (plain file or ZIP member)
+##############################
+
+@contextmanager
+def open_source(src, exts=(".csv",)):
+    """
+    Yields a binary file object for `src`, which is either a plain file path or a .zip archive.
+    For archives the member is chosen with find_zip_member and streamed straight out of the
+    zip - nothing is extracted to disk.
+    """
+    if is_zip_source(src):
+        with zipfile.ZipFile(src, 'r') as zf:
+            member = find_zip_member(zf, exts)
+            if member is None:
+                raise FileNotFoundError(f"No {'/'.join(exts)} member found in {src}")
+            with zf.open(member) as f:
+                yield f
+    elif csv_compression(src):
+        with open_compressed(src) as f:
+            yield f
+    else:
+        with open(src, 'rb') as f:
+            yield f
+
+
+def source_name(src, exts=(".csv",)):
+    """
+    File name the data actually comes from: the basename of a plain path, or the chosen
+    member's basename for a zip (e.g. 'sfa1314_rv.csv'). Useful for year parsing / logging.
+    """
+    if is_zip_source(src):
+        with zipfile.ZipFile(src, 'r') as zf:
+            member = find_zip_member(zf, exts)
+        return os.path.basename(member) if member else os.path.basename(src)
+    return os.path.basename(src)
+
+
+def set_csv_engine(engine):
+    """ Makes `engine` ("c" or "pyarrow") the default CSV engine, here and in worker processes started later. """
+    global CSV_ENGINE
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine '{engine}'; choose from {', '.join(CSV_ENGINES)}")
+    if engine == "pyarrow" and pa_csv is None:
+        raise ImportError("The pyarrow CSV engine requires pyarrow: pip install pyarrow")
+    CSV_ENGINE = engine
+    os.environ["IPEDS_CSV_ENGINE"] = engine
+
+
+def is_string_dtype_arg(dtype):
+    """ True for the read_csv dtype arguments that mean "leave as text" (str, object). """
+    try:
+        return dtype in ARROW_STRING_DTYPES
+    except TypeError:
+        return False
+
+
+def use_arrow(engine, read_kwargs):
+    engine = engine or CSV_ENGINE
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine '{engine}'; choose from {', '.join(CSV_ENGINES)}")
+    if engine != "pyarrow" or not set(read_kwargs) <= ARROW_KWARGS:
+        return False
+    dtype = read_kwargs.get("dtype")
+    if isinstance(dtype, dict):
+        return all(is_string_dtype_arg(d) for d in dtype.values())
+    return dtype is None or is_string_dtype_arg(dtype)
+
+
+def mangle_duplicates(names):
+    """ Duplicate column names renamed the way pandas does it: a, a.1, a.2, ... """
+    seen = {}
+    out = []
+    for name in names:
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        out.append(name)
+    return out
+
+
+def pandas_column_names(names):
+    """ Header names as pandas gives them: empty ones become 'Unnamed: <position>', duplicates a, a.1, ... """
+    return mangle_duplicates([name if name != "" else f"Unnamed: {i}" for i, name in enumerate(names)])
+
+
+def arrow_csv_options(header_line, dtype=None, usecols=None, encoding='utf-8', low_memory=None, text_columns=()):
+    """
+    Arrow read/parse/convert options equivalent to pd.read_csv(dtype=..., usecols=..., encoding=...)
+    for a file whose header row is `header_line` (bytes) and has already been consumed.
+    Columns in `text_columns` are read as strings whatever they look like.
+    """
+    text = header_line.decode(encoding)
+    if text.startswith("\ufeff"):
+        text = text[1:]
+    names = pandas_column_names(next(csv.reader([text.rstrip("\r\n")]), []))
+    if usecols is None:
+        include = names
+    elif callable(usecols):
+        include = [n for n in names if usecols(n)]
+    else:
+        wanted = set(usecols)
+        include = [n for n in names if n in wanted]
+    if isinstance(dtype, dict):
+        as_text = {n for i, n in enumerate(names) if n in dtype or i in dtype}
+    elif dtype is not None:
+        as_text = set(include)
+    else:
+        as_text = set()
+    as_text |= set(text_columns)
+    read_options = pa_csv.ReadOptions(column_names=names, use_threads=True, block_size=ARROW_BLOCK_BYTES,
+                                      encoding=encoding)
+    # Quoted fields may span lines, as the C parser allows
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=include, strings_can_be_null=True, null_values=PANDAS_NA_VALUES,
+        column_types={n: pa.string() for n in include if n in as_text})
+    return read_options, parse_options, convert_options, include
+
+
+def temporal_columns(schema):
+    """
+    Columns Arrow inferred as dates / times / timestamps. The C parser leaves those as text,
+    so they are read again as strings.
+    """
+    return [field.name for field in schema if pa.types.is_temporal(field.type)]
+
+
+def arrow_to_pandas(table, release=False):
+    """
+    Arrow table -> DataFrame like the C parser's: missing strings are NaN, not None.
+    release=True frees the Arrow buffers column by column during the conversion (only for
+    tables nothing else shares buffers with).
+    """
+    null_columns = [name for name, col in zip(table.column_names, table.columns) if col.null_count]
+    df = table.to_pandas(split_blocks=True, self_destruct=release, deduplicate_objects=False)
+    for name in null_columns:
+        if df[name].dtype != object:
+            continue
+        values = df[name].to_numpy()
+        if not values.flags.writeable:
+            values = values.copy()
+        values[pd.isna(values)] = np.nan
+        df[name] = values
+    return df
+
+
+@contextmanager
+def open_arrow_source(src):
+    """
+    Yields (stream, header_line) for the Arrow engine: a memory map of a plain file, or the
+    zip member's stream, positioned just past the header row.
+    """
+    if is_zip_source(src) or csv_compression(src) or not isinstance(src, (str, os.PathLike)):
+        with (open_source(src) if isinstance(src, (str, os.PathLike)) else nullcontext(src)) as f:
+            header_line = f.readline()
+            yield f, header_line
+    else:
+        with open(src, 'rb') as f:
+            header_line = f.readline()
+        with pa.memory_map(str(src), 'r') as mm:
+            mm.seek(len(header_line))
+            yield mm, header_line
+
+
+def source_start(source):
+    """ Where a file object `source` is positioned now (None for paths), so a read can start over. """
+    return None if isinstance(source, (str, os.PathLike)) else source.tell()
+
+
+def rewind(source, start):
+    if start is not None:
+        source.seek(start)
+
+
+def empty_frame(columns):
+    """ What the C parser returns for a header-only file. """
+    return pd.DataFrame({n: pd.Series(dtype=object) for n in columns})
+
+
+def read_arrow_table(source, text_columns=(), **read_kwargs):
+    """ (Arrow table or None for a header-only file, columns in read order) for `source`. """
+    with open_arrow_source(source) as (stream, header_line):
+        read_options, parse_options, convert_options, include = arrow_csv_options(
+            header_line, text_columns=text_columns, **read_kwargs)
+        try:
+            return pa_csv.read_csv(stream, read_options=read_options, parse_options=parse_options,
+                                   convert_options=convert_options), include
+        except pa.ArrowInvalid as e:
+            if "Empty CSV file" not in str(e):
+                raise
+            return None, include
+
+
+@contextmanager
+def open_arrow_reader(source, **read_kwargs):
+    """
+    Streaming Arrow reader over `source` (None for a header-only file) and the columns it
+    returns; columns that look like dates or times are reopened as strings.
+    """
+    start = source_start(source)
+    text_columns = []
+    while True:
+        with open_arrow_source(source) as (stream, header_line):
+            read_options, parse_options, convert_options, include = arrow_csv_options(
+                header_line, text_columns=text_columns, **read_kwargs)
+            try:
+                reader = pa_csv.open_csv(stream, read_options=read_options, parse_options=parse_options,
+                                         convert_options=convert_options)
+            except pa.ArrowInvalid as e:
+                if "Empty CSV file" not in str(e):
+                    raise
+                reader = None
+            temporal = temporal_columns(reader.schema) if reader is not None else []
+            if not temporal:
+                yield reader, include
+                return
+        rewind(source, start)
+        text_columns = temporal
+
+
+def read_csv_c(source, **read_kwargs):
+    """ The C parser's read of a path (plain, zipped or compressed) or file object. """
+    if isinstance(source, (str, os.PathLike)):
+        with open_source(source) as f:
+            return pd.read_csv(f, **read_kwargs)
+    return pd.read_csv(source, **read_kwargs)
+
+
+def read_csv(source, engine=None, **read_kwargs):
+    """
+    pd.read_csv of a path or binary file object with the chosen `engine` (default CSV_ENGINE).
+    The pyarrow engine takes dtype (text dtypes only) / usecols / encoding; calls with other
+    options use "c", and so does any file Arrow can't parse (e.g. rows with missing fields,
+    which the C parser fills with NaN).
+    """
+    if not use_arrow(engine, read_kwargs):
+        return pd.read_csv(source, **read_kwargs)
+    start = source_start(source)
+    try:
+        table, include = read_arrow_table(source, **read_kwargs)
+        temporal = temporal_columns(table.schema) if table is not None else []
+        if temporal:
+            rewind(source, start)
+            table, include = read_arrow_table(source, text_columns=temporal, **read_kwargs)
+    except pa.ArrowInvalid as e:
+        print(f"pyarrow could not parse {source}, reading it with the C parser instead: {e}")
+        rewind(source, start)
+        return read_csv_c(source, **read_kwargs)
+    if table is None:
+        return empty_frame(include)
+    return arrow_to_pandas(table, release=True)[include]
+
+
+def iter_arrow_chunks(source, chunksize, **read_kwargs):
+    """ Exactly-`chunksize`-row chunks (the last may be shorter) from the Arrow streaming reader. """
+    with open_arrow_reader(source, **read_kwargs) as (reader, include):
+        if reader is None:
+            yield empty_frame(include)
+            return
+        batches, n_rows, start = [], 0, 0
+        for batch in reader:
+            batches.append(batch)
+            n_rows += batch.num_rows
+            while n_rows >= chunksize:
+                table = pa.Table.from_batches(batches, schema=reader.schema)
+                chunk = arrow_to_pandas(table.slice(0, chunksize))
+                chunk.index = pd.RangeIndex(start, start + chunksize)
+                yield chunk[include]
+                rest = table.slice(chunksize)
+                batches, n_rows, start = rest.to_batches(), rest.num_rows, start + chunksize
+        if n_rows:
+            chunk = arrow_to_pandas(pa.Table.from_batches(batches, schema=reader.schema))
+            chunk.index = pd.RangeIndex(start, start + n_rows)
+            yield chunk[include]
+
+
+def iter_csv(source, chunksize, engine=None, **read_kwargs):
+    """
+    Chunks of `chunksize` rows, like pd.read_csv(chunksize=...), with the chosen `engine`.
+    If Arrow fails part-way, the C parser takes over after the chunks already yielded.
+    """
+    if not use_arrow(engine, read_kwargs):
+        with pd.read_csv(source, chunksize=chunksize, **read_kwargs) as reader:
+            yield from reader
+        return
+    start = source_start(source)
+    done = 0
+    try:
+        for chunk in iter_arrow_chunks(source, chunksize, **read_kwargs):
+            yield chunk
+            done += 1
+    except pa.ArrowInvalid as e:
+        print(f"pyarrow could not parse {source}, reading it with the C parser instead: {e}")
+        rewind(source, start)
+        with (open_source(source) if isinstance(source, (str, os.PathLike)) else nullcontext(source)) as f:
+            with pd.read_csv(f, chunksize=chunksize, **read_kwargs) as reader:
+                for i, chunk in enumerate(reader):
+                    if i >= done:
+                        yield chunk
+
+
+def read_source_csv(src, engine=None, **read_kwargs):
+    """ pd.read_csv over a plain CSV or the CSV member of a zip (see read_csv for `engine`). """
+    if use_arrow(engine, read_kwargs):
+        return read_csv(src, engine, **read_kwargs)
+    with open_source(src) as f:
+        return pd.read_csv(f, **read_kwargs)
+
+
+def iter_source_csv(src, chunksize, engine=None, **read_kwargs):
+    """
+    Yields DataFrame chunks of `chunksize` rows from a plain CSV or the CSV member of a zip.
+    The underlying file (and archive) stays open only while the generator is being consumed.
+    """
+    if use_arrow(engine, read_kwargs):
+        yield from iter_csv(src, chunksize, engine, **read_kwargs)
+        return
+    with open_source(src) as f:
+        with pd.read_csv(f, chunksize=chunksize, **read_kwargs) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+def csv_columns(src, encoding='utf-8'):
+    """ Column names of a plain CSV or a zip's CSV member, as pandas would name them (header only). """
+    with open_source(src) as f:
+        text = io.TextIOWrapper(f, encoding=encoding, errors='replace', newline='')
+        return pandas_column_names(next(csv.reader(text), []))
+
+
+def read_source_bytes(src, exts=(".csv",)):
+    """ Whole content of a plain file or of the chosen zip member, as bytes. """
+    with open_source(src, exts) as f:
+        return f.read()
+
+
+##############################
+#  Whole-table read / write (CSV or partitioned Parquet)
+##############################
+
+def is_parquet_path(path):
+    """ Parquet outputs are directories named like 'combined_ipeds_sfa.parquet'. """
+    return str(path).lower().rstrip("/\\").endswith(".parquet")
+
+
+def coerce_numeric_columns(df, exclude=("year",)):
+    """
+    Returns a copy of `df` with the string columns the schema rules type as numbers (see
+    ipeds_schema.is_numeric_column) converted to int64 / float64. Textual columns, zero-padded
+    codes such as ZIP / OPEID / FIPS, and `exclude` stay as they are; `df` is not modified.
+    """
+    converted = {}
+    for col in df.columns:
+        if col in exclude or df[col].dtype != object:
+            continue
+        if is_numeric_column(col, df[col]):
+            converted[col] = pd.to_numeric(df[col])
+    return df.assign(**converted) if converted else df.copy(deep=False)
+
+
+def write_table(df, path, partition_cols=("year",), jobs=1, split_mb=None):
+    """
+    Writes `df` to `path`:
+    - '*.parquet' -> a Parquet dataset directory partitioned by `partition_cols`
+      (year=2013-2014/..., zstd-compressed, numeric columns stored as numbers).
+      Requires pyarrow: pip install pyarrow
+    - anything else -> a UTF-8 CSV, exactly as before; '*.gz' / '*.zst' names are compressed.
+      With `jobs` > 1 the rows are formatted in that many worker processes, and `split_mb`
+      splits the output into numbered files (see write_csv).
+    An existing Parquet directory at `path` is replaced, like an overwritten CSV.
+    """
+    if not is_parquet_path(path):
+        if (jobs and jobs > 1) or split_mb or csv_compression(path):
+            write_csv(df, path, jobs=jobs, split_mb=split_mb)
+        else:
+            remove_csv_output(path)
+            df.to_csv(path, index=False, encoding='utf-8')
+        return
+    
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    partitions = [c for c in partition_cols if c in df.columns]
+    df = coerce_numeric_columns(df, exclude=partitions)
+    df.to_parquet(path, engine='pyarrow', compression='zstd', index=False,
+                  partition_cols=partitions or None)
+
+
+def read_table(path, columns=None, filters=None):
+    """
+    Reads a table written by write_table (or any of the pipeline's CSVs) into a DataFrame.
+    CSVs are read as strings like everywhere else; Parquet keeps its stored types, and
+    the 'year' partition column comes back as plain strings. `columns` limits what is read.
+    Column labels recorded for a Parquet dataset (see write_column_labels) are applied, and
+    `columns` may use either the labels or the stored names.
+
+    `filters` (Parquet only) are pyarrow-style [(column, op, value), ...] predicates, e.g.
+    [("year", "in", ["2022-2023"])]; year directories and row groups that can't match are
+    never read.
+    """
+    if is_parquet_path(path):
+        labels = read_column_labels(path)
+        stored_name = {label: stored for stored, label in labels.items()}
+        if columns is not None:
+            columns = [stored_name.get(c, c) for c in columns]
+        if filters:
+            filters = [(stored_name.get(col, col), op, value) for col, op, value in filters]
+        # Datasets whose years have different columns carry their superset schema; columns a
+        # year doesn't have come back as nulls
+        df = pd.read_parquet(path, engine='pyarrow', columns=columns, filters=filters or None,
+                             schema=read_dataset_schema(path))
+        if 'year' in df.columns:
+            df['year'] = df['year'].astype(str)
+        if labels:
+            df.rename(columns=labels, inplace=True)
+        return df
+    if filters:
+        raise ValueError("read_table: filters are only supported for Parquet datasets")
+    # A split output (see write_csv) is read part by part, even if it has only one part
+    frames = [read_source_csv(p, dtype=str, low_memory=False, usecols=columns) for p in csv_parts(path)]
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+##############################
+#  Parallel CSV writer
+##############################
+
+# CSV outputs are compressed when their name says so, like pandas does: 'out.csv.gz', 'out.csv.zst'
+CSV_COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+# to_csv formats (and decides float / datetime formats for) this many cells at a time;
+# write_csv's row blocks are whole multiples of it, so block-wise output is byte-identical
+TO_CSV_CHUNK_CELLS = 100_000
+
+# Cells per row block handed to a worker (roughly 10-20 MB of CSV text for SFA data)
+CSV_BLOCK_CELLS = 2_000_000
+
+
+def csv_compression(path):
+    """ 'gzip' / 'zstd' for '*.gz' / '*.zst' paths, else None. """
+    if not isinstance(path, (str, os.PathLike)):
+        return None
+    return CSV_COMPRESSION_SUFFIXES.get(os.path.splitext(str(path))[1].lower())
+
+
+@contextmanager
+def open_compressed(path):
+    """ Binary stream of the decompressed content of a '*.gz' / '*.zst' file. """
+    if csv_compression(path) == "gzip":
+        with gzip.open(path, 'rb') as f:
+            yield f
+    else:
+        if pa is None:
+            raise ImportError("Reading .zst files requires pyarrow: pip install pyarrow")
+        # Buffered so the header row can be read with readline()
+        with io.BufferedReader(pa.input_stream(str(path), compression='zstd'), 1024 * 1024) as f:
+            yield f
+
+
+def compress_block(data, compression):
+    """
+    `data` as one self-contained gzip member / zstd frame. Concatenated members (frames) are a
+    valid gzip (zstd) stream, so blocks can be compressed independently and appended.
+    """
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if compression == "zstd":
+        if pa is None:
+            raise ImportError("Writing .zst files requires pyarrow: pip install pyarrow")
+        return pa.compress(data, codec='zstd', asbytes=True)
+    return data
+
+
+def format_csv_block(block, compression=None, header=False):
+    """ Rows of `block` as the UTF-8 bytes to_csv writes for them, optionally compressed (runs in workers). """
+    return compress_block(block.to_csv(index=False, header=header).encode('utf-8'), compression)
+
+
+def split_part_path(path, number):
+    """ Name of the `number`-th (1-based) file of a split output: 'out.csv.gz' -> 'out-0001.csv.gz'. """
+    folder, name = os.path.split(str(path))
+    stem, dot, ext = name.partition(".")
+    return os.path.join(folder, f"{stem}-{number:04d}{dot}{ext}")
+
+
+def split_parts(path):
+    """ Split files of the CSV output `path` that exist on disk, in order (see write_csv). """
+    folder, name = os.path.split(str(path))
+    stem, dot, ext = name.partition(".")
+    pattern = os.path.join(glob.escape(folder), f"{glob.escape(stem)}-[0-9][0-9][0-9][0-9]{dot}{glob.escape(ext)}")
+    return sorted(glob.glob(pattern))
+
+
+def csv_parts(path):
+    """ Files holding the CSV output `path`: [path] itself, or its split files in order. """
+    if os.path.exists(path):
+        return [path]
+    return split_parts(path) or [path]
+
+
+def remove_csv_output(path):
+    """ Deletes a previous CSV output at `path`, split files included, so no stale part survives. """
+    for p in ([path] if os.path.exists(path) else []) + split_parts(path):
+        os.remove(p)
+
+
+def formatted_blocks(df, block_rows, compression, jobs):
+    """
+    Yields the formatted (and compressed) row blocks of `df` in order. With `jobs` > 1 they
+    are formatted in worker processes, at most 2 * jobs blocks in flight.
+    """
+    starts = range(0, len(df), block_rows)
+    if not jobs or jobs <= 1:
+        for start in starts:
+            yield format_csv_block(df.iloc[start:start + block_rows], compression)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for start in starts:
+            pending.append(pool.submit(format_csv_block, df.iloc[start:start + block_rows], compression))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_csv(df, path, jobs=1, split_mb=None, block_cells=CSV_BLOCK_CELLS):
+    """
+    Writes `df` like df.to_csv(path, index=False) - byte for byte, when `path` isn't
+    compressed - formatting row blocks in `jobs` worker processes and appending them in order.
+    - '*.gz' / '*.zst' paths are compressed block by block (in the workers): the result is a
+      multi-member gzip / multi-frame zstd file that gzip, zstd, pandas and pyarrow read as one.
+    - With `split_mb` a new file, with its own header, is started at the first block boundary
+      that would take the current one past that many MB (on disk); the files are named
+      out-0001.csv, out-0002.csv, ... and read_table reads them back as one table.
+    Returns the list of files written.
+    """
+    compression = csv_compression(path)
+    chunk_rows = (TO_CSV_CHUNK_CELLS // (len(df.columns) or 1)) or 1
+    block_rows = chunk_rows * max(1, block_cells // TO_CSV_CHUNK_CELLS)
+    split_bytes = split_mb * 1024 * 1024 if split_mb else None
+    header = format_csv_block(df.iloc[:0], compression, header=True)
+    remove_csv_output(path)
+
+    paths = []
+    out = None
+    try:
+        for data in formatted_blocks(df, block_rows, compression, jobs):
+            if out is None or (split_bytes and out.tell() > len(header) and out.tell() + len(data) > split_bytes):
+                if out is not None:
+                    out.close()
+                paths.append(split_part_path(path, len(paths) + 1) if split_bytes else str(path))
+                out = open(paths[-1], 'wb')
+                out.write(header)
+            out.write(data)
+        if out is None:
+            # No rows: header only, like to_csv
+            paths.append(split_part_path(path, 1) if split_bytes else str(path))
+            out = open(paths[-1], 'wb')
+            out.write(header)
+    finally:
+        if out is not None:
+            out.close()
+    return paths
+
+
+##############################
+#  Cheap copies (header-only rename, metadata-only Parquet rename)
+##############################
+
+# Parquet datasets can carry display labels for their columns in this side file. pyarrow
+# ignores files starting with '_' when it reads the dataset, so the data files are untouched.
+COLUMN_LABELS_FILE = "_column_labels.json"
+
+
+def read_column_labels(path):
+    """ {stored column name: label} recorded for the Parquet dataset at `path`, or {}. """
+    labels_path = os.path.join(path, COLUMN_LABELS_FILE)
+    if not os.path.exists(labels_path):
+        return {}
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_column_labels(path, labels):
+    """ Records {stored column name: label} for the Parquet dataset at `path` (metadata only). """
+    with open(os.path.join(path, COLUMN_LABELS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(labels, f, indent=2)
+
+
+# Code -> label tables of a dataset's coded (categorical) columns, stored once instead of
+# per row: {short column name: {code: label}}. See ipeds_schema.decode_value_labels.
+VALUE_LABELS_FILE = "_value_labels.json"
+
+
+def read_value_labels(path):
+    """ {short column name: {code: label}} recorded for the Parquet dataset at `path`, or {}. """
+    labels_path = os.path.join(path, VALUE_LABELS_FILE)
+    if not os.path.exists(labels_path):
+        return {}
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_value_labels(path, value_labels):
+    """ Records the label tables of the Parquet dataset at `path` (metadata only). """
+    with open(os.path.join(path, VALUE_LABELS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(value_labels, f, indent=1, sort_keys=True)
+
+
+def parquet_column_names(path):
+    """ Stored column names of a Parquet dataset, read from the file footers only (no data). """
+    schema = read_dataset_schema(path)
+    return schema.names if schema is not None else pq.ParquetDataset(path).schema.names
+
+##############################
+#  Per-year partitions with a superset schema (union combine)
+##############################
+
+# Dataset-wide Arrow schema for datasets whose partitions don't all have the same columns.
+# Like the labels file, it starts with '_' so pyarrow's file discovery skips it.
+COMMON_METADATA_FILE = "_common_metadata"
+
+
+def read_dataset_schema(path):
+    """ The superset schema recorded for the Parquet dataset at `path`, or None. """
+    schema_path = os.path.join(path, COMMON_METADATA_FILE)
+    return pq.read_schema(schema_path) if os.path.exists(schema_path) else None
+
+
+def write_year_partition(df, path, year_label):
+    """
+    Writes one year's rows as `path`/year=<year_label>/part-0.parquet with only the columns
+    that year actually has (numeric where every value is), zstd-compressed.
+    Returns the Arrow schema written, for unify_schemas.
+    """
+    df = coerce_numeric_columns(df, exclude=("year",))
+    table = pa.Table.from_pandas(df.drop(columns=['year'], errors='ignore'), preserve_index=False)
+    part_dir = os.path.join(path, f"year={year_label}")
+    os.makedirs(part_dir, exist_ok=True)
+    pq.write_table(table, os.path.join(part_dir, "part-0.parquet"), compression='zstd')
+    return table.schema
+
+
+def unify_schemas(schemas, column_order):
+    """
+    Superset schema over per-year `schemas`, fields in `column_order`, plus the 'year'
+    partition column. A column typed differently across years is widened: ints and floats
+    to float64, anything mixed with text to string; a column that is all-null everywhere is string.
+    """
+    seen = {}
+    for schema in schemas:
+        for field in schema:
+            if not pa.types.is_null(field.type):
+                seen.setdefault(field.name, set()).add(field.type)
+    fields = []
+    for name in column_order:
+        types = seen.get(name, set())
+        if len(types) == 1:
+            arrow_type = types.pop()
+        elif types and all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    fields.append(pa.field("year", pa.string()))
+    return pa.schema(fields)
+
+
+def write_dataset_schema(path, schema):
+    pq.write_metadata(schema, os.path.join(path, COMMON_METADATA_FILE))
+
+
+def link_or_copy_tree(src_dir, dst_dir):
+    """
+    Replicates a dataset directory: hard links where the filesystem allows it (no data is
+    copied at all), plain file copies otherwise. An existing `dst_dir` is replaced.
+    """
+    if os.path.isdir(dst_dir):
+        shutil.rmtree(dst_dir)
+
+    def link_or_copy(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    shutil.copytree(src_dir, dst_dir, copy_function=link_or_copy)
+
+
+def copy_file_tail(src, dst, offset, buffer_size=16 * 1024 * 1024):
+    """
+    Copies everything from byte `offset` of open file `src` to the current end of open file
+    `dst`. Uses os.copy_file_range (in-kernel, no user-space copy) where available and falls
+    back to a large-buffer copyfileobj (e.g. on Windows). Returns the number of bytes copied.
+    """
+    dst.flush()
+    remaining = os.fstat(src.fileno()).st_size - offset
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < remaining:
+                n = os.copy_file_range(src.fileno(), dst.fileno(), remaining - copied, offset_src=offset + copied)
+                if n == 0:
+                    break
+                copied += n
+            return copied
+        except OSError:
+            # e.g. unsupported across these filesystems; finish the rest in user space
+            pass
+    src.seek(offset + copied)
+    shutil.copyfileobj(src, dst, buffer_size)
+    return remaining
@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import hashlib
+import zipfile
+import datetime
+import threading
+
+import requests
+import urllib3
+
+from ipeds_http import DOWNLOAD_BUFFER_BYTES, RETRYABLE_STATUS
+
+MANIFEST_NAME = "download_manifest.json"
+
+# How long a downloaded file is trusted without a conditional GET. 0 = revalidate on every run
+# (a 304 is one cheap round-trip); NCES revises posted files in place, so keep this short.
+DEFAULT_REVALIDATE_HOURS = 0
+
+# One lock for all manifest updates; downloads run in worker threads.
+_manifest_lock = threading.Lock()
+
+
+def now_iso():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """ Streams `path` through sha256 and returns the hex digest. """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def manifest_path_for(folder):
+    return os.path.join(folder, MANIFEST_NAME)
+
+
+def load_manifest(folder):
+    """
+    Loads the download manifest kept in `folder`.
+    Layout:
+    {
+      "artifacts": {
+        "SFA1314.zip": {"url": ..., "component": "sfa", "year": "2013-14",
+                        "etag": ..., "last_modified": ..., "size": ..., "sha256": ...,
+                        "checked_at": ..., "changed_at": ...},
+        ...
+      },
+      "last_run": {"started_at": ..., "changed": ["SFA2223.zip", ...]}
+    }
+    """
+    path = manifest_path_for(folder)
+    manifest = {"artifacts": {}, "last_run": {}}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest.update(json.load(f))
+        except Exception as e:
+            print(f"Could not read manifest {path} ({e}); starting a new one.")
+    manifest["last_run"] = {"started_at": now_iso(), "changed": []}
+    return manifest
+
+
+def save_manifest(manifest, folder):
+    """ Writes the manifest atomically (temp file + rename). """
+    path = manifest_path_for(folder)
+    tmp_path = path + ".tmp"
+    with _manifest_lock:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+def manifest_entry(manifest, key):
+    """ Copy of the manifest entry for file `key` ({} if there is none). """
+    with _manifest_lock:
+        return dict(manifest["artifacts"].get(key, {}))
+
+
+def set_manifest_entry(manifest, key, entry):
+    """ Replaces the manifest entry for file `key` (e.g. seeded from the artifact store). """
+    with _manifest_lock:
+        manifest["artifacts"][key] = dict(entry)
+
+
+def checked_recently(entry, max_age_hours):
+    """ True if the manifest `entry` was revalidated less than `max_age_hours` ago. """
+    if not max_age_hours or not entry.get("checked_at"):
+        return False
+    age = datetime.datetime.now() - datetime.datetime.fromisoformat(entry["checked_at"])
+    return age < datetime.timedelta(hours=max_age_hours)
+
+
+def part_state_path(part_path):
+    return part_path + ".json"
+
+
+def read_part_state(part_path, url):
+    """
+    Bytes already downloaded into `part_path` and the validators of the response they came
+    from, as (offset, state); (0, None) if there is no usable partial download of `url`.
+    """
+    state_path = part_state_path(part_path)
+    if not (os.path.exists(part_path) and os.path.exists(state_path)):
+        return 0, None
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except Exception:
+        return 0, None
+    if state.get("url") != url or not (state.get("etag") or state.get("last_modified")):
+        return 0, None
+    return os.path.getsize(part_path), state
+
+
+def discard_part(part_path):
+    for path in (part_path, part_state_path(part_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def content_range_start(resp):
+    """ First byte of a 206 response ('bytes 1000-4999/5000' -> 1000), or None. """
+    value = resp.headers.get("Content-Range", "")
+    if not value.startswith("bytes ") or "-" not in value:
+        return None
+    try:
+        return int(value[6:].split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def verify_download(path, name):
+    """ Error message if `path` (downloaded as `name`) is a zip whose members fail their CRC check, else None. """
+    if not name.lower().endswith(".zip"):
+        return None
+    try:
+        with zipfile.ZipFile(path, 'r') as zf:
+            bad = zf.testzip()
+    except zipfile.BadZipFile as e:
+        return str(e)
+    return f"corrupt member {bad}" if bad else None
+
+
+def iter_body(r, buffer_bytes):
+    """
+    The body of the streamed response `r` in pieces of at most `buffer_bytes`, each handed
+    over as soon as it arrives, so the bytes received before a dropped connection reach the
+    partial file (iter_content would discard a half-filled buffer along with the error).
+    read1() is urllib3 2's; with urllib3 1.x each piece is a read() of up to `buffer_bytes`
+    instead, which waits for the whole piece, so a drop loses at most that piece.
+    """
+    read = getattr(r.raw, "read1", r.raw.read)
+    try:
+        while True:
+            chunk = read(buffer_bytes, decode_content=True)
+            if not chunk:
+                return
+            yield chunk
+    except urllib3.exceptions.HTTPError as e:
+        raise requests.ConnectionError(e)
+
+
+def download_resumable(session, url, part_path, headers, retries=3, backoff=1.0,
+                       buffer_bytes=DOWNLOAD_BUFFER_BYTES):
+    """
+    GETs `url` into `part_path`, picking up after the last byte a previous attempt (or run)
+    wrote there: Range: bytes=<offset>- with If-Range set to that attempt's ETag (or
+    Last-Modified), so a file that changed in between is downloaded afresh instead of spliced.
+    A connection dropped mid-body (or a 429 / 5xx) is resumed the same way. `retries` bounds
+    the attempts in a row that bring no new bytes; an attempt that extends the partial file
+    resets that count and the backoff, so a slow or flaky link still finishes a large file.
+    `headers` (conditional GET) are only sent when starting from byte zero.
+
+    Returns (status_code, response headers, sha256 of the whole file, size); the status is
+    304 / 404 etc. when nothing was downloaded.
+    """
+    failures = 0
+    best = 0
+    while True:
+        offset, state = read_part_state(part_path, url)
+        best = max(best, offset)
+        if offset:
+            req_headers = {"Range": f"bytes={offset}-", "If-Range": state.get("etag") or state["last_modified"]}
+        else:
+            discard_part(part_path)
+            req_headers = dict(headers)
+        try:
+            with session.get(url, headers=req_headers, stream=True, timeout=30) as r:
+                if r.status_code in RETRYABLE_STATUS:
+                    raise requests.ConnectionError(f"HTTP {r.status_code}")
+                if r.status_code == 416 or (r.status_code == 206 and content_range_start(r) != offset):
+                    # The partial file doesn't line up with what the server has: start over
+                    discard_part(part_path)
+                    raise requests.ConnectionError(f"can't resume at byte {offset} (HTTP {r.status_code})")
+                if r.status_code not in (200, 206):
+                    return r.status_code, r.headers, None, 0
+                if r.status_code == 206:
+                    print(f"Resuming {url} at byte {offset} ...")
+                    mode = 'ab'
+                else:
+                    # Full body: first attempt, or the server couldn't / wouldn't resume
+                    print(f"Downloading from {url} ...")
+                    offset, mode = 0, 'wb'
+                    with open(part_state_path(part_path), 'w', encoding='utf-8') as f:
+                        json.dump({"url": url, "etag": r.headers.get("ETag"),
+                                   "last_modified": r.headers.get("Last-Modified")}, f)
+                expected = r.headers.get("Content-Length")
+                expected = offset + int(expected) if expected is not None else None
+                with open(part_path, mode, buffering=buffer_bytes) as f:
+                    for chunk in iter_body(r, buffer_bytes):
+                        f.write(chunk)
+                size = os.path.getsize(part_path)
+                if expected is not None and size != expected:
+                    raise requests.ConnectionError(f"connection closed at byte {size} of {expected}")
+                return r.status_code, r.headers, file_sha256(part_path, buffer_bytes), size
+        except requests.RequestException as e:
+            # Progress = the partial file got further than ever before (a server that ignores
+            # Range and drops at the same point every time makes none)
+            size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if size > best:
+                best, failures = size, 0
+            else:
+                failures += 1
+                if failures > retries:
+                    raise
+            wait = backoff * (2 ** max(failures - 1, 0))
+            print(f"Download of {url} interrupted ({e}); resuming in {wait:.1f}s ...")
+            time.sleep(wait)
+
+
+def fetch_if_changed(url, local_path, manifest, component=None, year=None,
+                     session=None, retries=3, backoff=1.0, max_age_hours=None,
+                     buffer_bytes=DOWNLOAD_BUFFER_BYTES):
+    """
+    Conditional GET of `url` into `local_path`, using the ETag / Last-Modified
+    recorded in `manifest` for this file (If-None-Match / If-Modified-Since).
+    With `max_age_hours`, a local copy that was revalidated more recently than that is
+    trusted as-is and no request is sent at all.
+
+    New content is written to `local_path`.part (resumed with HTTP Range after a dropped
+    connection or an interrupted run, see download_resumable), checked (zip CRCs), and
+    only then renamed over `local_path`, so `local_path` is always a complete file.
+    `buffer_bytes` is the read / write buffer size.
+
+    Returns one of:
+        "changed"   - new content was downloaded (caller should re-unzip)
+        "unchanged" - server said 304, or the bytes hash to what we already had
+        "missing"   - the remote file does not exist (404 etc.)
+        "failed"    - network / write / verification error (a partial download is kept
+                      in the .part file for the next attempt)
+    The manifest entry is updated in place; call save_manifest() afterwards.
+    """
+    key = os.path.basename(local_path)
+    part_path = local_path + ".part"
+    session = session or requests.Session()
+    entry = manifest_entry(manifest, key)
+
+    headers = {}
+    # Only revalidate if the local copy is still the one the manifest describes.
+    if entry and os.path.exists(local_path) and os.path.getsize(local_path) == entry.get("size"):
+        if checked_recently(entry, max_age_hours):
+            return "unchanged"
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        status_code, resp_headers, sha, size = download_resumable(
+            session, url, part_path, headers, retries=retries, backoff=backoff, buffer_bytes=buffer_bytes)
+        if status_code == 304:
+            status = "unchanged"
+        elif status_code in (200, 206):
+            problem = verify_download(part_path, key)
+            if problem:
+                discard_part(part_path)
+                print(f"Downloaded {key} failed verification ({problem}); discarded.")
+                return "failed"
+            os.replace(part_path, local_path)
+            discard_part(part_path)
+            status = "unchanged" if sha == entry.get("sha256") else "changed"
+            entry.update({
+                "etag": resp_headers.get("ETag"),
+                "last_modified": resp_headers.get("Last-Modified"),
+                "size": size,
+                "sha256": sha,
+            })
+            print(f"Downloaded to {local_path} ({size} bytes)")
+        else:
+            return "missing"
+    except Exception as e:
+        print(f"Error downloading {url}: {e}")
+        return "failed"
+
+    entry.update({"url": url, "component": component, "year": year, "checked_at": now_iso()})
+    if status == "changed":
+        entry["changed_at"] = entry["checked_at"]
+    with _manifest_lock:
+        manifest["artifacts"][key] = entry
+        if status == "changed":
+            manifest["last_run"]["changed"].append(key)
+    return status
+
+
+def changed_artifacts(manifest, component=None, since=None):
+    """
+    Lists manifest entries that changed, for downstream stages.
+    - since=None: only what changed during the most recent download run.
+    - since="2024-10-01T00:00:00": anything whose content changed at/after that time.
+    Optionally restricted to one `component` ("sfa", "sfa_dict", "hd").
+    """
+    artifacts = manifest.get("artifacts", {})
+    if since is None:
+        keys = manifest.get("last_run", {}).get("changed", [])
+    else:
+        keys = [k for k, e in artifacts.items() if e.get("changed_at", "") >= since]
+    entries = [artifacts[k] for k in keys if k in artifacts]
+    if component is not None:
+        entries = [e for e in entries if e.get("component") == component]
+    return entries
@@ -0,0 +1,354 @@
+import os
+import re
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from ipeds_manifest import file_sha256
+
+SCHEMA_NAME = "sfa_schema.json"
+
+# SFA source files a schema can be inferred from: sfa1314.csv, SFA1314_rv.csv, SFA1314.zip, ...
+SFA_SOURCE_RE = re.compile(r"sfa\d{4}(_rv)?\.(csv|zip)$", re.IGNORECASE)
+
+# Columns that must be typed a certain way no matter what the data looks like
+KEY_COLUMNS = {"unitid": "int32"}
+
+# Identifiers that look numeric but are codes whose leading zeros matter (ZIP '01002',
+# state FIPS '01', OPEID '00100200'): always kept as text
+TEXT_COLUMNS = {"zip", "zipc", "opeid", "fips", "countycd", "cngdstcd", "ein"}
+
+# Text columns with more distinct values than this are never made categorical
+MAX_CATEGORIES = 1000
+
+# Candidate integer types, smallest first
+INT_TYPES = [("int8", np.int8), ("int16", np.int16), ("int32", np.int32), ("int64", np.int64)]
+
+
+def short_name(col):
+    """ 'SCUGRAD - Title' or 'SCUGRAD' -> 'scugrad' (schema keys are lowercase short names). """
+    return col.split(" - ", 1)[0].strip().lower()
+
+
+def is_imputation_flag(col, all_cols):
+    """
+    IPEDS imputation flags are named 'X' + the variable they describe, e.g. XSCUGFFN for SCUGFFN.
+    """
+    return col.startswith("x") and col[1:] in all_cols
+
+##############################
+#  Inference
+##############################
+
+def column_stats(series):
+    """ Summary of one column of strings, enough to pick a type. Vectorized; no row loops. """
+    values = series.dropna()
+    stats = {"missing": len(values) < len(series), "numeric": True, "integer": True,
+             "min": None, "max": None, "float32_exact": True, "zero_padded": False, "values": set()}
+    if values.empty:
+        return stats
+    nums = pd.to_numeric(values, errors='coerce')
+    if nums.isna().any():
+        # Text column: remember its distinct values (if few enough) for categoricals
+        distinct = values.unique()
+        stats["numeric"] = False
+        stats["values"] = set(distinct) if len(distinct) <= MAX_CATEGORIES else None
+        return stats
+    # '01002' parses as a number but is a code; converting it would lose the zero
+    stats["zero_padded"] = bool(values.astype(str).str.match(r"\s*[+-]?0\d").any())
+    stats["integer"] = bool((nums % 1 == 0).all())
+    stats["min"], stats["max"] = float(nums.min()), float(nums.max())
+    stats["float32_exact"] = bool((nums.astype(np.float32).astype(np.float64) == nums).all())
+    return stats
+
+
+def merge_stats(a, b):
+    """ Combines column_stats from two files/chunks of the same column. """
+    if a is None:
+        return b
+    merged = {
+        "missing": a["missing"] or b["missing"],
+        "numeric": a["numeric"] and b["numeric"],
+        "integer": a["integer"] and b["integer"],
+        "float32_exact": a["float32_exact"] and b["float32_exact"],
+        "zero_padded": a["zero_padded"] or b["zero_padded"],
+    }
+    if a["values"] is None or b["values"] is None:
+        merged["values"] = None
+    else:
+        merged["values"] = a["values"] | b["values"]
+        if len(merged["values"]) > MAX_CATEGORIES:
+            merged["values"] = None
+    mins = [x for x in (a["min"], b["min"]) if x is not None]
+    maxs = [x for x in (a["max"], b["max"]) if x is not None]
+    merged["min"] = min(mins) if mins else None
+    merged["max"] = max(maxs) if maxs else None
+    return merged
+
+
+def choose_type(col, stats, all_cols, codes=None):
+    """
+    Smallest safe type for a column, as a schema entry {"dtype": ...[, "categories": [...]]}.
+    Integer columns with missing values use pandas' nullable types (Int8, Int16, ...).
+    `codes` are the column's code values from the dictionary, if it is a coded variable:
+    text codes become a categorical over every dictionary code (plus any value seen that the
+    dictionary doesn't list), so all years share one category table.
+    """
+    if col in KEY_COLUMNS:
+        dtype = KEY_COLUMNS[col]
+        return {"dtype": dtype.capitalize() if stats["missing"] else dtype}
+    if codes and not stats["numeric"] and stats["values"] is not None:
+        return {"dtype": "category", "categories": sorted(set(codes) | stats["values"])}
+    if is_imputation_flag(col, all_cols) and not stats["numeric"] and stats["values"] is not None:
+        return {"dtype": "category", "categories": sorted(stats["values"])}
+    if col in TEXT_COLUMNS or stats["zero_padded"] or not stats["numeric"] or stats["min"] is None:
+        return {"dtype": "object"}
+    if stats["integer"]:
+        for name, np_type in INT_TYPES:
+            info = np.iinfo(np_type)
+            if info.min <= stats["min"] and stats["max"] <= info.max:
+                return {"dtype": name.capitalize() if stats["missing"] else name}
+    return {"dtype": "float32" if stats["float32_exact"] else "float64"}
+
+
+def is_numeric_column(col, series):
+    """
+    True if the string column `series` (named `col`, any naming) would be typed as a number:
+    every value parses and it isn't a zero-padded code or a known identifier (TEXT_COLUMNS).
+    """
+    stats = column_stats(series)
+    return stats["numeric"] and choose_type(short_name(col), stats, set())["dtype"] not in ("object", "category")
+
+
+def infer_schema(frames, value_labels=None):
+    """
+    Infers a schema from an iterable of string DataFrames (the per-year frames, or chunks of
+    them) that share lowercase short column names. Returns {column: {"dtype": ...}, ...}.
+    `value_labels` ({short: {code: label}}, see rename_sfa_columns.combined_value_labels)
+    marks the coded variables.
+    """
+    stats = {}
+    for df in frames:
+        for col in df.columns:
+            stats[col] = merge_stats(stats.get(col), column_stats(df[col]))
+    all_cols = set(stats)
+    value_labels = value_labels or {}
+    return {col: choose_type(col, s, all_cols, value_labels.get(col)) for col, s in stats.items()}
+
+##############################
+#  Applying + caching
+##############################
+
+def fitted_entry(col, series, entry):
+    """
+    `entry` widened as far as the values of `series` need, so the cast never loses data:
+    codes the schema's categories don't list are added to them, integers outside the type's
+    range get a wider integer type, fractions or float32-inexact values float64, and text
+    in a numeric column leaves it as text. Prints a note whenever it widens.
+    """
+    values = series.dropna()
+    if entry["dtype"] == "category":
+        unknown = set(values.unique()) - set(entry["categories"])
+        if not unknown:
+            return entry
+        print(f"  {col}: {len(unknown)} value(s) not among the schema's categories; adding them")
+        return {"dtype": "category", "categories": sorted(set(entry["categories"]) | unknown)}
+    nums = pd.to_numeric(values, errors='coerce')
+    if nums.isna().any():
+        print(f"  {col}: non-numeric values where the schema has {entry['dtype']}; keeping it as text")
+        return {"dtype": "object"}
+    dtype = entry["dtype"]
+    if dtype.lower().startswith("int"):
+        # Missing values need pandas' nullable integer (Int8, ...); fractions need a float
+        nullable = dtype[0].isupper() or len(values) < len(series)
+        if not (nums % 1 == 0).all():
+            widened = "float64"
+        else:
+            lo, hi = (nums.min(), nums.max()) if len(nums) else (0, 0)
+            names = [name for name, _ in INT_TYPES]
+            wider = names[names.index(dtype.lower()):]
+            name = next((n for n in wider if np.iinfo(n).min <= lo and hi <= np.iinfo(n).max), None)
+            widened = "float64" if name is None else name.capitalize() if nullable else name
+        if widened == dtype:
+            return entry
+    elif dtype == "float32" and not (nums.astype(np.float32).astype(np.float64) == nums).all():
+        widened = "float64"
+    else:
+        return entry
+    print(f"  {col}: values don't fit {dtype}; using {widened}")
+    return {"dtype": widened}
+
+
+def apply_schema(df, schema):
+    """
+    Casts the columns of `df` that appear in `schema` (matched by short name, so renamed
+    'SHORT - Title' columns work too). Each entry is first checked against the column's values
+    and widened if they don't fit it (see fitted_entry). Returns the converted DataFrame.
+    """
+    converted = {}
+    for col in df.columns:
+        entry = schema.get(short_name(col))
+        if entry is None or entry["dtype"] == "object":
+            continue
+        entry = fitted_entry(col, df[col], entry)
+        if entry["dtype"] == "object":
+            continue
+        if entry["dtype"] == "category":
+            converted[col] = df[col].astype(pd.CategoricalDtype(entry["categories"]))
+        else:
+            converted[col] = pd.to_numeric(df[col]).astype(entry["dtype"])
+    return df.assign(**converted) if converted else df
+
+
+def code_key(code):
+    """ Dictionary code for a stored value: 'R' -> 'R', 3 -> '3', 3.0 -> '3'. """
+    if isinstance(code, float) and code.is_integer():
+        return str(int(code))
+    return str(code)
+
+
+def decode_value_labels(df, value_labels, columns=None):
+    """
+    Replaces the codes of coded columns by their labels from `value_labels`
+    ({short: {code: label}}; columns matched by short name). Categorical columns only have
+    their category table relabeled, so no per-row strings are built; numeric codes become a
+    categorical of labels. Codes without a label are kept as they are. `columns` limits which
+    columns are decoded. Returns a new DataFrame; `df` is left encoded.
+    """
+    decoded = {}
+    for col in df.columns if columns is None else columns:
+        labels = value_labels.get(short_name(col))
+        if not labels:
+            continue
+        series = df[col]
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype("category")
+        names = [labels.get(code_key(code), code) for code in series.cat.categories]
+        if len(set(names)) == len(names):
+            decoded[col] = series.cat.rename_categories(names)
+        else:
+            # Two codes share a label: fall back to mapping the values
+            decoded[col] = series.map(dict(zip(series.cat.categories, names))).astype("category")
+    return df.assign(**decoded) if decoded else df
+
+
+def apply_cached_schema(df, folder):
+    """
+    Applies the schema cached in `folder` by combine_csvs(typed=True), if there is one. A
+    cache built from other source files than the SFA files now in `folder` is stale; the
+    schema is then inferred from `df` itself instead.
+    """
+    if not os.path.exists(os.path.join(folder, SCHEMA_NAME)):
+        print(f"No cached schema in {folder}; columns stay as read.")
+        return df
+    schema = load_cached_schema(folder)
+    if schema is None:
+        print(f"Cached schema in {folder} was built from other source files; inferring one from this data.")
+        schema = infer_schema([df.rename(columns=short_name)])
+    strings_mb = memory_mb(df)
+    df = apply_schema(df, schema)
+    report_memory(strings_mb, df)
+    return df
+
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+
+def report_memory(before_mb, df, label="Memory"):
+    """
+    Prints a before/after line like 'Memory: 812.4 MB as strings -> 96.1 MB typed (88% smaller)',
+    plus how much of the typed frame is categorical (coded columns and imputation flags).
+    """
+    after_mb = memory_mb(df)
+    saved = 100 * (1 - after_mb / before_mb) if before_mb else 0
+    print(f"{label}: {before_mb:.1f} MB as strings -> {after_mb:.1f} MB typed ({saved:.0f}% smaller)")
+    coded = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    if coded:
+        coded_mb = df[coded].memory_usage(deep=True).sum() / (1024 * 1024)
+        print(f"  {len(coded)} coded column(s) stored as categoricals: {coded_mb:.1f} MB")
+
+
+def value_labels_digest(value_labels):
+    if not value_labels:
+        return None
+    return hashlib.sha256(json.dumps(value_labels, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def sources_key(file_paths, value_labels=None):
+    """
+    Fingerprints {"files": {file name: {"size", "mtime_ns", "sha256"}}, "value_labels": digest}
+    of the files a schema was inferred from and of the value labels it used (their codes
+    shape the categories).
+    """
+    files = {}
+    for fp in sorted(file_paths):
+        st = os.stat(fp)
+        files[os.path.basename(fp)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(fp)}
+    return {"files": files, "value_labels": value_labels_digest(value_labels)}
+
+
+def sfa_sources(folder, like):
+    """
+    The SFA source files in `folder` of the same kind (zips or CSVs) as the file names `like`,
+    with the '_rv' revision preferred, as combine_csvs picks them.
+    """
+    zips = bool(like) and all(name.lower().endswith(".zip") for name in like)
+    chosen = {}
+    for name in sorted(os.listdir(folder)):
+        match = SFA_SOURCE_RE.match(name)
+        if not match or (match.group(2).lower() == "zip") != zips:
+            continue
+        key = name[:7].upper()
+        if key not in chosen or match.group(1):
+            chosen[key] = os.path.join(folder, name)
+    return list(chosen.values())
+
+
+def sources_match(sources, file_paths, value_labels=None, check_labels=True):
+    """
+    Whether fingerprints from sources_key still describe `file_paths` (and `value_labels`).
+    Files whose size and mtime are unchanged aren't re-hashed.
+    """
+    files = sources.get("files") if isinstance(sources, dict) else None
+    if files is None or set(files) != {os.path.basename(fp) for fp in file_paths}:
+        return False
+    for fp in file_paths:
+        known = files[os.path.basename(fp)]
+        st = os.stat(fp)
+        if st.st_size != known["size"]:
+            return False
+        if st.st_mtime_ns != known["mtime_ns"] and file_sha256(fp) != known["sha256"]:
+            return False
+    return not check_labels or sources.get("value_labels") == value_labels_digest(value_labels)
+
+
+def load_cached_schema(folder, file_paths=None, value_labels=None):
+    """
+    Loads the schema cached in `folder`, or None if there is none or it is stale: it is only
+    used when it was inferred from exactly `file_paths` (same content) and the same
+    `value_labels`. Without `file_paths` (the rename / merge steps) it is checked against the
+    SFA source files now in `folder` (see sfa_sources), value labels aside.
+    """
+    path = os.path.join(folder, SCHEMA_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        cached = json.load(f)
+    sources = cached.get("sources") or {}
+    if file_paths is None:
+        current = sfa_sources(folder, list(sources.get("files") or {}))
+        if not sources_match(sources, current, check_labels=False):
+            return None
+    elif not sources_match(sources, file_paths, value_labels):
+        return None
+    return cached["schema"]
+
+
+def save_schema(folder, schema, file_paths, value_labels=None):
+    path = os.path.join(folder, SCHEMA_NAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"sources": sources_key(file_paths, value_labels), "schema": schema}, f, indent=2)
+    print(f"Schema for {len(schema)} columns cached in {path}")
@@ -0,0 +1,156 @@
+import io
+import os
+import csv
+import json
+import zipfile
+
+from ipeds_io import is_zip_source, find_zip_member, open_source
+from ipeds_manifest import file_sha256, now_iso
+from ipeds_schema import infer_schema
+
+# What we know about every SFA source file we've seen, keyed by content hash:
+# its parsed header, inferred column types, row count and data size. Planning (common
+# columns, union, memory estimates) is answered from here without opening the files.
+SOURCE_CATALOG_NAME = "sfa_sources.json"
+
+# Rough bytes per CSV cell (digits + comma), to guess a row count before the first parse
+EST_CSV_BYTES_PER_CELL = 6
+
+
+def source_catalog_path(folder):
+    return os.path.join(folder, SOURCE_CATALOG_NAME)
+
+
+def load_source_catalog(folder):
+    """
+    Layout:
+    {
+      "files": {"<sha256>": {"name": "SFA1314.zip", "member": "sfa1314_rv.csv",
+                             "header": [...], "bytes": ..., "rows": ... or None,
+                             "types": {"scugrad": {"dtype": "int32"}, ...} (typed combines), "recorded_at": ...}},
+      "stat":  {"SFA1314.zip": {"size": ..., "mtime_ns": ..., "sha256": ...}}
+    }
+    "stat" lets an unchanged file be recognized without re-hashing it.
+    """
+    path = source_catalog_path(folder)
+    catalog = {"files": {}, "stat": {}}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            catalog.update(json.load(f))
+    catalog["dirty"] = False
+    return catalog
+
+
+def save_source_catalog(catalog, folder):
+    """ Writes the catalog (atomically) if anything was added since it was loaded. """
+    if not catalog.pop("dirty", False):
+        return
+    path = source_catalog_path(folder)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    catalog["dirty"] = False
+
+
+def source_hash(catalog, path):
+    """ sha256 of `path`, recomputed only when its size or mtime changed. """
+    st = os.stat(path)
+    name = os.path.basename(path)
+    known = catalog["stat"].get(name)
+    if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+        return known["sha256"]
+    sha = file_sha256(path)
+    catalog["stat"][name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+    catalog["dirty"] = True
+    return sha
+
+
+def parse_header(src, encoding='utf-8'):
+    """ Header row of a plain CSV or a zip's CSV member, parsed with the csv module (quotes handled). """
+    with open_source(src) as f:
+        text = io.TextIOWrapper(f, encoding=encoding, errors='replace', newline='')
+        return next(csv.reader(text), [])
+
+
+def source_bytes(src):
+    """ Size of the CSV data itself: the file, or the uncompressed zip member (from the zip directory). """
+    if is_zip_source(src):
+        with zipfile.ZipFile(src, 'r') as zf:
+            return zf.getinfo(find_zip_member(zf)).file_size
+    return os.path.getsize(src)
+
+
+def source_entry(catalog, src):
+    """ The catalog entry for `src`, adding its header and size (not its rows) if it's new. """
+    sha = source_hash(catalog, src)
+    entry = catalog["files"].get(sha)
+    if entry is None:
+        member = None
+        if is_zip_source(src):
+            with zipfile.ZipFile(src, 'r') as zf:
+                member = find_zip_member(zf)
+        entry = {"name": os.path.basename(src), "member": member, "header": parse_header(src),
+                 "bytes": source_bytes(src), "rows": None, "types": {}, "recorded_at": now_iso()}
+        catalog["files"][sha] = entry
+        catalog["dirty"] = True
+    return entry
+
+
+def record_parse(catalog, src, df=None, rows=None, infer=False):
+    """
+    Side effect of parsing `src`: records its row count (from `df` or `rows`) and, with
+    infer=True, the inferred types of the columns in `df` ('year' excluded). Inference costs
+    about as much as the parse, so only the typed combine asks for it; already-recorded values
+    are kept, so each file is only inferred once.
+    """
+    if catalog is None:
+        return
+    entry = source_entry(catalog, src)
+    n_rows = len(df) if df is not None else rows
+    if n_rows is not None and entry["rows"] != n_rows:
+        entry["rows"] = n_rows
+        catalog["dirty"] = True
+    if infer and df is not None:
+        new_cols = [c for c in df.columns if c != 'year' and c not in entry["types"]]
+        if new_cols:
+            entry["types"].update(infer_schema([df[new_cols]]))
+            catalog["dirty"] = True
+
+
+def header_columns(entry):
+    """ Lowercased, stripped column names of a catalog entry, in file order. """
+    return [c.strip().lower() for c in entry["header"]]
+
+
+def common_columns(catalog, file_paths):
+    """ Columns (lowercase) present in every one of `file_paths`. """
+    common = None
+    for fp in file_paths:
+        cols = set(header_columns(source_entry(catalog, fp)))
+        common = cols if common is None else common & cols
+    return common or set()
+
+
+def union_columns(catalog, file_paths):
+    """ Columns (lowercase) present in any of `file_paths`. """
+    union = set()
+    for fp in file_paths:
+        union |= set(header_columns(source_entry(catalog, fp)))
+    return union
+
+
+def estimated_rows(entry):
+    """ Recorded row count, or a guess from the data size before the first parse. """
+    if entry["rows"] is not None:
+        return entry["rows"]
+    return int(entry["bytes"] / (max(len(entry["header"]), 1) * EST_CSV_BYTES_PER_CELL))
+
+
+def estimate_frame_mb(catalog, file_paths, columns, bytes_per_cell):
+    """
+    Estimated size in MB of the combined string DataFrame of `columns` (+ 'year') over
+    `file_paths`, from the catalog alone.
+    """
+    n_rows = sum(estimated_rows(source_entry(catalog, fp)) for fp in file_paths)
+    return n_rows * (len(columns) + 1) * bytes_per_cell / (1024 * 1024)
@@ -1,153 +1,316 @@
 import os
-import requests
+import argparse
 import zipfile
-import datetime
 import pandas as pd
 
-def download_file(url, local_path):
-    """
-    Utility function to download a file. Returns True if successful.
-    """
-    print(f"Downloading from {url} ...")
-    try:
-        with requests.get(url, stream=True, timeout=30) as r:
-            if r.status_code == 200:
-                with open(local_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                print(f"Downloaded to {local_path}")
-                return True
-            else:
-                print(f"Failed to download {url}. Status code: {r.status_code}")
-                return False
-    except Exception as e:
-        print(f"Error downloading {url}: {e}")
-        return False
+from ipeds_http import NCES_BASE_URL, DOWNLOAD_BUFFER_BYTES
+from ipeds_config import SFA_FOLDER, HD_FOLDER
+from ipeds_manifest import DEFAULT_REVALIDATE_HOURS, load_manifest, save_manifest
+from ipeds_artifacts import fetch_with_store, extract_members
+from ipeds_catalog import DEFAULT_CATALOG_PATH, DEFAULT_TTL_HOURS, load_catalog, available
+from ipeds_io import CSV_ENGINES, CSV_ENGINE, set_csv_engine, read_table, write_table, is_parquet_path, \
+    csv_compression, find_zip_member, csv_columns, iter_source_csv
+from ipeds_hd import HD_DB_NAME, hd_dimension, lookup_attributes, build_hd_releases, load_hd_history, \
+    asof_attributes
+from ipeds_schema import apply_cached_schema
+from combine_ipeds_sfa import rows_per_chunk
 
-def unzip_and_find_hd_csv(zip_path, extract_folder):
+def unzip_and_find_hd_csv(zip_path, extract_folder, store=None, year=None):
     """
-    Unzips the HD zip. Looks for a CSV file that likely contains the HD data, e.g. 'HD2023.csv'.
-    Returns the path to that CSV, or None if not found.
+    Extracts the HD CSV of this zip (e.g. 'hd2023.csv', '_rv' preferred) into `extract_folder`
+    and returns its path, or None. The member comes from the zip's own listing, so an older
+    release's CSV in the same folder is never picked up instead.
     """
     try:
         with zipfile.ZipFile(zip_path, 'r') as zf:
-            zf.extractall(extract_folder)
+            member = find_zip_member(zf)
+        if member is None:
+            return None
+        return extract_members(zip_path, extract_folder, [member], store, "hd", year)[member]
     except Exception as e:
         print(f"Error unzipping {zip_path}: {e}")
         return None
-    
-    # We'll look for a file named 'HD2023.csv' or anything that starts with 'hd' or 'HD'.
+
+def find_hd_csv(extract_folder):
+    """ Returns the newest-named file under `extract_folder` like 'hd*.csv' (e.g. hd2023.csv), or None. """
+    found = []
     for root, dirs, files in os.walk(extract_folder):
-        for f in files:
-            if f.lower().startswith("hd") and f.lower().endswith(".csv"):
-                return os.path.join(root, f)
-    return None
+        found += [os.path.join(root, f) for f in files if f.lower().startswith("hd") and f.lower().endswith(".csv")]
+    return max(found, key=lambda p: os.path.basename(p).lower()) if found else None
 
-def download_latest_hd_file(hd_folder=r"C:\IPEDS_Data\HD"):
+def download_latest_hd_file(hd_folder=HD_FOLDER, base_url=NCES_BASE_URL, extract=True,
+                            catalog_path=DEFAULT_CATALOG_PATH, ttl_hours=DEFAULT_TTL_HOURS,
+                            revalidate_hours=DEFAULT_REVALIDATE_HOURS, buffer_bytes=DOWNLOAD_BUFFER_BYTES, store=None):
     """
-    Searches for the most recent IPEDS Header (HD) file by trying HD2023.zip, HD2022.zip, etc.,
-    from the current year downward. If found, downloads/unzips it and returns the path to the CSV.
-    Otherwise, returns None.
+    Fetches the most recent IPEDS Header (HD) file listed in the availability catalog
+    (see ipeds_catalog) with a conditional GET (see ipeds_manifest). An HD release we
+    already have costs one 304 (or nothing, within `revalidate_hours`) and is not re-extracted.
+    If found, downloads/unzips it and returns the path to the CSV. Otherwise, returns None.
+    With extract=False nothing is unzipped and the path of the HD zip itself is returned
+    (ipeds_io.read_source_csv reads the CSV member directly). With an artifact `store`
+    (see ipeds_artifacts) the zip and its CSV are shared with other runs and workers.
     """
     if not os.path.exists(hd_folder):
         os.makedirs(hd_folder)
     
-    base_url = "https://nces.ed.gov/ipeds/datacenter/data/"
-    
-    current_year = datetime.datetime.now().year
-
-    for year in range(current_year, 2010, -1):  # Adjust lower bound if needed
-        hd_zip_name = f"HD{year}.zip"
-        hd_url = base_url + hd_zip_name
-        print(f"Attempting HEAD for {hd_url}")
-
-        try:
-            resp = requests.head(hd_url, allow_redirects=True, timeout=10)
-            if resp.status_code == 200:
-                # Found it. Download if not local already
-                zip_path = os.path.join(hd_folder, hd_zip_name)
-                if not os.path.exists(zip_path):
-                    if not download_file(hd_url, zip_path):
-                        continue
-                # Now unzip & find the CSV
-                hd_csv = unzip_and_find_hd_csv(zip_path, hd_folder)
-                if hd_csv:
-                    print(f"Using HD file: {hd_csv}")
-                    return hd_csv
-        except Exception as e:
-            print(f"HEAD request failed for {hd_url}: {e}")
-
-    print("No HD file found in the checked range.")
+    catalog = load_catalog(catalog_path, base_url, ttl_hours)
+    manifest = load_manifest(hd_folder)
+
+    try:
+        for year, hd_zip_name in reversed(available(catalog, "hd")):
+            hd_url = base_url + hd_zip_name
+            zip_path = os.path.join(hd_folder, hd_zip_name)
+            print(f"Checking {hd_url}")
+
+            status = fetch_with_store(store, hd_url, zip_path, manifest, "hd", year,
+                                      max_age_hours=revalidate_hours, buffer_bytes=buffer_bytes)
+            if status in ("missing", "failed"):
+                continue
+            if not extract:
+                print(f"Using HD archive: {zip_path}")
+                return zip_path
+
+            # This release's CSV (left alone if it's already extracted and intact)
+            hd_csv = unzip_and_find_hd_csv(zip_path, hd_folder, store, year)
+            if hd_csv:
+                print(f"Using HD file: {hd_csv}")
+                return hd_csv
+    finally:
+        save_manifest(manifest, hd_folder)
+
+    print("No HD file listed in the availability catalog.")
     return None
 
+def download_hd_files(hd_folder=HD_FOLDER, base_url=NCES_BASE_URL,
+                      catalog_path=DEFAULT_CATALOG_PATH, ttl_hours=DEFAULT_TTL_HOURS,
+                      revalidate_hours=DEFAULT_REVALIDATE_HOURS, buffer_bytes=DOWNLOAD_BUFFER_BYTES, store=None):
+    """
+    Keeps every HD release listed in the availability catalog up to date in `hd_folder`
+    (conditional GETs, nothing extracted); zips already in the artifact `store` are linked
+    instead of downloaded. Returns {year: zip_path}.
+    """
+    if not os.path.exists(hd_folder):
+        os.makedirs(hd_folder)
+
+    catalog = load_catalog(catalog_path, base_url, ttl_hours)
+    manifest = load_manifest(hd_folder)
+    found = {}
+    try:
+        for year, hd_zip_name in available(catalog, "hd"):
+            zip_path = os.path.join(hd_folder, hd_zip_name)
+            status = fetch_with_store(store, base_url + hd_zip_name, zip_path, manifest, "hd", year,
+                                      max_age_hours=revalidate_hours, buffer_bytes=buffer_bytes)
+            if status in ("changed", "unchanged"):
+                found[year] = zip_path
+    finally:
+        save_manifest(manifest, hd_folder)
+    return found
+
+# Title the rename step gives UNITID; renamed back to 'UNITID' before joining
+UNITID_TITLE = "UNITID - Unique identification number of the institution"
+
+def lookup_for(sfa_df, dim, as_of=False):
+    """ The HD attribute columns for each row of `sfa_df` (vectorized; see ipeds_hd). """
+    if as_of:
+        return asof_attributes(sfa_df['UNITID'], sfa_df['year'], dim)
+    return lookup_attributes(sfa_df['UNITID'], dim)
+
+def join_attributes(sfa_df, attrs):
+    """ `sfa_df` with the looked-up `attrs` columns appended (columns it already has are kept as-is). """
+    return pd.concat([sfa_df, attrs.drop(columns=[c for c in attrs.columns if c in sfa_df.columns])], axis=1)
+
+def attach_instnm(sfa_df, dim, as_of=False):
+    """
+    Steps 3-4 of merge_instnm on DataFrames already in memory: renames the SFA UNITID
+    column back to 'UNITID' and attaches the HD attributes in `dim` (a UNITID-indexed
+    frame from ipeds_hd.hd_dimension, e.g. INSTNM) with a vectorized lookup.
+    With as_of=True, `dim` is an ipeds_hd.load_hd_history table instead and each row gets
+    the attributes that were current in its 'year' (see ipeds_hd.asof_attributes).
+    Returns the merged DataFrame, or None if the SFA side has no UNITID.
+    """
+    # If "UNITID" was renamed to "UNITID - Unique identification number of the institution",
+    # rename it back so we can merge on 'UNITID' directly.
+    old_unitid_col = UNITID_TITLE
+    if old_unitid_col in sfa_df.columns:
+        sfa_df.rename(columns={old_unitid_col: "UNITID"}, inplace=True)
+        print(f"Renamed '{old_unitid_col}' back to 'UNITID' for merging.")
+    else:
+        print(f"Warning: '{old_unitid_col}' column not found. Merge may fail if there's no 'UNITID' at all.")
+    
+    # Ensure columns exist
+    if 'UNITID' not in sfa_df.columns:
+        print("SFA CSV missing 'UNITID'. Cannot merge with HD.")
+        return None
+
+    # Left join: every SFA row kept, in order; UNITIDs not in HD get NaN
+    if as_of and 'year' not in sfa_df.columns:
+        print("SFA data has no 'year' column. Cannot match HD releases by year.")
+        return None
+    merged_df = join_attributes(sfa_df, lookup_for(sfa_df, dim, as_of))
+
+    print(f"Merged SFA data ({sfa_df.shape[0]} rows) with HD data ({dim.shape[0]} rows).")
+    print(f"Result: {merged_df.shape[0]} rows, {merged_df.shape[1]} columns.")
+    return merged_df
+
+def stream_merge(sfa_csv, dim, output_csv, memory_budget_mb, as_of=False):
+    """
+    Out-of-core version of steps 3-5 for SFA CSVs larger than memory. The small HD side
+    (`dim`, already in memory and indexed by UNITID) is the hash table; the SFA CSV is read
+    in chunks sized by `memory_budget_mb`, and each joined chunk is appended to `output_csv`
+    right away, so peak memory is the HD side plus one chunk. The output is byte-for-byte
+    what the in-memory path writes.
+
+    Match statistics are collected in the same pass; returns
+    {"rows": n, "matched_unitids": n, "unmatched_unitids": n}, or None on error.
+    """
+    columns = csv_columns(sfa_csv)
+    columns = ['UNITID' if c == UNITID_TITLE else c for c in columns]
+    if 'UNITID' not in columns or (as_of and 'year' not in columns):
+        print(f"SFA CSV {sfa_csv} is missing 'UNITID'{' or year' if as_of else ''}. Cannot merge with HD.")
+        return None
+
+    chunksize = rows_per_chunk(memory_budget_mb, len(columns) + len(dim.columns))
+    hd_ids = dim['UNITID'] if as_of else dim.index
+    matched, unmatched = set(), set()
+    rows = 0
+    header = True
+    with open(output_csv, 'w', encoding='utf-8', newline='') as out:
+        for chunk in iter_source_csv(sfa_csv, chunksize, dtype=str):
+            chunk.columns = columns
+            chunk_ids = chunk['UNITID'].dropna()
+            known = pd.to_numeric(chunk_ids, errors='coerce').isin(hd_ids)
+            matched.update(chunk_ids[known])
+            unmatched.update(chunk_ids[~known])
+            join_attributes(chunk, lookup_for(chunk, dim, as_of)).to_csv(out, index=False, header=header)
+            header = False
+            rows += len(chunk)
+        if header:
+            # A header-only input may yield no chunk at all; the output still gets its header
+            empty = pd.DataFrame(columns=columns, dtype=str)
+            join_attributes(empty, lookup_for(empty, dim, as_of)).to_csv(out, index=False)
+
+    stats = {"rows": rows, "matched_unitids": len(matched), "unmatched_unitids": len(unmatched)}
+    print(f"Streamed {rows} SFA rows (chunks of {chunksize}) into {output_csv}: "
+          f"{stats['matched_unitids']} UNITIDs matched HD, {stats['unmatched_unitids']} did not.")
+    return stats
+
 def merge_instnm(
-    sfa_renamed_csv=r"C:\IPEDS_Data\SFA\combined_ipeds_sfa_renamed.csv",
-    output_csv=r"C:\IPEDS_Data\SFA\combined_ipeds_sfa_with_name.csv"
+    sfa_renamed_csv=os.path.join(SFA_FOLDER, "combined_ipeds_sfa_renamed.csv"),
+    output_csv=os.path.join(SFA_FOLDER, "combined_ipeds_sfa_with_name.csv"),
+    typed=False,
+    attributes=("INSTNM",),
+    as_of=False,
+    memory_budget_mb=None,
+    write_jobs=1,
+    split_mb=None,
+    hd_folder=HD_FOLDER,
+    base_url=NCES_BASE_URL,
+    catalog_path=DEFAULT_CATALOG_PATH,
+    ttl_hours=DEFAULT_TTL_HOURS,
+    revalidate_hours=DEFAULT_REVALIDATE_HOURS,
+    store=None
 ):
     """
-    1) Downloads/unzips the latest HD file (e.g., HD2023.zip).
-    2) Reads that HD file and the SFA CSV (already renamed).
+    1) Downloads the latest HD file (e.g., HD2023.zip) into `hd_folder`; it is read without
+       unzipping. `base_url`, `catalog_path`, `ttl_hours`, `revalidate_hours` and the artifact
+       `store` are passed to the downloader (see download_latest_hd_file / download_hd_files).
+    2) Loads its `attributes` (default INSTNM; any HD column such as STABBR, SECTOR, C21BASIC)
+       from the HD dimension (ipeds_hd) - the HD file itself is parsed only once per release -
+       and reads the SFA CSV (already renamed).
     3) Renames the SFA "UNITID - Unique identification number of the institution" column back to "UNITID".
-    4) Merges on 'UNITID' to get 'INSTNM'.
+    4) Looks up the attributes by 'UNITID' in the latest release. With as_of=True every HD
+       release is downloaded instead and each row gets the name/attributes current in its own
+       year, so closed institutions keep their name and renamed ones show the name they had
+       at the time.
     5) Saves to output_csv with institution names included.
+    Either SFA path may instead be a '.parquet' dataset (see ipeds_io.read_table / write_table).
+    With typed=True the schema cached by combine_csvs(typed=True) is applied to the SFA side,
+    so UNITID is joined as an int32 key.
+    If `memory_budget_mb` is given (CSV in and out), steps 3-5 are streamed chunk by chunk
+    instead (see stream_merge), for SFA files that don't fit in memory.
+    `write_jobs` and `split_mb` control how a CSV output is written (see ipeds_io.write_csv);
+    a '.gz' / '.zst' output name writes it compressed.
     """
     # Check we have the SFA data
     if not os.path.exists(sfa_renamed_csv):
         print(f"Could not find combined SFA CSV: {sfa_renamed_csv}")
         return
     
-    # Step 1: Download HD
-    hd_csv = download_latest_hd_file()
+    # Step 1: Download HD (kept zipped; the CSV member is read straight from the archive)
+    fetch_opts = {"catalog_path": catalog_path, "ttl_hours": ttl_hours, "revalidate_hours": revalidate_hours,
+                  "store": store}
+    if as_of:
+        hd_csv = download_hd_files(hd_folder, base_url, **fetch_opts)
+    else:
+        hd_csv = download_latest_hd_file(hd_folder, base_url, extract=False, **fetch_opts)
     if not hd_csv:
         print("No HD CSV found; cannot merge institution names.")
         return
 
-    # Step 2: Read HD with 'latin1' or 'cp1252' to avoid UTF-8 decode issues
+    # Step 2: HD attributes from the dimension store (built from the HD files on first use)
+    db_path = os.path.join(hd_folder, HD_DB_NAME)
     try:
-        hd_df = pd.read_csv(hd_csv, dtype=str, low_memory=False, encoding='latin1')
+        if as_of:
+            build_hd_releases(hd_csv, db_path)
+            dim = load_hd_history(db_path, attributes)
+        else:
+            dim = hd_dimension(hd_csv, db_path, attributes)
     except Exception as e:
-        print(f"Error reading HD CSV ({hd_csv}): {e}")
+        print(f"Error loading HD attributes ({hd_csv}): {e}")
         return
     
+    if memory_budget_mb:
+        if (typed or is_parquet_path(sfa_renamed_csv) or is_parquet_path(output_csv)
+                or split_mb or csv_compression(sfa_renamed_csv) or csv_compression(output_csv)):
+            print("Streaming merge works on uncompressed, unsplit CSV in/out without typed=True; "
+                  "merging in memory instead.")
+        else:
+            if stream_merge(sfa_renamed_csv, dim, output_csv, memory_budget_mb, as_of) is not None:
+                print(f"Final file with INSTNM: {output_csv}")
+            return
+
     # Step 3: Read your SFA CSV
     try:
-        sfa_df = pd.read_csv(sfa_renamed_csv, dtype=str, low_memory=False)
+        sfa_df = read_table(sfa_renamed_csv)
     except Exception as e:
         print(f"Error reading SFA CSV ({sfa_renamed_csv}): {e}")
         return
+    if typed:
+        sfa_df = apply_cached_schema(sfa_df, os.path.dirname(sfa_renamed_csv))
     
-    # If "UNITID" was renamed to "UNITID - Unique identification number of the institution",
-    # rename it back so we can merge on 'UNITID' directly.
-    old_unitid_col = "UNITID - Unique identification number of the institution"
-    if old_unitid_col in sfa_df.columns:
-        sfa_df.rename(columns={old_unitid_col: "UNITID"}, inplace=True)
-        print(f"Renamed '{old_unitid_col}' back to 'UNITID' for merging.")
-    else:
-        print(f"Warning: '{old_unitid_col}' column not found. Merge may fail if there's no 'UNITID' at all.")
-    
-    # Ensure columns exist
-    if 'UNITID' not in sfa_df.columns:
-        print("SFA CSV missing 'UNITID'. Cannot merge with HD.")
-        return
-    if 'UNITID' not in hd_df.columns:
-        print("HD CSV missing 'UNITID'. Can't merge.")
-        return
-    if 'INSTNM' not in hd_df.columns:
-        print("HD CSV missing 'INSTNM'. Can't merge.")
+    merged_df = attach_instnm(sfa_df, dim, as_of)
+    if merged_df is None:
         return
 
-    # Subset HD to relevant columns
-    hd_subset = hd_df[['UNITID','INSTNM']].drop_duplicates()
-
-    # Merge on UNITID (left join)
-    merged_df = pd.merge(sfa_df, hd_subset, on='UNITID', how='left')
-
-    print(f"Merged SFA data ({sfa_df.shape[0]} rows) with HD data ({hd_subset.shape[0]} rows).")
-    print(f"Result: {merged_df.shape[0]} rows, {merged_df.shape[1]} columns.")
-
     # Save final
-    merged_df.to_csv(output_csv, index=False, encoding='utf-8')
+    write_table(merged_df, output_csv, jobs=write_jobs, split_mb=split_mb)
     print(f"Final file with INSTNM: {output_csv}")
 
 if __name__ == "__main__":
-    merge_instnm()
+    parser = argparse.ArgumentParser(description="Attach institution names (HD attributes) to the renamed SFA data.")
+    parser.add_argument("--input", default=os.path.join(SFA_FOLDER, "combined_ipeds_sfa_renamed.csv"))
+    parser.add_argument("--output", default=os.path.join(SFA_FOLDER, "combined_ipeds_sfa_with_name.csv"))
+    parser.add_argument("--typed", action="store_true")
+    parser.add_argument("--attributes", nargs="+", default=["INSTNM"], help="HD columns to attach")
+    parser.add_argument("--as-of", action="store_true",
+                        help="attributes from the HD release of each row's year (downloads every release)")
+    parser.add_argument("--memory-budget-mb", type=int, default=None,
+                        help="stream the SFA side in chunks of about this size")
+    parser.add_argument("--engine", choices=CSV_ENGINES, default=CSV_ENGINE, help="CSV parser (see ipeds_io)")
+    parser.add_argument("--write-jobs", type=int, default=1, help="format the output CSV in N worker processes")
+    parser.add_argument("--split-mb", type=int, default=None, help="split the output CSV into files of about this size")
+    parser.add_argument("--hd-folder", default=HD_FOLDER)
+    parser.add_argument("--base-url", default=NCES_BASE_URL)
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_PATH, help="availability catalog file")
+    parser.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL_HOURS,
+                        help="trust the availability catalog this long; 0 probes NCES again")
+    parser.add_argument("--revalidate-hours", type=float, default=DEFAULT_REVALIDATE_HOURS,
+                        help="trust downloaded HD zips this long without a conditional GET; 0 checks every run")
+    parser.add_argument("--store", default=None, help="artifact store shared with other runs (see ipeds_artifacts)")
+    args = parser.parse_args()
+    set_csv_engine(args.engine)
+    merge_instnm(args.input, args.output, typed=args.typed, attributes=args.attributes,
+                 as_of=args.as_of, memory_budget_mb=args.memory_budget_mb,
+                 write_jobs=args.write_jobs, split_mb=args.split_mb, hd_folder=args.hd_folder,
+                 base_url=args.base_url, catalog_path=args.catalog, ttl_hours=args.ttl_hours,
+                 revalidate_hours=args.revalidate_hours, store=args.store)
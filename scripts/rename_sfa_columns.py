@@ -1,185 +1,431 @@
+import io
 import os
 import re
-import requests
-import zipfile
-import datetime
+import csv
+import json
 import pandas as pd
 
+from ipeds_http import NCES_BASE_URL, DOWNLOAD_BUFFER_BYTES
+from ipeds_config import SFA_FOLDER, DICT_FOLDER
+from ipeds_manifest import DEFAULT_REVALIDATE_HOURS, load_manifest, save_manifest, file_sha256
+from ipeds_artifacts import fetch_with_store, derived_json, put_derived_json
+from ipeds_catalog import DEFAULT_CATALOG_PATH, DEFAULT_TTL_HOURS, load_catalog, available
+from combine_ipeds_sfa import get_year_from_filename
+from ipeds_io import read_csv, is_zip_source, source_name, read_source_bytes, read_table, write_table, \
+    is_parquet_path, copy_file_tail, read_column_labels, write_column_labels, link_or_copy_tree, parquet_column_names, \
+    csv_compression, split_parts
+from ipeds_schema import apply_cached_schema
+
+# Compiled varname -> "SHORT - Title" maps, one per dictionary zip (keyed by its sha256)
+DICT_CACHE_NAME = "sfa_dictionary_cache.json"
+
+# Name of a compiled dictionary entry in the artifact store (see ipeds_artifacts)
+COMPILED_DICT_NAME = "sfa_dictionary.json"
+
 ##############################
-#  A) Download the Latest Dictionary
+#  A) Download the Dictionaries
 ##############################
 
-def download_latest_sfa_dictionary(dict_folder=r"C:\IPEDS_Data\SFA\Dict"):
+def download_sfa_dictionaries(dict_folder=DICT_FOLDER, base_url=NCES_BASE_URL,
+                              catalog_path=DEFAULT_CATALOG_PATH, ttl_hours=DEFAULT_TTL_HOURS,
+                              revalidate_hours=DEFAULT_REVALIDATE_HOURS, buffer_bytes=DOWNLOAD_BUFFER_BYTES, store=None):
     """
-    Checks for the most recent SFA dict file by trying HEAD requests from the current year backward.
-    Example pattern: https://nces.ed.gov/ipeds/datacenter/data/SFA2223_Dict.zip
-    If found, downloads & unzips the first match.
-    
-    Returns the path to the unzipped Excel (or CSV) dictionary file, or None if none found.
+    Keeps every year's SFA dictionary zip in `dict_folder` up to date (conditional GETs, see
+    ipeds_manifest), without extracting anything. Only the years listed in the availability
+    catalog are requested; zips already in the artifact `store` are linked instead of
+    downloaded. Returns {year_label: zip_path}.
     """
     if not os.path.exists(dict_folder):
         os.makedirs(dict_folder)
     
-    base_url = "https://nces.ed.gov/ipeds/datacenter/data/"
-    # We'll check from 2013–14 up to the current year
-    start_year = 13
-    current_year_2digits = datetime.datetime.now().year % 100  # e.g. 25 for 2025
-    
-    for sy in reversed(range(start_year, current_year_2digits + 1)):
-        ey = sy + 1
-        dict_zip_name = f"SFA{sy:02}{ey:02}_Dict.zip"
-        dict_url = base_url + dict_zip_name
-        
-        # HEAD request to see if it exists
-        try:
-            resp = requests.head(dict_url, allow_redirects=True, timeout=10)
-            if resp.status_code == 200:
-                # Found it, download & unzip if we haven't yet
-                zip_path = os.path.join(dict_folder, dict_zip_name)
-                if not os.path.exists(zip_path):
-                    if download_file(dict_url, zip_path):
-                        dict_file_path = unzip_and_find_dictionary(zip_path, dict_folder)
-                        if dict_file_path:
-                            return dict_file_path
-                else:
-                    # Already downloaded previously; just find the dictionary file
-                    dict_file_path = unzip_and_find_dictionary(zip_path, dict_folder)
-                    if dict_file_path:
-                        return dict_file_path
-        except Exception as e:
-            print(f"HEAD request failed for {dict_url}: {e}")
-    print("No SFA dictionary found in the checked range.")
-    return None
-
-def download_file(url, local_path):
-    """ Utility to download a file via GET. Returns True if successful. """
-    print(f"Downloading from {url} ...")
+    catalog = load_catalog(catalog_path, base_url, ttl_hours)
+    manifest = load_manifest(dict_folder)
+    found = {}
     try:
-        with requests.get(url, stream=True, timeout=30) as r:
-            if r.status_code == 200:
-                with open(local_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                print(f"Downloaded dict zip to {local_path}")
-                return True
-            else:
-                print(f"Failed to download. Status code: {r.status_code}")
-                return False
-    except Exception as e:
-        print(f"Error downloading {url}: {e}")
-        return False
-
-def unzip_and_find_dictionary(zip_path, extract_folder):
-    """
-    Unzips the dictionary zip. Looks for .xlsx or .csv that might contain 'varlist'.
-    Returns the full file path if found, or None.
-    """
-    try:
-        with zipfile.ZipFile(zip_path, 'r') as zf:
-            zf.extractall(extract_folder)
-    except Exception as e:
-        print(f"Error unzipping {zip_path}: {e}")
-        return None
-    
-    # Return the first .xlsx or .csv we find.
-    for root, dirs, files in os.walk(extract_folder):
-        for f in files:
-            f_lower = f.lower()
-            if f_lower.endswith(".xlsx") or f_lower.endswith(".csv"):
-                return os.path.join(root, f)
-    return None
+        for year_label, dict_zip_name in available(catalog, "sfa_dict"):
+            zip_path = os.path.join(dict_folder, dict_zip_name)
+            status = fetch_with_store(store, base_url + dict_zip_name, zip_path, manifest, "sfa_dict", year_label,
+                                      max_age_hours=revalidate_hours, buffer_bytes=buffer_bytes)
+            if status in ("changed", "unchanged"):
+                found[year_label] = zip_path
+    finally:
+        save_manifest(manifest, dict_folder)
+    return found
 
 ##############################
 #  B) Build the "short + title" mapping
 ##############################
 
-def load_sfa_dictionary(dict_file):
+def read_dictionary_sheets(dict_file):
     """
-    Reads the IPEDS SFA dictionary (Excel or CSV).
-    Builds a map: short_name.lower() -> "SHORT_NAME - Full Title"
+    Reads the IPEDS SFA dictionary (Excel or CSV), either as an extracted file or
+    straight out of the SFAxxxx_Dict.zip archive.
+    Returns (varlist, frequencies) DataFrames of strings with lowercased column names;
+    frequencies is None for CSV dictionaries and workbooks without a Frequencies sheet,
+    and both are None if the dictionary can't be read.
     """
-    if dict_file.lower().endswith(".xlsx"):
+    if is_zip_source(dict_file):
+        # Pick the workbook (or CSV) member and read it from memory
+        try:
+            member = source_name(dict_file, exts=(".xlsx", ".csv"))
+            dict_bytes = read_source_bytes(dict_file, exts=(".xlsx", ".csv"))
+        except Exception as e:
+            print(f"Error reading dictionary zip {dict_file}: {e}")
+            return None, None
+        dict_source = io.BytesIO(dict_bytes)
+    else:
+        member = dict_file
+        dict_source = dict_file
+
+    freq = None
+    if member.lower().endswith(".xlsx"):
         # Requires openpyxl: pip install openpyxl
         try:
-            xls = pd.ExcelFile(dict_file, engine='openpyxl')
+            xls = pd.ExcelFile(dict_source, engine='openpyxl')
             sheet_name = 'varlist' if 'varlist' in xls.sheet_names else 0
             df = pd.read_excel(xls, sheet_name=sheet_name, dtype=str)
+            # Code -> label tables of the coded variables (imputation flags etc.)
+            freq_sheet = next((n for n in xls.sheet_names if n.lower() == 'frequencies'), None)
+            if freq_sheet is not None:
+                freq = pd.read_excel(xls, sheet_name=freq_sheet, dtype=str)
+                freq.columns = [c.lower().strip() for c in freq.columns]
         except Exception as e:
             print(f"Error reading Excel dictionary: {e}")
-            return {}
+            return None, None
     else:
         # CSV approach
         try:
-            df = pd.read_csv(dict_file, dtype=str, low_memory=False)
+            df = read_csv(dict_source, dtype=str, low_memory=False)
         except Exception as e:
             print(f"Error reading CSV dictionary: {e}")
-            return {}
+            return None, None
     
     # Lowercase columns
     df.columns = [c.lower().strip() for c in df.columns]
+    return df, freq
+
+
+def varlist_mapping(df):
+    """ varlist sheet -> {short_name.lower(): "SHORT_NAME - Full Title"}. """
+    if df is None:
+        return {}
     if 'varname' not in df.columns or 'vartitle' not in df.columns:
         print("Dictionary file missing 'varname' or 'varTitle'.")
         return {}
     
-    var_dict = {}
-    for _, row in df.iterrows():
-        short = str(row['varname']).lower().strip()
-        title = str(row['vartitle']).strip()
-        if short and title:
-            var_dict[short] = f"{short.upper()} - {title}"
-    return var_dict
+    # Vectorized: whole-column string ops instead of iterrows (later rows win, as before)
+    short = df['varname'].astype(str).str.lower().str.strip()
+    title = df['vartitle'].astype(str).str.strip()
+    keep = (short != "") & (title != "")
+    return dict(zip(short[keep], short[keep].str.upper() + " - " + title[keep]))
+
+
+def frequency_labels(freq):
+    """ Frequencies sheet -> {short_name.lower(): {code: label}} for every coded variable. """
+    if freq is None or not {'varname', 'codevalue', 'valuelabel'} <= set(freq.columns):
+        return {}
+    freq = freq.dropna(subset=['varname', 'codevalue'])
+    short = freq['varname'].str.lower().str.strip()
+    codes = freq['codevalue'].str.strip()
+    labels = freq['valuelabel'].fillna("").str.strip()
+    value_labels = {}
+    for var, code, label in zip(short, codes, labels):
+        value_labels.setdefault(var, {})[code] = label
+    return value_labels
+
+
+def load_sfa_dictionary(dict_file):
+    """
+    Reads the IPEDS SFA dictionary (Excel or CSV), either as an extracted file or
+    straight out of the SFAxxxx_Dict.zip archive.
+    Builds a map: short_name.lower() -> "SHORT_NAME - Full Title"
+    """
+    varlist, _ = read_dictionary_sheets(dict_file)
+    return varlist_mapping(varlist)
+
+
+def compile_dictionary(dict_file):
+    """ One cache entry for a dictionary zip: its title mapping and value labels (one workbook read). """
+    varlist, freq = read_dictionary_sheets(dict_file)
+    return {"source": os.path.basename(dict_file), "year": get_year_from_filename(dict_file),
+            "mapping": varlist_mapping(varlist), "value_labels": frequency_labels(freq)}
+
+
+def compiled_dictionaries(dict_folder=DICT_FOLDER, store=None):
+    """
+    Compiles every SFAxxxx_Dict.zip in `dict_folder` (see compile_dictionary) and returns
+    {year_label: {"source", "year", "mapping", "value_labels"}}.
+    
+    Entries are cached in sfa_dictionary_cache.json keyed by each zip's sha256, so the
+    workbook is only opened (slow, via openpyxl) the first time a release is seen. With an
+    artifact `store` the compiled entries are shared too, so other workers and machines
+    don't open the workbook at all.
+    """
+    cache_path = os.path.join(dict_folder, DICT_CACHE_NAME)
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    
+    entries = {}
+    fresh_cache = {}
+    for f in sorted(os.listdir(dict_folder)) if os.path.isdir(dict_folder) else []:
+        if not re.match(r'sfa\d{4}_dict\.zip$', f.lower()):
+            continue
+        zip_path = os.path.join(dict_folder, f)
+        sha = file_sha256(zip_path)
+        entry = cache.get(sha)
+        # Entries cached before value labels were compiled are rebuilt once
+        if entry is None or "value_labels" not in entry:
+            entry = derived_json(store, sha, COMPILED_DICT_NAME)
+        if entry is None or "value_labels" not in entry:
+            print(f"Compiling dictionary {f} ...")
+            entry = compile_dictionary(zip_path)
+            put_derived_json(store, entry, sha, "sfa_dict", entry["year"], COMPILED_DICT_NAME)
+        fresh_cache[sha] = entry
+        entries[entry["year"]] = entry
+    
+    # Only keep entries for zips that still exist
+    if fresh_cache != cache:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(fresh_cache, f, indent=1)
+    return entries
+
+
+def load_sfa_dictionaries(dict_folder=DICT_FOLDER, store=None):
+    """
+    {year_label: {short -> "SHORT - Title"}} for every dictionary zip in `dict_folder`,
+    e.g. {"2013-2014": {...}, "2014-2015": {...}} (cached; see compiled_dictionaries).
+    """
+    return {year: entry["mapping"] for year, entry in compiled_dictionaries(dict_folder, store).items()}
+
+
+def load_value_labels(dict_folder=DICT_FOLDER, store=None):
+    """ {year_label: {short: {code: label}}} for every dictionary zip in `dict_folder` (cached). """
+    return {year: entry["value_labels"] for year, entry in compiled_dictionaries(dict_folder, store).items()}
+
+
+def combined_mapping(maps, years=None):
+    """
+    One mapping for a multi-year table: every variable gets the title from the newest
+    dictionary year (restricted to `years`, if given) that defines it. Variables NCES later
+    dropped keep the title of the last year they existed instead of going unlabeled.
+    """
+    var_map = {}
+    for year in sorted(maps):
+        if years is None or year in years:
+            var_map.update(maps[year])
+    return var_map
+
+def combined_value_labels(labels_by_year, years=None):
+    """
+    One {short: {code: label}} table for a multi-year table: each variable's codes are the
+    union over the dictionary years (restricted to `years`, if given), a code's label the
+    one from the newest year that lists it.
+    """
+    value_labels = {}
+    for year in sorted(labels_by_year):
+        if years is None or year in years:
+            for var, codes in labels_by_year[year].items():
+                value_labels.setdefault(var, {}).update(codes)
+    return value_labels
+
+def resolve_variables(variables, maps):
+    """
+    Turns a variables-of-interest list - short names ('SCUGRAD', any case), full labels
+    ('SCUGRAD - Number of students ...') or bare dictionary titles - into lowercase short
+    names, using the per-year dictionary `maps` (see load_sfa_dictionaries) for titles.
+    Names the dictionaries don't know are kept as given (lowercased) and reported.
+    """
+    by_title = {}
+    for year in sorted(maps):
+        for short, label in maps[year].items():
+            by_title[label.lower()] = short
+            if " - " in label:
+                by_title[label.split(" - ", 1)[1].strip().lower()] = short
+    known = {short for mapping in maps.values() for short in mapping}
+
+    resolved = []
+    for var in variables:
+        key = var.strip().lower()
+        if key in known:
+            short = key
+        elif key in by_title:
+            short = by_title[key]
+        else:
+            short = key.split(" - ", 1)[0].strip()
+            print(f"Variable '{var}' not found in the dictionaries; using '{short}' as its short name.")
+        if short not in resolved:
+            resolved.append(short)
+    return resolved
 
 ##############################
 #  C) Rename Columns in Combined File
 ##############################
 
+def apply_dictionary_names(df, var_map):
+    """
+    Renames the columns of `df` found in `var_map` (short.lower() -> "SHORT - Title"),
+    in place, and returns `df`.
+    """
+    rename_dict = {}
+    for col in df.columns:
+        lower_col = col.lower()
+        if lower_col in var_map:
+            rename_dict[col] = var_map[lower_col]
+
+    if rename_dict:
+        df.rename(columns=rename_dict, inplace=True)
+        print(f"Renamed {len(rename_dict)} columns using the dictionary.")
+    else:
+        print("No columns matched the dictionary. Nothing renamed.")
+    return df
+
 def rename_sfa_columns(
-    combined_csv    = r"C:\IPEDS_Data\SFA\combined_ipeds_sfa.csv",
-    renamed_csv_out = r"C:\IPEDS_Data\SFA\combined_ipeds_sfa_renamed.csv"
+    combined_csv    = os.path.join(SFA_FOLDER, "combined_ipeds_sfa.csv"),
+    renamed_csv_out = os.path.join(SFA_FOLDER, "combined_ipeds_sfa_renamed.csv"),
+    typed           = False,
+    fast            = True,
+    scan_years      = False
 ):
     """
-    1) Downloads/unzips the latest SFA dictionary if possible.
-    2) Loads the mapping {short -> "SHORT - Title"}.
+    1) Downloads every year's SFA dictionary zip if possible (they are read without unzipping).
+    2) Loads the cached per-year mappings {short -> "SHORT - Title"} and combines them over
+       the years present in the data (see combined_mapping and rename_table).
     3) Reads combined_ipeds_sfa.csv, renames columns found in the dictionary.
     4) Saves renamed CSV to combined_ipeds_sfa_renamed.csv
+    Either path may instead be a '.parquet' dataset (see ipeds_io.read_table / write_table).
+    With typed=True the schema cached by combine_csvs(typed=True) is applied after reading.
+    
+    With fast=True (the default, when not typed) the data is never parsed: a plain CSV gets
+    only its header line rewritten and the body byte-copied (rename_csv_header); a Parquet
+    dataset gets a metadata-only rename (rename_parquet_labels). See rename_table.
     """
-    if not os.path.exists(combined_csv):
+    if not (os.path.exists(combined_csv) or split_parts(combined_csv)):
         print(f"Combined CSV not found: {combined_csv}")
         return
     
-    # 1) Download the dictionary
-    dict_file = download_latest_sfa_dictionary()
-    if dict_file is None:
+    # 1) Download every year's dictionary (one 304 each once we have them)
+    download_sfa_dictionaries()
+    dict_maps = load_sfa_dictionaries()
+    if not dict_maps:
         print("No dictionary available; skipping rename.")
         return
     
-    # 2) Build the varname -> "SHORT - Title" map
-    var_map = load_sfa_dictionary(dict_file)
+    # 2)-4) Rename columns in the combined SFA table and save it
+    rename_table(combined_csv, renamed_csv_out, dict_maps, typed=typed, fast=fast, scan_years=scan_years)
+
+def title_mapping(dict_maps, years):
+    """ combined_mapping over `years` (None = every dictionary year), reporting an empty result. """
+    var_map = combined_mapping(dict_maps, years=years)
     if not var_map:
         print("No valid mapping found in dictionary; columns remain short names.")
+    return var_map
+
+def rename_table(combined_path, renamed_path, dict_maps, typed=False, fast=True, scan_years=False):
+    """
+    Writes `combined_path` to `renamed_path` with its columns titled from the per-year
+    dictionary mappings `dict_maps` (see load_sfa_dictionaries); the newest title among the
+    data's own years wins, as in run_pipeline.
+    
+    With fast=True (and not typed) the data is not parsed where the format allows it:
+    - Parquet -> Parquet: metadata-only rename (rename_parquet_labels); the years come from
+      the partition directories
+    - a plain, unsplit, uncompressed CSV -> plain CSV: header-only rewrite (rename_csv_header).
+      Knowing its years would take a parse of the 'year' column, so every dictionary year
+      counts unless scan_years=True.
+    Everything else (compressed '.gz' / '.zst' or split CSVs, format changes, typed=True)
+    goes through read_table / write_table, and the years come from the parsed data.
+    """
+    if fast and not typed:
+        if is_parquet_path(combined_path) and is_parquet_path(renamed_path):
+            var_map = title_mapping(dict_maps, data_years(combined_path))
+            rename_parquet_labels(combined_path, renamed_path, var_map)
+            print(f"Final renamed output saved to: {renamed_path}")
+            return
+        if is_plain_csv(combined_path) and is_plain_csv(renamed_path, must_exist=False):
+            var_map = title_mapping(dict_maps, data_years(combined_path) if scan_years else None)
+            rename_csv_header(combined_path, renamed_path, var_map)
+            print(f"Final renamed output saved to: {renamed_path}")
+            return
     
-    # 3) Rename columns in the combined SFA CSV
     try:
-        df = pd.read_csv(combined_csv, dtype=str, low_memory=False)
+        df = read_table(combined_path)
     except Exception as e:
-        print(f"Error reading {combined_csv}: {e}")
+        print(f"Error reading {combined_path}: {e}")
         return
+    if typed:
+        df = apply_cached_schema(df, os.path.dirname(combined_path))
     
-    rename_dict = {}
-    for col in df.columns:
-        lower_col = col.lower()
-        if lower_col in var_map:
-            rename_dict[col] = var_map[lower_col]
+    years = set(df['year'].dropna().astype(str)) if 'year' in df.columns else None
+    df = apply_dictionary_names(df, title_mapping(dict_maps, years))
+    write_table(df, renamed_path)
+    print(f"Final renamed output saved to: {renamed_path}")
 
-    if rename_dict:
-        df.rename(columns=rename_dict, inplace=True)
-        print(f"Renamed {len(rename_dict)} columns using the dictionary.")
+def is_plain_csv(path, must_exist=True):
+    """ True for an uncompressed CSV held in a single file (not split), the kind whose header can be patched. """
+    if is_parquet_path(path) or csv_compression(path):
+        return False
+    return os.path.isfile(path) if must_exist else True
+
+def data_years(path):
+    """
+    Year labels present in the combined table at `path`: for Parquet the year=... partition
+    directories, for a CSV a parse of its 'year' column alone. None if it has no years.
+    """
+    if is_parquet_path(path):
+        years = {d.split("=", 1)[1] for d in os.listdir(path) if d.startswith("year=")}
+        return years or None
+    try:
+        return set(read_table(path, columns=["year"])["year"].dropna())
+    except (KeyError, ValueError) as e:
+        print(f"No year column in {path} ({e}); titles come from every dictionary year.")
+        return None
+
+def rename_csv_header(combined_csv, renamed_csv_out, var_map, buffer_size=16 * 1024 * 1024):
+    """
+    Header-only fast path: rewrites just the first line of `combined_csv` with the
+    "SHORT - Title" names and copies the rest of the file as raw bytes (copy_file_tail),
+    so the cost is a file copy instead of a full pandas parse + serialize.
+    The header is written with the same minimal quoting and line ending pandas uses; the
+    data rows are copied exactly as they are.
+    """
+    with open(combined_csv, 'rb') as src:
+        header_bytes = src.readline()
+        line_end = "\r\n" if header_bytes.endswith(b"\r\n") else "\n"
+        header = next(csv.reader([header_bytes.decode('utf-8').rstrip("\r\n")]))
+        
+        new_header = [var_map.get(col.lower(), col) for col in header]
+        n_renamed = sum(1 for old, new in zip(header, new_header) if old != new)
+        
+        out_line = io.StringIO()
+        csv.writer(out_line, lineterminator=line_end).writerow(new_header)
+        with open(renamed_csv_out, 'wb') as dst:
+            dst.write(out_line.getvalue().encode('utf-8'))
+            copy_file_tail(src, dst, len(header_bytes), buffer_size)
+    
+    if n_renamed:
+        print(f"Renamed {n_renamed} columns using the dictionary (header-only rewrite).")
     else:
         print("No columns matched the dictionary. Nothing renamed.")
 
-    # 4) Save final
-    df.to_csv(renamed_csv_out, index=False, encoding='utf-8')
-    print(f"Final renamed CSV saved to: {renamed_csv_out}")
+
+def rename_parquet_labels(combined_path, renamed_path, var_map):
+    """
+    Metadata-only rename for a Parquet dataset: the "SHORT - Title" names are recorded as
+    column labels next to the data (ipeds_io.write_column_labels) and read_table applies them.
+    If the output is a different path, the data files are hard-linked (or copied) there first.
+    """
+    if os.path.abspath(combined_path) != os.path.abspath(renamed_path):
+        link_or_copy_tree(combined_path, renamed_path)
+    
+    labels = read_column_labels(renamed_path)
+    # Only the stored schema (file footers) is looked at, never the data
+    for col in parquet_column_names(renamed_path):
+        if col.lower() in var_map:
+            labels[col] = var_map[col.lower()]
+    write_column_labels(renamed_path, labels)
+    print(f"Labelled {len(labels)} columns using the dictionary (metadata only).")
 
 ##############################
 #  Main Entrypoint
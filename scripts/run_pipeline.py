@@ -0,0 +1,154 @@
+import os
+import time
+import argparse
+from contextlib import contextmanager
+
+from ipeds_config import load_config
+from ipeds_io import write_table, is_parquet_path, write_value_labels, set_csv_engine
+from ipeds_schema import short_name
+from ipeds_db import load_sfa_db
+from ipeds_artifacts import evict
+from ipeds_hd import HD_DB_NAME, hd_dimension, build_hd_releases, load_hd_history
+from download_ipeds_sfa import download_ipeds_sfa
+from combine_ipeds_sfa import combine_frame
+from rename_sfa_columns import download_sfa_dictionaries, load_sfa_dictionaries, combined_mapping, \
+    apply_dictionary_names, resolve_variables, load_value_labels, combined_value_labels
+from merge_instnm import download_latest_hd_file, download_hd_files, find_hd_csv, attach_instnm
+
+@contextmanager
+def stage(name, timings):
+    """ Times one pipeline stage and records the wall time in `timings[name]`. """
+    print(f"\n===== {name} =====")
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - t0
+        print(f"----- {name} took {timings[name]:.1f}s")
+
+
+def local_files(folder, prefix, suffix=".zip"):
+    """ Files in `folder` like 'HD2013.zip', 'HD2014.zip', ... sorted by name (used when not downloading). """
+    if not os.path.isdir(folder):
+        return []
+    return [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+            if f.upper().startswith(prefix.upper()) and f.lower().endswith(suffix)]
+
+
+def latest_local_file(folder, prefix, suffix=".zip"):
+    """ Newest-named file in `folder` like 'HD2023.zip' (used when not downloading). """
+    names = local_files(folder, prefix, suffix)
+    return names[-1] if names else None
+
+
+def run_pipeline(config):
+    """
+    Runs download -> combine -> rename -> merge (-> load into config["database"]) in one process, handing DataFrames from
+    stage to stage in memory and writing only the final output (config["output"]).
+    The combined and renamed tables are also written when config["save_intermediates"] is set.
+    The downloader's list of changed years is only reported: which years the load rewrites is
+    decided by their content hashes (ipeds_db.load_sfa_db), since a revised dictionary or HD
+    release also changes the rows of years whose SFA zip is the same.
+    Prints the wall time of each stage; returns {stage: seconds}.
+    """
+    timings = {}
+    sfa_folder = config["sfa_folder"]
+    set_csv_engine(config["csv_engine"])
+
+    # 1) Download (zips only; later stages read straight from them)
+    if config["download"]:
+        with stage("download", timings):
+            fetch_opts = {"catalog_path": config["catalog_path"], "ttl_hours": config["catalog_ttl_hours"],
+                          "revalidate_hours": config["revalidate_hours"],
+                          "buffer_bytes": config["download_buffer_kb"] * 1024, "store": config["artifact_store"]}
+            download_ipeds_sfa(download_folder=sfa_folder, base_url=config["base_url"],
+                               max_workers=config["download_workers"], extract=not config["from_zips"], **fetch_opts)
+            download_sfa_dictionaries(config["dict_folder"], config["base_url"], **fetch_opts)
+            if config["hd_as_of"]:
+                hd_source = download_hd_files(config["hd_folder"], config["base_url"], **fetch_opts)
+            else:
+                hd_source = download_latest_hd_file(config["hd_folder"], config["base_url"], extract=False, **fetch_opts)
+            if config["artifact_store"]:
+                evict(config["artifact_store"], config["artifact_store_max_mb"])
+    elif config["hd_as_of"]:
+        hd_source = local_files(config["hd_folder"], "HD")
+    else:
+        hd_source = latest_local_file(config["hd_folder"], "HD") or find_hd_csv(config["hd_folder"])
+
+    # 2) Combine (only the requested variables are ever parsed; with typed=True coded
+    #    columns become categoricals over their dictionary codes)
+    variables = None
+    if config["variables"]:
+        variables = resolve_variables(config["variables"],
+                                      load_sfa_dictionaries(config["dict_folder"], config["artifact_store"]))
+    value_labels = combined_value_labels(load_value_labels(config["dict_folder"], config["artifact_store"]))
+    with stage("combine", timings):
+        df = combine_frame(sfa_folder, from_zips=config["from_zips"], typed=config["typed"], variables=variables,
+                           value_labels=value_labels)
+        if df is None:
+            return timings
+        if config["save_intermediates"]:
+            write_table(df, os.path.join(sfa_folder, "combined_ipeds_sfa.csv"), jobs=config["write_jobs"])
+
+    # 3) Rename
+    with stage("rename", timings):
+        dict_maps = load_sfa_dictionaries(config["dict_folder"], config["artifact_store"])
+        if not dict_maps:
+            print("No dictionary available; columns remain short names.")
+        else:
+            # Titles come from the newest dictionary year actually present in the data
+            df = apply_dictionary_names(df, combined_mapping(dict_maps, years=set(df['year'])))
+        if config["save_intermediates"]:
+            write_table(df, os.path.join(sfa_folder, "combined_ipeds_sfa_renamed.csv"), jobs=config["write_jobs"])
+
+    # 4) Merge
+    with stage("merge", timings):
+        db_path = os.path.join(config["hd_folder"], HD_DB_NAME)
+        if not hd_source:
+            print("No HD file available; output will not include INSTNM.")
+        else:
+            if config["hd_as_of"]:
+                build_hd_releases(hd_source, db_path)
+                dim = load_hd_history(db_path, config["hd_attributes"])
+            else:
+                dim = hd_dimension(hd_source, db_path, config["hd_attributes"])
+            merged_df = attach_instnm(df, dim, as_of=config["hd_as_of"])
+            if merged_df is not None:
+                df = merged_df
+
+    # 5) The single final write (label tables of the coded columns go next to a Parquet dataset)
+    present = {short_name(c) for c in df.columns}
+    value_labels = {name: codes for name, codes in value_labels.items() if name in present}
+    with stage("write", timings):
+        write_table(df, config["output"], jobs=config["write_jobs"], split_mb=config["split_mb"])
+        if value_labels and is_parquet_path(config["output"]):
+            write_value_labels(config["output"], value_labels)
+        print(f"Final output ({df.shape[0]} rows, {df.shape[1]} columns): {config['output']}")
+
+    # 6) Optional: upsert changed years into the local SQLite store
+    if config["database"]:
+        with stage("load", timings):
+            load_sfa_db(df, config["database"], dict_maps=dict_maps, value_labels=value_labels)
+
+    total = sum(timings.values())
+    print("\nStage timings:")
+    for name, seconds in timings.items():
+        print(f"  {name:<10} {seconds:>8.1f}s")
+    print(f"  {'total':<10} {total:>8.1f}s")
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the whole IPEDS SFA pipeline in one process.")
+    parser.add_argument("--config", default=None, help="JSON config file (see ipeds_config.DEFAULT_CONFIG)")
+    parser.add_argument("--skip-download", action="store_true", help="use the files already on disk")
+    parser.add_argument("--save-intermediates", action="store_true",
+                        help="also write combined_ipeds_sfa.csv and combined_ipeds_sfa_renamed.csv")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.skip_download:
+        config["download"] = False
+    if args.save_intermediates:
+        config["save_intermediates"] = True
+    run_pipeline(config)
@@ -0,0 +1,71 @@
+import os
+import sys
+import random
+import zipfile
+
+import pandas as pd
+import pytest
+
+# The scripts import each other as top-level modules
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+sys.path.insert(0, SCRIPTS)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_server import FixtureServer  # noqa: E402
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """ Folder served by a FixtureServer; yields (folder, server). Adjust server options per test. """
+    folder = tmp_path / "remote"
+    folder.mkdir()
+    with FixtureServer(str(folder)) as server:
+        yield folder, server
+
+
+def write_sfa_year(path, start_year, rows, columns):
+    """ A small SFA-like year file: UNITID plus `columns`, in that order (names as given). """
+    rng = random.Random(start_year)
+    data = {}
+    for col in columns:
+        name = col.lower()
+        if name == "unitid":
+            data[col] = [str(100000 + i) for i in range(rows)]
+        elif name.startswith("x"):
+            data[col] = [rng.choice(["R", "A", "Z"]) for _ in range(rows)]
+        elif name == "zip":
+            data[col] = [f"{rng.randrange(1000, 99999):05d}" for _ in range(rows)]
+        elif name == "note":
+            data[col] = [rng.choice(["", "plain", 'has, comma', 'has "quote"']) for _ in range(rows)]
+        elif name == "avgamt":
+            data[col] = [rng.choice(["", f"{rng.randrange(0, 99999)}.5", str(rng.randrange(0, 9999))])
+                         for _ in range(rows)]
+        else:
+            data[col] = [rng.choice(["", str(rng.randrange(0, 5000))]) for _ in range(rows)]
+    pd.DataFrame(data).to_csv(path, index=False)
+
+
+@pytest.fixture
+def sfa_folder(tmp_path):
+    """
+    Folder with three SFA years whose columns only partly overlap, differ in header case and
+    order, and include a revised '_rv' file (which must win), as CSVs and as NCES-style zips.
+    """
+    folder = tmp_path / "sfa"
+    folder.mkdir()
+    years = {
+        "sfa1314.csv": (13, ["UNITID", "scugrad", "xscugrad", "zip", "old_only", "avgamt", "note"]),
+        "sfa1314_rv.csv": (113, ["UNITID", "scugrad", "xscugrad", "zip", "old_only", "avgamt", "note"]),
+        "sfa1415.csv": (14, ["unitid", "avgamt", "SCUGRAD", "note", "xscugrad", "zip"]),
+        "sfa1516.csv": (15, ["UNITID", "scugrad", "xscugrad", "new_only", "zip", "avgamt", "note"]),
+    }
+    for name, (seed, columns) in years.items():
+        write_sfa_year(folder / name, 2000 + seed, 2500, columns)
+    zips = tmp_path / "zips"
+    zips.mkdir()
+    for root in ("sfa1314", "sfa1415", "sfa1516"):
+        with zipfile.ZipFile(zips / f"{root.upper()}.zip", "w", zipfile.ZIP_DEFLATED) as z:
+            for name in years:
+                if name.startswith(root):
+                    z.write(folder / name, name)
+    return folder
@@ -0,0 +1,133 @@
+"""
+Local stand-in for the NCES data center, for the download tests.
+
+Serves the files of a folder over HTTP/1.1 with ETag / Last-Modified validators, answers
+conditional GETs (If-None-Match / If-Modified-Since) with 304 and Range requests (honouring
+If-Range) with 206, and can be told to misbehave the way a flaky link does:
+
+    drop_every    - cut the connection after this many body bytes of every response
+    fail_next     - answer the next N requests with 503
+    ignore_range  - always send the whole file with 200
+
+Every request is recorded in `requests` as (method, path, headers).
+"""
+import os
+import socket
+import hashlib
+import threading
+import email.utils
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FixtureServer:
+
+    def __init__(self, root, drop_every=None, fail_next=0, ignore_range=False):
+        self.root = root
+        self.drop_every = drop_every
+        self.fail_next = fail_next
+        self.ignore_range = ignore_range
+        self.requests = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def gets(self, name=None):
+        """ The recorded GET requests (of `name` only, if given). """
+        return [r for r in self.requests if r[0] == "GET" and (name is None or r[1].lstrip("/") == name)]
+
+    def _take_failure(self):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+            return False
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._serve(body=False)
+
+            def do_GET(self):
+                self._serve(body=True)
+
+            def _send_empty(self, status, headers=()):
+                self.send_response(status)
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def _serve(self, body):
+                server.requests.append((self.command, self.path, dict(self.headers)))
+                if server._take_failure():
+                    self._send_empty(503)
+                    return
+                path = os.path.join(server.root, self.path.lstrip("/").split("?")[0])
+                if not os.path.isfile(path):
+                    self._send_empty(404)
+                    return
+                with open(path, "rb") as f:
+                    data = f.read()
+                etag = '"%s"' % hashlib.md5(data).hexdigest()
+                last_modified = email.utils.formatdate(os.stat(path).st_mtime, usegmt=True)
+                validators = (("ETag", etag), ("Last-Modified", last_modified))
+                if self.headers.get("If-None-Match") == etag:
+                    self._send_empty(304, validators)
+                    return
+
+                start = 0
+                requested = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                if (requested and requested.startswith("bytes=") and not server.ignore_range
+                        and if_range in (None, etag, last_modified)):
+                    start = int(requested[len("bytes="):].split("-")[0])
+                    if start >= len(data):
+                        self._send_empty(416, (("Content-Range", f"bytes */{len(data)}"),))
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+                else:
+                    self.send_response(200)
+                chunk = data[start:]
+                self.send_header("Content-Length", str(len(chunk)))
+                for key, value in validators:
+                    self.send_header(key, value)
+                self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+                if not body:
+                    return
+                if server.drop_every and len(chunk) > server.drop_every:
+                    self.wfile.write(chunk[:server.drop_every])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                self.wfile.write(chunk)
+
+        return Handler
@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import zipfile
+
+from ipeds_artifacts import add_object, record_artifact, latest, materialize, evict, usage, extract_members, \
+    object_path, INDEX_NAME
+
+
+def test_revisions_count_up_only_on_new_content(tmp_path):
+    store = str(tmp_path / "store")
+    first = add_object(store, data=b"v1")
+    assert record_artifact(store, "sfa", "2014", "SFA1415.zip", first) == 1
+    assert record_artifact(store, "sfa", "2014", "SFA1415.zip", first) == 1
+    second = add_object(store, data=b"v2")
+    assert record_artifact(store, "sfa", "2014", "SFA1415.zip", second) == 2
+    assert record_artifact(store, "sfa", "2015", "SFA1415.zip", second) == 1
+    # Going back to earlier content is still a new revision
+    assert record_artifact(store, "sfa", "2014", "SFA1415.zip", first) == 3
+    assert latest(store, "sfa", "2014", "SFA1415.zip")["revision"] == 3
+    assert add_object(store, data=b"v1") == first and usage(store)[0] == 2
+
+
+def test_eviction_keeps_the_history(tmp_path):
+    store = str(tmp_path / "store")
+    old = add_object(store, data=b"a" * 600_000)
+    record_artifact(store, "sfa", "2014", "SFA1415.zip", old, meta={"etag": "1"})
+    new = add_object(store, data=b"b" * 600_000)
+    record_artifact(store, "sfa", "2014", "SFA1415.zip", new, meta={"etag": "2"})
+    linked = materialize(store, new, str(tmp_path / "SFA1415.zip"))
+
+    # The least recently used object goes; its index rows stay
+    assert evict(store, max_mb=1) == 600_000
+    assert not os.path.exists(object_path(store, old)) and os.path.exists(object_path(store, new))
+    assert usage(store) == (1, 600_000)
+    with sqlite3.connect(os.path.join(store, INDEX_NAME)) as conn:
+        assert conn.execute("SELECT revision, sha256 FROM artifacts ORDER BY revision").fetchall() == [(1, old), (2, new)]
+    assert materialize(store, old, str(tmp_path / "old.zip")) is None
+    assert not os.path.exists(tmp_path / "old.zip")
+
+    # With everything evicted, lookups miss but revisions keep counting from the history
+    evict(store, max_mb=0)
+    assert latest(store, "sfa", "2014", "SFA1415.zip") is None
+    assert open(linked, "rb").read() == b"b" * 600_000
+    third = add_object(store, data=b"c")
+    assert record_artifact(store, "sfa", "2014", "SFA1415.zip", third) == 3
+    # Re-adding evicted content puts it back in the count
+    add_object(store, data=b"b" * 600_000)
+    assert usage(store) == (2, 600_001)
+
+
+def test_evicted_members_are_extracted_again(tmp_path):
+    store = str(tmp_path / "store")
+    zip_path = tmp_path / "SFA1415.zip"
+    with zipfile.ZipFile(zip_path, "w") as z:
+        z.writestr("sfa1415.csv", "unitid\n1\n")
+    out = tmp_path / "out"
+    extract_members(str(zip_path), str(out), store=store, component="sfa", year="2014")
+    evict(store, max_mb=0)
+    os.remove(out / "sfa1415.csv")
+    extract_members(str(zip_path), str(out), store=store, component="sfa", year="2014")
+    assert (out / "sfa1415.csv").read_text() == "unitid\n1\n"
+    assert usage(store)[0] == 1
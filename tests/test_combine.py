@@ -0,0 +1,77 @@
+import pandas as pd
+
+from combine_ipeds_sfa import combine_csvs, find_sfa_csvs
+
+SOURCES = [("sfa1314_rv.csv", "2013-2014"), ("sfa1415.csv", "2014-2015"), ("sfa1516.csv", "2015-2016")]
+
+
+def expected_frame(folder, sources=SOURCES):
+    """ What the combine is defined as: pd.concat of each year's common columns plus 'year'. """
+    frames = []
+    for name, year in sources:
+        df = pd.read_csv(folder / name, dtype=str)
+        df.columns = [c.lower().strip() for c in df.columns]
+        frames.append(df)
+    common = set.intersection(*(set(df.columns) for df in frames))
+    frames = [df[[c for c in df.columns if c in common]].assign(year=year)
+              for df, (_, year) in zip(frames, sources)]
+    return pd.concat(frames)
+
+
+def expected_bytes(folder, sources=SOURCES):
+    return expected_frame(folder, sources).to_csv(index=False).encode("utf-8")
+
+
+def test_only_sfa_year_files_are_sources(sfa_folder):
+    (sfa_folder / "combined_ipeds_sfa.csv").write_text("unitid,year\n1,2013-2014\n")
+    (sfa_folder / "sfa_notes.csv").write_text("x\n1\n")
+    assert list(find_sfa_csvs(str(sfa_folder))) == ["SFA1314", "SFA1415", "SFA1516"]
+    assert find_sfa_csvs(str(sfa_folder))["SFA1314"].endswith("sfa1314_rv.csv")
+
+
+def test_incremental_rerun_in_the_same_folder(sfa_folder):
+    output = sfa_folder / "combined_ipeds_sfa.csv"
+    assert combine_csvs(str(sfa_folder), incremental=True) == ["SFA1314", "SFA1415", "SFA1516"]
+    assert output.read_bytes() == expected_bytes(sfa_folder)
+
+    # The previous output sits next to the sources now; it must not become a year of its own
+    assert combine_csvs(str(sfa_folder), incremental=True) == []
+    assert output.read_bytes() == expected_bytes(sfa_folder)
+
+    # A revised year is the only one re-parsed
+    extra = pd.read_csv(sfa_folder / "sfa1415.csv", dtype=str).iloc[:10]
+    extra.to_csv(sfa_folder / "sfa1415_rv.csv", index=False)
+    assert combine_csvs(str(sfa_folder), incremental=True) == ["SFA1415"]
+    revised = [SOURCES[0], ("sfa1415_rv.csv", "2014-2015"), SOURCES[2]]
+    assert output.read_bytes() == expected_bytes(sfa_folder, revised)
+
+
+def test_in_memory_combine(sfa_folder):
+    combine_csvs(str(sfa_folder), output_csv="out.csv")
+    assert (sfa_folder / "out.csv").read_bytes() == expected_bytes(sfa_folder)
+
+
+def test_streaming_combine_is_byte_identical(sfa_folder, capsys):
+    # A budget this small forces the streamed path, in chunks of 1,000 rows (three per year)
+    combine_csvs(str(sfa_folder), output_csv="streamed.csv", memory_budget_mb=0.01)
+    assert "streamed in chunks of 1000 rows" in capsys.readouterr().out
+    assert (sfa_folder / "streamed.csv").read_bytes() == expected_bytes(sfa_folder)
+
+
+def test_streaming_combine_from_zips(sfa_folder, capsys):
+    zips = sfa_folder.parent / "zips"
+    combine_csvs(str(zips), output_csv="streamed.csv", from_zips=True, memory_budget_mb=0.01)
+    assert "streamed in chunks" in capsys.readouterr().out
+    assert (zips / "streamed.csv").read_bytes() == expected_bytes(sfa_folder)
+
+
+def test_process_pool_combine_is_byte_identical(sfa_folder, capsys):
+    combine_csvs(str(sfa_folder), output_csv="parallel.csv", jobs=2)
+    assert "parsed with 2 worker processes" in capsys.readouterr().out
+    assert (sfa_folder / "parallel.csv").read_bytes() == expected_bytes(sfa_folder)
+
+
+def test_process_pool_combine_from_zips(sfa_folder):
+    zips = sfa_folder.parent / "zips"
+    combine_csvs(str(zips), output_csv="parallel.csv", from_zips=True, jobs=3)
+    assert (zips / "parallel.csv").read_bytes() == expected_bytes(sfa_folder)
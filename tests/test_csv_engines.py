@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+import ipeds_io
+from ipeds_io import set_csv_engine, read_source_csv, iter_source_csv
+from combine_ipeds_sfa import combine_csvs
+from test_combine import expected_bytes
+
+pytest.importorskip("pyarrow")
+
+TRICKY_CSV = (
+    'UNITID,name,opened,zip,amount\n'
+    '100,"plain",2020-01-31,01002,12.5\n'
+    '200,"has, comma",2021-02-28,,\n'
+    '300,"has ""quote"" and\nnewline",,99501,7\n'
+    '400,short\n'
+)
+
+
+@pytest.fixture
+def engine():
+    """ Selects a CSV engine for one test and restores the previous one afterwards. """
+    previous = ipeds_io.CSV_ENGINE
+    yield set_csv_engine
+    set_csv_engine(previous)
+
+
+def read_with(engine, path, **kwargs):
+    engine("c")
+    c = read_source_csv(str(path), **kwargs)
+    engine("pyarrow")
+    arrow = read_source_csv(str(path), **kwargs)
+    return c, arrow
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"dtype": str},
+    {"dtype": str, "usecols": ["UNITID", "zip"]},
+    {"dtype": str, "usecols": lambda c: c.lower() in {"unitid", "opened"}},
+    {"dtype": str, "low_memory": False},
+])
+def test_engines_read_the_same_frame(tmp_path, engine, kwargs):
+    path = tmp_path / "tricky.csv"
+    path.write_text(TRICKY_CSV)
+    c, arrow = read_with(engine, path, **kwargs)
+    pd.testing.assert_frame_equal(arrow, c)
+
+
+def test_engines_read_zip_members_the_same(sfa_folder, engine):
+    c, arrow = read_with(engine, sfa_folder.parent / "zips" / "SFA1314.zip", dtype=str)
+    pd.testing.assert_frame_equal(arrow, c)
+
+
+def test_engines_chunk_the_same(sfa_folder, engine):
+    chunks = {}
+    for name in ("c", "pyarrow"):
+        engine(name)
+        chunks[name] = list(iter_source_csv(str(sfa_folder / "sfa1415.csv"), 1000, dtype=str))
+    assert [len(c) for c in chunks["pyarrow"]] == [len(c) for c in chunks["c"]] == [1000, 1000, 500]
+    for arrow, c in zip(chunks["pyarrow"], chunks["c"]):
+        pd.testing.assert_frame_equal(arrow, c)
+
+
+@pytest.mark.parametrize("options", [{}, {"memory_budget_mb": 0.01}, {"jobs": 2}, {"incremental": True}])
+def test_pyarrow_combine_is_byte_identical(sfa_folder, engine, options):
+    engine("pyarrow")
+    combine_csvs(str(sfa_folder), output_csv="arrow.csv", **options)
+    assert (sfa_folder / "arrow.csv").read_bytes() == expected_bytes(sfa_folder)
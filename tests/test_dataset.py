@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from ipeds_dataset import IpedsDataset
+from ipeds_db import load_sfa_db
+from ipeds_io import write_csv, write_table, csv_parts
+
+
+def final_table(per_year=20_000):
+    """ Three years of `per_year` institutions; each year is one 100,000-cell CSV block. """
+    years = ["2013-2014", "2014-2015", "2015-2016"]
+    ids = range(per_year * len(years))
+    return pd.DataFrame({
+        "UNITID": [str(100000 + i % per_year) for i in ids],
+        "INSTNM": [f"College {i % per_year}" for i in ids],
+        "SCUGRAD - Number of undergraduates": [str(i) for i in ids],
+        "ZIP - ZIP code": [f"{i % per_year:05d}" for i in ids],
+        "year": [years[i // per_year] for i in ids],
+    })
+
+
+@pytest.fixture(scope="module")
+def outputs(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("outputs")
+    df = final_table()
+    csv = str(tmp_path / "final.csv")
+    write_csv(df, csv)
+    split = str(tmp_path / "split.csv")
+    write_csv(df, split, split_mb=0.5, block_cells=100_000)
+    parquet = str(tmp_path / "final.parquet")
+    write_table(df, parquet)
+    db = str(tmp_path / "final.sqlite")
+    load_sfa_db(df, db)
+    assert len(csv_parts(split)) > 2
+    return {"csv": csv, "split": split, "parquet": parquet, "sqlite": db}
+
+
+def as_text(df):
+    return df.astype(str).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("kind", ["csv", "split", "parquet", "sqlite"])
+def test_pushdown_returns_the_same_slice_from_every_storage(outputs, kind):
+    df = final_table()
+    wanted = df[df["year"].isin(["2014-2015", "2015-2016"]) & df["UNITID"].isin(["100007", "100150"])]
+    wanted = wanted[["INSTNM", "SCUGRAD - Number of undergraduates", "ZIP - ZIP code"]]
+
+    ds = IpedsDataset(outputs[kind]).select("instnm", "scugrad", "ZIP code").where(years=[2014, "2015-2016"],
+                                                                                   unitids=["100150", 100007])
+    assert ds.explain().startswith(("csv", "parquet", "sqlite"))
+    got = ds.to_pandas()
+    assert list(got.columns) == list(wanted.columns)
+    pd.testing.assert_frame_equal(as_text(got), as_text(wanted))
+    assert got["ZIP - ZIP code"].tolist() == ["00007", "00150", "00007", "00150"]
+
+
+@pytest.mark.parametrize("kind", ["csv", "split", "parquet", "sqlite"])
+def test_plain_select_reads_every_row(outputs, kind):
+    got = IpedsDataset(outputs[kind]).select("UNITID", "year").to_pandas()
+    pd.testing.assert_frame_equal(as_text(got), as_text(final_table()[["UNITID", "year"]]))
+
+
+def test_unknown_column_is_reported(outputs):
+    with pytest.raises(KeyError):
+        IpedsDataset(outputs["csv"]).select("nope")
@@ -0,0 +1,52 @@
+import sqlite3
+
+import pandas as pd
+
+from ipeds_db import load_sfa_db, query_sfa, institution_series, value_labels
+
+
+def final_table():
+    return pd.DataFrame({
+        "UNITID": ["100654", "100663", "100654", "100663", "100654"],
+        "SCUGRAD - Number of undergraduates": ["10", "20", "11", "21", "12"],
+        "ZIP - ZIP code": ["01002", "35294", "01002", "35294", "01002"],
+        "XSCUGRAD - Imputation": ["R", "R", "A", "R", "R"],
+        "year": ["2013-2014", "2013-2014", "2014-2015", "2014-2015", "2015-2016"],
+    })
+
+
+def test_load_upserts_only_changed_years(tmp_path):
+    db = str(tmp_path / "sfa.sqlite")
+    df = final_table()
+    assert load_sfa_db(df, db, value_labels={"xscugrad": {"R": "Reported"}}) == ["2013-2014", "2014-2015", "2015-2016"]
+    assert load_sfa_db(df, db) == []
+
+    df.loc[2, "SCUGRAD - Number of undergraduates"] = "99"
+    assert load_sfa_db(df, db) == ["2014-2015"]
+    assert institution_series(100654, ["scugrad"], db, labels=False)["scugrad"].tolist() == [10, 99, 12]
+    assert value_labels(db) == {"xscugrad": {"R": "Reported"}}
+
+    # `years` restricts a load without deleting the other years
+    df.loc[0, "SCUGRAD - Number of undergraduates"] = "1"
+    assert load_sfa_db(df[df["year"] == "2015-2016"], db, years={"2015-2016"}) == []
+    assert len(query_sfa(db)) == 5
+
+
+def test_full_load_deletes_vanished_years(tmp_path):
+    db = str(tmp_path / "sfa.sqlite")
+    df = final_table()
+    load_sfa_db(df, db)
+    assert load_sfa_db(df[df["year"] != "2013-2014"], db) == []
+    assert sorted(query_sfa(db, columns=["year"])["year"].unique()) == ["2014-2015", "2015-2016"]
+    with sqlite3.connect(db) as conn:
+        assert [r[0] for r in conn.execute("SELECT year FROM sfa_loads ORDER BY year")] == ["2014-2015", "2015-2016"]
+
+
+def test_query_keeps_text_codes_and_labels(tmp_path):
+    db = str(tmp_path / "sfa.sqlite")
+    load_sfa_db(final_table(), db)
+    df = query_sfa(db, columns=["unitid", "ZIP - ZIP code", "scugrad"], years=["2014-2015", "2015-2016"], unitids=[100654])
+    assert list(df.columns) == ["UNITID", "ZIP - ZIP code", "SCUGRAD - Number of undergraduates"]
+    assert df.values.tolist() == [[100654, "01002", 11], [100654, "01002", 12]]
+    with sqlite3.connect(db) as conn:
+        assert dict((r[1], r[2]) for r in conn.execute("PRAGMA table_info(sfa)"))["zip"] == "TEXT"
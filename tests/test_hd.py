@@ -0,0 +1,39 @@
+import pandas as pd
+
+from ipeds_hd import hd_dimension, lookup_attributes, build_hd_releases, load_hd_history, asof_attributes
+
+
+def write_hd(path, rows):
+    pd.DataFrame(rows, columns=["UNITID", "INSTNM", "STABBR"]).to_csv(path, index=False)
+    return str(path)
+
+
+def test_lookup_aligns_to_the_sfa_rows(tmp_path):
+    hd = write_hd(tmp_path / "hd2015.csv", [["100654", "Alabama A & M University", "AL"],
+                                            ["100663", "University of Alabama at Birmingham", "AL"],
+                                            ["100690", "Amridge University", "AL"]])
+    dim = hd_dimension(hd, str(tmp_path / "hd.sqlite"), attributes=("instnm", "stabbr"))
+    unitids = pd.Series(["100690", "999999", "100654", None, "100690"], index=[10, 11, 12, 13, 14])
+    found = lookup_attributes(unitids, dim)
+    assert list(found.index) == [10, 11, 12, 13, 14]
+    assert found["INSTNM"].tolist()[::2] == ["Amridge University", "Alabama A & M University", "Amridge University"]
+    assert found.loc[[11, 13]].isna().all(axis=None)
+    # Numeric UNITIDs work the same as strings
+    assert lookup_attributes(pd.Series([100663]), dim)["STABBR"].tolist() == ["AL"]
+
+
+def test_asof_takes_the_newest_release_no_later_than_the_year(tmp_path):
+    db = str(tmp_path / "hd.sqlite")
+    build_hd_releases([write_hd(tmp_path / "hd2013.csv", [["1", "Old Name", "AL"], ["2", "Two", "GA"]]),
+                       write_hd(tmp_path / "hd2014.csv", [["1", "Old Name", "AL"], ["2", "Two", "GA"]]),
+                       write_hd(tmp_path / "hd2015.csv", [["1", "New Name", "AL"], ["3", "Three", "TX"]])], db)
+    history = load_hd_history(db, attributes=("INSTNM",))
+    # The unchanged 2014 rows are dropped
+    assert history[["UNITID", "hd_year"]].values.tolist() == [[1, 2013], [1, 2015], [2, 2013], [3, 2015]]
+
+    unitids = pd.Series(["1", "1", "1", "1", "2", "3", "3", "4"])
+    years = pd.Series(["2012-2013", "2013-2014", "2014-2015", "2016-2017",
+                       "2016-2017", "2013-2014", "2015-2016", "2015-2016"])
+    names = asof_attributes(unitids, years, history)["INSTNM"].tolist()
+    assert names[:7] == ["Old Name", "Old Name", "Old Name", "New Name", "Two", "Three", "Three"]
+    assert pd.isna(names[7])
@@ -0,0 +1,127 @@
+import io
+import os
+import time
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ipeds_http import make_session, HostLimiter, request_with_retries
+from ipeds_catalog import load_catalog, available
+from download_ipeds_sfa import download_ipeds_sfa
+
+
+def write_zip(path, members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        for name, text in members.items():
+            z.writestr(name, text)
+    with open(path, "wb") as f:
+        f.write(buf.getvalue())
+
+
+def test_request_with_retries_retries_503(remote):
+    folder, server = remote
+    (folder / "a.txt").write_text("hello")
+    server.fail_next = 2
+    with make_session() as session:
+        resp = request_with_retries(session, "GET", server.url + "a.txt", retries=3, backoff=0.01)
+    assert resp.status_code == 200
+    assert resp.text == "hello"
+    assert len(server.gets("a.txt")) == 3
+
+
+def test_request_with_retries_gives_up(remote):
+    folder, server = remote
+    (folder / "a.txt").write_text("hello")
+    server.fail_next = 5
+    with make_session() as session:
+        resp = request_with_retries(session, "GET", server.url + "a.txt", retries=2, backoff=0.01)
+    assert resp.status_code == 503
+    assert len(server.gets("a.txt")) == 3
+
+
+def test_request_with_retries_does_not_retry_404(remote):
+    _, server = remote
+    with make_session() as session:
+        resp = request_with_retries(session, "GET", server.url + "missing.zip", retries=3, backoff=0.01)
+    assert resp.status_code == 404
+    assert len(server.gets()) == 1
+
+
+def test_host_limiter_caps_requests_per_host():
+    limiter = HostLimiter(per_host=2)
+    lock = threading.Lock()
+    in_flight = {"now": 0, "max": 0}
+
+    def work(url):
+        with limiter.slot(url):
+            with lock:
+                in_flight["now"] += 1
+                in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            time.sleep(0.02)
+            with lock:
+                in_flight["now"] -= 1
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(work, ["http://example.org/f"] * 16))
+    assert in_flight["max"] == 2
+
+
+def test_catalog_lists_posted_years(remote, tmp_path):
+    folder, server = remote
+    write_zip(folder / "SFA1314.zip", {"sfa1314.csv": "UNITID\n1\n"})
+    write_zip(folder / "SFA1516.zip", {"sfa1516.csv": "UNITID\n1\n"})
+    catalog_path = str(tmp_path / "catalog.json")
+    catalog = load_catalog(catalog_path, server.url, ttl_hours=1)
+    assert available(catalog, "sfa") == [("2013-2014", "SFA1314.zip"), ("2015-2016", "SFA1516.zip")]
+
+    # Fresh catalog: no requests at all
+    probes = len(server.requests)
+    load_catalog(catalog_path, server.url, ttl_hours=1)
+    assert len(server.requests) == probes
+
+
+def test_download_then_revalidate(remote, tmp_path):
+    folder, server = remote
+    write_zip(folder / "SFA1314.zip", {"sfa1314.csv": "UNITID,SCUGRAD\n1,10\n"})
+    out = tmp_path / "sfa"
+    catalog_path = str(tmp_path / "catalog.json")
+
+    summary = download_ipeds_sfa(str(out), base_url=server.url, catalog_path=catalog_path, ttl_hours=0,
+                                 backoff=0.01)
+    assert summary["files"] == 1
+    assert summary["changed_years"] == ["2013-2014"]
+    assert (out / "sfa1314.csv").read_text() == "UNITID,SCUGRAD\n1,10\n"
+
+    # Second run: one conditional GET answered with 304, nothing downloaded
+    before = len(server.gets("SFA1314.zip"))
+    summary = download_ipeds_sfa(str(out), base_url=server.url, catalog_path=catalog_path, ttl_hours=0,
+                                 backoff=0.01)
+    gets = server.gets("SFA1314.zip")[before:]
+    assert summary["files"] == 0
+    assert summary["changed_years"] == []
+    assert len(gets) == 1 and "If-None-Match" in gets[0][2]
+    assert sorted(os.listdir(out)) == ["SFA1314.zip", "download_manifest.json", "sfa1314.csv"]
+
+
+def test_fresh_catalog_still_revalidates_files(remote, tmp_path):
+    folder, server = remote
+    write_zip(folder / "SFA1314.zip", {"sfa1314.csv": "UNITID,SCUGRAD\n1,10\n"})
+    out = tmp_path / "sfa"
+    catalog_path = str(tmp_path / "catalog.json")
+    download_ipeds_sfa(str(out), base_url=server.url, catalog_path=catalog_path, ttl_hours=24, backoff=0.01)
+
+    # Revised in place: the catalog is trusted, but the zip is still checked and fetched again
+    write_zip(folder / "SFA1314.zip", {"sfa1314.csv": "UNITID,SCUGRAD\n1,20\n"})
+    heads = len([r for r in server.requests if r[0] == "HEAD"])
+    summary = download_ipeds_sfa(str(out), base_url=server.url, catalog_path=catalog_path, ttl_hours=24,
+                                 backoff=0.01)
+    assert len([r for r in server.requests if r[0] == "HEAD"]) == heads
+    assert summary["changed_years"] == ["2013-2014"]
+    assert (out / "sfa1314.csv").read_text() == "UNITID,SCUGRAD\n1,20\n"
+
+    # Within revalidate_hours nothing is requested at all
+    gets = len(server.gets())
+    download_ipeds_sfa(str(out), base_url=server.url, catalog_path=catalog_path, ttl_hours=24,
+                       revalidate_hours=1, backoff=0.01)
+    assert len(server.gets()) == gets
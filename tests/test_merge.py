@@ -0,0 +1,76 @@
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+from merge_instnm import merge_instnm, UNITID_TITLE
+
+
+def write_hd_zip(path, year, names):
+    buf = io.StringIO()
+    pd.DataFrame({"UNITID": list(names), "INSTNM": list(names.values())}).to_csv(buf, index=False)
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr(f"hd{year}.csv", buf.getvalue().encode("latin1"))
+
+
+def write_sfa(path, rows):
+    pd.DataFrame(rows, columns=[UNITID_TITLE, "SCUGRAD - Undergraduates", "year"]).to_csv(path, index=False)
+
+
+def test_latest_release_by_default_through_the_given_server(remote, tmp_path):
+    folder, server = remote
+    write_hd_zip(folder / "HD2013.zip", 2013, {100: "Old Name", 200: "Closed College"})
+    write_hd_zip(folder / "HD2014.zip", 2014, {100: "New Name"})
+    sfa = tmp_path / "renamed.csv"
+    write_sfa(sfa, [["100", "5", "2013-2014"], ["200", "7", "2013-2014"], ["100", "6", "2014-2015"]])
+    out = tmp_path / "with_name.csv"
+
+    merge_instnm(str(sfa), str(out), hd_folder=str(tmp_path / "hd"), base_url=server.url,
+                 catalog_path=str(tmp_path / "catalog.json"))
+    df = pd.read_csv(out, dtype=str)
+    assert list(df["INSTNM"].fillna("")) == ["New Name", "", "New Name"]
+    assert server.gets("HD2014.zip") and not server.gets("HD2013.zip")
+
+
+def test_as_of_uses_each_rows_release(remote, tmp_path):
+    folder, server = remote
+    write_hd_zip(folder / "HD2013.zip", 2013, {100: "Old Name", 200: "Closed College"})
+    write_hd_zip(folder / "HD2014.zip", 2014, {100: "New Name"})
+    sfa = tmp_path / "renamed.csv"
+    write_sfa(sfa, [["100", "5", "2013-2014"], ["200", "7", "2013-2014"], ["100", "6", "2014-2015"]])
+    out = tmp_path / "with_name.csv"
+
+    merge_instnm(str(sfa), str(out), as_of=True, hd_folder=str(tmp_path / "hd"), base_url=server.url,
+                 catalog_path=str(tmp_path / "catalog.json"))
+    df = pd.read_csv(out, dtype=str)
+    assert list(df["INSTNM"]) == ["Old Name", "Closed College", "New Name"]
+
+
+@pytest.mark.parametrize("as_of", [False, True])
+@pytest.mark.parametrize("rows", [[], [["100", "5", "2013-2014"], ["300", "7", "2014-2015"]]])
+def test_streamed_merge_matches_in_memory(remote, tmp_path, as_of, rows):
+    folder, server = remote
+    write_hd_zip(folder / "HD2013.zip", 2013, {100: "Old Name", 200: "Closed College"})
+    write_hd_zip(folder / "HD2014.zip", 2014, {100: "New Name"})
+    sfa = tmp_path / "renamed.csv"
+    write_sfa(sfa, rows)
+    opts = {"as_of": as_of, "hd_folder": str(tmp_path / "hd"), "base_url": server.url,
+            "catalog_path": str(tmp_path / "catalog.json")}
+
+    merge_instnm(str(sfa), str(tmp_path / "in_memory.csv"), **opts)
+    merge_instnm(str(sfa), str(tmp_path / "streamed.csv"), memory_budget_mb=1, **opts)
+    expected = (tmp_path / "in_memory.csv").read_bytes()
+    assert expected.startswith(b"UNITID,SCUGRAD - Undergraduates,year,INSTNM")
+    assert (tmp_path / "streamed.csv").read_bytes() == expected
+
+
+def test_streamed_merge_writes_the_header_without_chunks(tmp_path, monkeypatch):
+    import merge_instnm
+    sfa = tmp_path / "renamed.csv"
+    write_sfa(sfa, [])
+    dim = pd.DataFrame({"INSTNM": ["Old Name"]}, index=pd.Index([100], name="UNITID"))
+    monkeypatch.setattr(merge_instnm, "iter_source_csv", lambda *args, **kwargs: iter(()))
+    stats = merge_instnm.stream_merge(str(sfa), dim, str(tmp_path / "out.csv"), memory_budget_mb=1)
+    assert stats["rows"] == 0
+    assert (tmp_path / "out.csv").read_bytes() == b"UNITID,SCUGRAD - Undergraduates,year,INSTNM\n"
@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+import pytest
+
+from ipeds_io import write_table, read_table, write_column_labels, parquet_column_names
+
+pytest.importorskip("pyarrow")
+
+
+def sfa_strings():
+    return pd.DataFrame({
+        "unitid": ["100654", "100663", "100654"],
+        "scugrad": ["4000", None, "4100"],
+        "avgamt": ["12.5", "7", None],
+        "zip": ["01002", "35294", "01002"],
+        "opeid": ["00100200", "00105200", "00100200"],
+        "instnm": ["Alabama A & M", "UAB", "Alabama A & M"],
+        "year": ["2013-2014", "2013-2014", "2014-2015"],
+    })
+
+
+def test_round_trip_types_numbers_and_keeps_codes(tmp_path):
+    df = sfa_strings()
+    before = df.copy()
+    path = tmp_path / "out.parquet"
+    write_table(df, str(path))
+
+    pd.testing.assert_frame_equal(df, before)  # the caller's frame is left alone
+    assert sorted(os.listdir(path)) == ["year=2013-2014", "year=2014-2015"]
+
+    back = read_table(str(path)).sort_values(["year", "unitid"]).reset_index(drop=True)
+    assert back["unitid"].tolist() == [100654, 100663, 100654]
+    assert pd.api.types.is_numeric_dtype(back["scugrad"]) and back["scugrad"].isna().tolist() == [False, True, False]
+    assert back["avgamt"].tolist()[:2] == [12.5, 7.0]
+    assert back["zip"].tolist() == ["01002", "35294", "01002"]
+    assert back["opeid"].tolist() == ["00100200", "00105200", "00100200"]
+    assert back["instnm"].tolist() == df["instnm"].tolist()
+    assert back["year"].tolist() == df["year"].tolist()
+
+
+def test_columns_and_filters_are_pushed_down(tmp_path):
+    path = tmp_path / "out.parquet"
+    write_table(sfa_strings(), str(path))
+    back = read_table(str(path), columns=["unitid", "year"], filters=[("year", "in", ["2014-2015"])])
+    assert back.to_dict("list") == {"unitid": [100654], "year": ["2014-2015"]}
+
+
+def test_labels_apply_on_read(tmp_path):
+    path = tmp_path / "out.parquet"
+    write_table(sfa_strings(), str(path))
+    write_column_labels(str(path), {"scugrad": "SCUGRAD - Total undergraduates"})
+    assert "scugrad" in parquet_column_names(str(path))
+    back = read_table(str(path), columns=["SCUGRAD - Total undergraduates"])
+    assert list(back.columns) == ["SCUGRAD - Total undergraduates"]
+
+
+def test_csv_output_is_unchanged(tmp_path):
+    df = sfa_strings()
+    path = tmp_path / "out.csv"
+    write_table(df, str(path))
+    assert path.read_bytes() == df.to_csv(index=False).encode("utf-8")
+    pd.testing.assert_frame_equal(read_table(str(path)), pd.read_csv(path, dtype=str))
@@ -0,0 +1,97 @@
+import os
+
+import pandas as pd
+import pytest
+
+import rename_sfa_columns as rename
+from ipeds_io import write_table, write_csv, read_table, split_parts
+
+VAR_MAP = {"unitid": "UNITID - Unique identification number of the institution",
+           "scugrad": "SCUGRAD - Total number of undergraduates"}
+DICT_MAPS = {"2014-2015": VAR_MAP}
+
+
+def sample_frame(rows=50):
+    return pd.DataFrame({"unitid": [str(100000 + i) for i in range(rows)],
+                         "scugrad": [str(i * 7) for i in range(rows)],
+                         "year": ["2013-2014"] * (rows // 2) + ["2014-2015"] * (rows - rows // 2)})
+
+
+def renamed_frame(df):
+    return df.rename(columns=lambda c: VAR_MAP.get(c, c))
+
+
+def test_plain_csv_rewrites_only_the_header(tmp_path):
+    df = sample_frame()
+    src, out = tmp_path / "comb.csv", tmp_path / "renamed.csv"
+    write_table(df, str(src))
+    rename.rename_table(str(src), str(out), DICT_MAPS)
+    assert out.read_bytes() == renamed_frame(df).to_csv(index=False).encode("utf-8")
+
+
+@pytest.mark.parametrize("suffix", [".csv.gz", ".csv.zst"])
+def test_compressed_csv_is_rewritten_through_pandas(tmp_path, suffix):
+    df = sample_frame()
+    src, out = tmp_path / f"comb{suffix}", tmp_path / f"renamed{suffix}"
+    write_table(df, str(src))
+    rename.rename_table(str(src), str(out), DICT_MAPS)
+    pd.testing.assert_frame_equal(read_table(str(out)), renamed_frame(df))
+
+
+def test_compressed_to_plain_csv(tmp_path):
+    df = sample_frame()
+    src, out = tmp_path / "comb.csv.gz", tmp_path / "renamed.csv"
+    write_table(df, str(src))
+    rename.rename_table(str(src), str(out), DICT_MAPS)
+    assert out.read_bytes() == renamed_frame(df).to_csv(index=False).encode("utf-8")
+
+
+def test_split_csv_is_read_part_by_part(tmp_path):
+    df = sample_frame(40_000)
+    src, out = tmp_path / "comb.csv", tmp_path / "renamed.csv"
+    write_csv(df, str(src), split_mb=0.5, block_cells=100_000)
+    assert len(split_parts(str(src))) > 1 and not src.exists()
+    rename.rename_table(str(src), str(out), DICT_MAPS)
+    assert out.read_bytes() == renamed_frame(df).to_csv(index=False).encode("utf-8")
+
+
+def test_rename_sfa_columns_accepts_a_split_output(tmp_path, monkeypatch):
+    df = sample_frame()
+    src, out = tmp_path / "comb.csv", tmp_path / "renamed.csv"
+    write_table(df, str(src), split_mb=100)
+    assert [os.path.basename(p) for p in split_parts(str(src))] == ["comb-0001.csv"]
+    # Dictionaries as if already downloaded and compiled
+    monkeypatch.setattr(rename, "download_sfa_dictionaries", lambda: {})
+    monkeypatch.setattr(rename, "load_sfa_dictionaries", lambda: DICT_MAPS)
+    rename.rename_sfa_columns(str(src), str(out))
+    assert out.read_bytes() == renamed_frame(df).to_csv(index=False).encode("utf-8")
+
+
+def titles_by_year():
+    # A later dictionary year, not present in the data, retitled SCUGRAD
+    return {"2014-2015": VAR_MAP, "2020-2021": {"scugrad": "SCUGRAD - Undergraduates (new title)"}}
+
+
+def test_years_come_from_parquet_partitions(tmp_path):
+    src, out = tmp_path / "comb.parquet", tmp_path / "renamed.parquet"
+    write_table(sample_frame(), str(src))
+    assert rename.data_years(str(src)) == {"2013-2014", "2014-2015"}
+    rename.rename_table(str(src), str(out), titles_by_year())
+    assert VAR_MAP["scugrad"] in read_table(str(out)).columns
+
+
+def test_plain_csv_years_are_scanned_only_on_request(tmp_path):
+    src, out = tmp_path / "comb.csv", tmp_path / "renamed.csv"
+    write_table(sample_frame(), str(src))
+    rename.rename_table(str(src), str(out), titles_by_year())
+    assert out.read_text().startswith("UNITID - Unique identification number of the institution,"
+                                      "SCUGRAD - Undergraduates (new title),year")
+    rename.rename_table(str(src), str(out), titles_by_year(), scan_years=True)
+    assert VAR_MAP["scugrad"] in out.read_text().splitlines()[0]
+
+
+def test_parsed_inputs_use_their_own_years(tmp_path):
+    src, out = tmp_path / "comb.csv.gz", tmp_path / "renamed.csv"
+    write_table(sample_frame(), str(src))
+    rename.rename_table(str(src), str(out), titles_by_year())
+    assert VAR_MAP["scugrad"] in out.read_text().splitlines()[0]
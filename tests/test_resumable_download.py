@@ -0,0 +1,168 @@
+import io
+import os
+import random
+import zipfile
+
+import pytest
+
+from ipeds_http import make_session
+from ipeds_manifest import load_manifest, fetch_if_changed, part_state_path, iter_body
+
+
+def zip_bytes(seed, size=6400):
+    """ A stored (uncompressed) zip, so the download is about `size` bytes. """
+    rng = random.Random(seed)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as z:
+        z.writestr("sfa1314.csv", bytes(rng.getrandbits(8) for _ in range(size)))
+    return buf.getvalue()
+
+
+@pytest.fixture
+def setup(remote, tmp_path):
+    folder, server = remote
+    local = tmp_path / "local"
+    local.mkdir()
+    manifest = load_manifest(str(local))
+    session = make_session()
+
+    def fetch(retries=3):
+        return fetch_if_changed(server.url + "SFA1314.zip", str(local / "SFA1314.zip"), manifest,
+                                "sfa", "2013-2014", session=session, retries=retries, backoff=0.01)
+
+    yield folder, server, local, manifest, fetch
+    session.close()
+
+
+def ranges(server):
+    return [r[2].get("Range") for r in server.gets("SFA1314.zip")]
+
+
+def test_resumes_after_dropped_connections(setup):
+    folder, server, local, manifest, fetch = setup
+    data = zip_bytes(1)
+    (folder / "SFA1314.zip").write_bytes(data)
+    server.drop_every = 1000
+
+    # Seven drops in a row, but each one brought new bytes, so retries=3 is enough
+    assert fetch(retries=3) == "changed"
+    assert (local / "SFA1314.zip").read_bytes() == data
+    assert ranges(server) == [None] + [f"bytes={n}-" for n in range(1000, len(data), 1000)]
+    assert not (local / "SFA1314.zip.part").exists()
+    assert not os.path.exists(part_state_path(str(local / "SFA1314.zip.part")))
+    assert manifest["artifacts"]["SFA1314.zip"]["size"] == len(data)
+
+
+def test_gives_up_without_progress(setup):
+    folder, server, local, manifest, fetch = setup
+    (folder / "SFA1314.zip").write_bytes(zip_bytes(1))
+    server.drop_every = 1000
+    server.ignore_range = True
+
+    # After the first attempt every one starts over and dies at the same byte: once
+    # retries + 1 attempts in a row brought nothing new, the download fails
+    assert fetch(retries=2) == "failed"
+    assert len(server.gets("SFA1314.zip")) == 1 + 3
+    assert not (local / "SFA1314.zip").exists()
+
+
+def test_interrupted_run_resumes_next_run(setup):
+    folder, server, local, manifest, fetch = setup
+    data = zip_bytes(1)
+    (folder / "SFA1314.zip").write_bytes(data)
+    server.drop_every = 1000
+    server.ignore_range = True
+    assert fetch(retries=0) == "failed"
+    assert (local / "SFA1314.zip.part").stat().st_size == 1000
+    assert os.path.exists(part_state_path(str(local / "SFA1314.zip.part")))
+
+    server.drop_every = None
+    server.ignore_range = False
+    assert fetch() == "changed"
+    last = server.gets("SFA1314.zip")[-1][2]
+    assert last["Range"] == "bytes=1000-"
+    assert last["If-Range"].startswith('"')
+    assert (local / "SFA1314.zip").read_bytes() == data
+
+
+def test_if_range_restarts_a_changed_file(setup):
+    folder, server, local, manifest, fetch = setup
+    (folder / "SFA1314.zip").write_bytes(zip_bytes(1))
+    server.drop_every = 1000
+    server.ignore_range = True
+    assert fetch(retries=0) == "failed"
+
+    # Revised on the server between runs: If-Range no longer matches, so the server sends
+    # the whole new file instead of splicing its tail onto the old bytes
+    revised = zip_bytes(2)
+    (folder / "SFA1314.zip").write_bytes(revised)
+    server.drop_every = None
+    server.ignore_range = False
+    assert fetch() == "changed"
+    assert server.gets("SFA1314.zip")[-1][2]["Range"] == "bytes=1000-"
+    assert (local / "SFA1314.zip").read_bytes() == revised
+
+
+def test_failed_download_keeps_the_old_file(setup):
+    folder, server, local, manifest, fetch = setup
+    old = zip_bytes(1)
+    (folder / "SFA1314.zip").write_bytes(old)
+    assert fetch() == "changed"
+
+    (folder / "SFA1314.zip").write_bytes(zip_bytes(2))
+    server.drop_every = 1000
+    server.ignore_range = True
+    assert fetch(retries=0) == "failed"
+    assert (local / "SFA1314.zip").read_bytes() == old
+    assert (local / "SFA1314.zip.part").stat().st_size == 1000
+    assert manifest["artifacts"]["SFA1314.zip"]["size"] == len(old)
+
+
+def test_corrupt_download_is_discarded(setup):
+    folder, server, local, manifest, fetch = setup
+    old = zip_bytes(1)
+    (folder / "SFA1314.zip").write_bytes(old)
+    assert fetch() == "changed"
+
+    corrupt = bytearray(zip_bytes(2))
+    corrupt[200] ^= 0xFF
+    (folder / "SFA1314.zip").write_bytes(bytes(corrupt))
+    assert fetch() == "failed"
+    assert (local / "SFA1314.zip").read_bytes() == old
+    assert not (local / "SFA1314.zip.part").exists()
+
+
+def test_not_modified(setup):
+    folder, server, local, manifest, fetch = setup
+    data = zip_bytes(1)
+    (folder / "SFA1314.zip").write_bytes(data)
+    assert fetch() == "changed"
+    mtime = (local / "SFA1314.zip").stat().st_mtime_ns
+
+    assert fetch() == "unchanged"
+    last = server.gets("SFA1314.zip")[-1][2]
+    assert last["If-None-Match"] == manifest["artifacts"]["SFA1314.zip"]["etag"]
+    assert "Range" not in last
+    assert (local / "SFA1314.zip").stat().st_mtime_ns == mtime
+    assert manifest["last_run"]["changed"] == ["SFA1314.zip"]
+
+
+class Urllib3V1Body:
+    """ A urllib3 1.x response body: read(amt, decode_content) but no read1. """
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def read(self, amt=None, decode_content=None):
+        return self.data.read(amt)
+
+
+class Urllib3V1Response:
+    def __init__(self, data):
+        self.raw = Urllib3V1Body(data)
+
+
+def test_body_is_read_without_read1():
+    data = bytes(range(256)) * 100
+    pieces = list(iter_body(Urllib3V1Response(data), 1000))
+    assert b"".join(pieces) == data and max(map(len, pieces)) == 1000
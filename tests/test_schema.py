@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+
+from ipeds_schema import infer_schema, apply_schema, save_schema, load_cached_schema, apply_cached_schema
+from combine_ipeds_sfa import combine_csvs, find_sfa_csvs
+
+
+def strings(**columns):
+    return pd.DataFrame({k: pd.Series(v, dtype=object) for k, v in columns.items()})
+
+
+def test_inference_picks_the_smallest_safe_type():
+    schema = infer_schema([
+        strings(unitid=["100654", "100663"], scugrad=["12", "120"], avgamt=["1.5", "2.25"],
+                zip=["01002", "35294"], xscugrad=["R", "A"], note=["a", "b"]),
+        strings(unitid=["100654", "100690"], scugrad=["-3", None], avgamt=["0.1", "7"],
+                zip=["35294", "99501"], xscugrad=["R", "Z"], note=["c", None]),
+    ], value_labels={"xscugrad": {"R": "Reported", "A": "Analyst corrected", "P": "Imputed"}})
+    assert schema["unitid"] == {"dtype": "int32"}
+    assert schema["scugrad"] == {"dtype": "Int8"}
+    assert schema["avgamt"] == {"dtype": "float64"}
+    assert schema["zip"] == {"dtype": "object"}
+    assert schema["xscugrad"] == {"dtype": "category", "categories": ["A", "P", "R", "Z"]}
+    assert schema["note"] == {"dtype": "object"}
+
+
+def test_apply_widens_instead_of_losing_values():
+    schema = {"scugrad": {"dtype": "int8"}, "avgamt": {"dtype": "float32"},
+              "xscugrad": {"dtype": "category", "categories": ["A", "R"]}, "count": {"dtype": "int16"}}
+    df = strings(scugrad=["300", "-1"], avgamt=["0.1", "2"], xscugrad=["R", "Q"], count=["5", "n/a"])
+    typed = apply_schema(df, schema)
+    assert str(typed["scugrad"].dtype) == "int16" and typed["scugrad"].tolist() == [300, -1]
+    assert str(typed["avgamt"].dtype) == "float64" and typed["avgamt"].tolist() == [0.1, 2.0]
+    assert list(typed["xscugrad"].cat.categories) == ["A", "Q", "R"]
+    assert typed["xscugrad"].tolist() == ["R", "Q"]
+    assert typed["count"].tolist() == ["5", "n/a"]
+
+    nullable = apply_schema(strings(scugrad=["3", None]), {"scugrad": {"dtype": "int8"}})
+    assert str(nullable["scugrad"].dtype) == "Int8" and nullable["scugrad"].isna().tolist() == [False, True]
+
+
+def test_cached_schema_is_stale_once_a_source_changes(sfa_folder):
+    combine_csvs(str(sfa_folder), output_csv="typed.parquet", typed=True)
+    files = list(find_sfa_csvs(str(sfa_folder)).values())
+    assert load_cached_schema(str(sfa_folder), files) is not None
+    assert load_cached_schema(str(sfa_folder)) is not None
+
+    # Touching a file without changing it keeps the cache
+    os.utime(files[0])
+    assert load_cached_schema(str(sfa_folder), files) is not None
+
+    # A revised year makes it stale, for the combine and for the later stages
+    with open(files[1], "a") as f:
+        f.write("999999,1,R,01002,1,,\n")
+    assert load_cached_schema(str(sfa_folder), files) is None
+    assert load_cached_schema(str(sfa_folder)) is None
+    typed = apply_cached_schema(strings(SCUGRAD=["70000", "1"]), str(sfa_folder))
+    assert typed["SCUGRAD"].tolist() == [70000, 1]
+
+
+def test_cache_for_other_value_labels_is_stale(tmp_path):
+    source = tmp_path / "sfa1314.csv"
+    source.write_text("unitid,xscugrad\n1,R\n")
+    save_schema(str(tmp_path), {"unitid": {"dtype": "int32"}}, [str(source)], {"xscugrad": {"R": "Reported"}})
+    assert load_cached_schema(str(tmp_path), [str(source)], {"xscugrad": {"R": "Reported"}}) is not None
+    assert load_cached_schema(str(tmp_path), [str(source)], {"xscugrad": {"R": "Reported", "P": "Imputed"}}) is None
@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+import pytest
+
+from combine_ipeds_sfa import combine_csvs
+from ipeds_io import read_table
+from test_combine import SOURCES, expected_frame
+
+UNION_ORDER = ["unitid", "scugrad", "xscugrad", "zip", "old_only", "avgamt", "note", "new_only", "year"]
+
+
+def year_frames(folder):
+    frames = []
+    for name, year in SOURCES:
+        df = pd.read_csv(folder / name, dtype=str)
+        df.columns = [c.lower().strip() for c in df.columns]
+        frames.append(df.assign(year=year))
+    return frames
+
+
+def test_union_csv_keeps_every_column(sfa_folder):
+    combine_csvs(str(sfa_folder), output_csv="union.csv", union=True)
+    expected = pd.concat(year_frames(sfa_folder))[UNION_ORDER].to_csv(index=False).encode("utf-8")
+    assert (sfa_folder / "union.csv").read_bytes() == expected
+
+
+def test_union_parquet_stores_only_each_years_columns(sfa_folder):
+    pq = pytest.importorskip("pyarrow.parquet")
+    combine_csvs(str(sfa_folder), output_csv="union.parquet", union=True)
+    path = sfa_folder / "union.parquet"
+    stored = {d: pq.read_schema(path / d / "part-0.parquet").names
+              for d in sorted(os.listdir(path)) if d.startswith("year=")}
+    assert stored == {"year=2013-2014": ["unitid", "scugrad", "xscugrad", "zip", "old_only", "avgamt", "note"],
+                      "year=2014-2015": ["unitid", "avgamt", "scugrad", "note", "xscugrad", "zip"],
+                      "year=2015-2016": ["unitid", "scugrad", "xscugrad", "new_only", "zip", "avgamt", "note"]}
+
+    # Reading the whole dataset fills the absent year/column combinations with nulls
+    df = read_table(str(path))
+    assert list(df.columns) == UNION_ORDER
+    assert len(df) == 3 * 2500
+    present = df.groupby("year")[["old_only", "new_only"]].count()
+    assert (present["old_only"] > 0).tolist() == [True, False, False]
+    assert (present["new_only"] > 0).tolist() == [False, False, True]
+
+    # ... and reading the common columns gives the intersection combine
+    common = list(expected_frame(sfa_folder).columns)
+    combine_csvs(str(sfa_folder), output_csv="common.parquet")
+    pd.testing.assert_frame_equal(read_table(str(path), columns=common),
+                                  read_table(str(sfa_folder / "common.parquet"), columns=common),
+                                  check_dtype=False)
@@ -0,0 +1,61 @@
+import io
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ipeds_io import write_csv, write_table, read_table, split_parts, csv_parts
+
+
+@pytest.fixture(scope="module")
+def frame():
+    """ 60,000 rows: three 100,000-cell blocks, with floats, missing values, text and a categorical. """
+    rng = np.random.default_rng(0)
+    n = 60_000
+    amount = rng.random(n) * 1000
+    amount[rng.random(n) < 0.1] = np.nan
+    return pd.DataFrame({
+        "unitid": np.arange(100000, 100000 + n, dtype="int32"),
+        "amount": amount,
+        "note": rng.choice(["", "plain", "has, comma", 'has "quote"'], n),
+        "flag": pd.Categorical(rng.choice(["R", "A", "Z"], n)),
+    })
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_block_writer_is_byte_identical(tmp_path, frame, jobs):
+    path = tmp_path / "out.csv"
+    assert write_csv(frame, str(path), jobs=jobs, block_cells=100_000) == [str(path)]
+    assert path.read_bytes() == frame.to_csv(index=False).encode("utf-8")
+
+
+def test_gzip_output_decompresses_to_the_same_bytes(tmp_path, frame):
+    path = tmp_path / "out.csv.gz"
+    write_csv(frame, str(path), jobs=2, block_cells=100_000)
+    assert gzip.decompress(path.read_bytes()) == frame.to_csv(index=False).encode("utf-8")
+
+
+def test_zstd_output_reads_back(tmp_path, frame):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "out.csv.zst"
+    write_table(frame, str(path), jobs=2)
+    expected = pd.read_csv(io.StringIO(frame.to_csv(index=False)), dtype=str)
+    pd.testing.assert_frame_equal(read_table(str(path)), expected)
+
+
+def test_split_output_concatenates_to_the_same_bytes(tmp_path, frame):
+    path = tmp_path / "out.csv"
+    written = write_csv(frame, str(path), jobs=2, split_mb=1, block_cells=100_000)
+    assert len(written) > 1 and written == split_parts(str(path)) == csv_parts(str(path))
+    expected = frame.to_csv(index=False).encode("utf-8")
+    header = expected[:expected.index(b"\n") + 1]
+    parts = [open(p, "rb").read() for p in written]
+    assert all(p.startswith(header) for p in parts)
+    assert header + b"".join(p[len(header):] for p in parts) == expected
+
+
+def test_empty_frame_writes_the_header(tmp_path, frame):
+    path = tmp_path / "out.csv"
+    write_csv(frame.iloc[:0], str(path), jobs=2)
+    assert path.read_bytes() == frame.iloc[:0].to_csv(index=False).encode("utf-8")